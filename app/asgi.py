@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+ASGI entry point for the async serving mode:
+
+    uvicorn app.asgi:app --host 0.0.0.0 --port $PORT
+
+The /get-approved long-poll and the /events live status streams run
+natively as coroutines, so a waiting N8N execution or an open dashboard
+costs one asyncio.Event instead of a worker. Database access is
+dispatched to a small thread pool (works unchanged for SQLite and Postgres).
+Static assets are answered straight from server.static_assets. Every other
+route is served by the Flask app on a bounded thread pool, so both serving
+modes share the same endpoint implementations.
+"""
+import asyncio
+import contextvars
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+try:
+    from . import server
+    from . import json_codec
+    from .blob_codec import encode_json
+    from .live_status import TERMINAL, render_changes, render_snapshot
+    from .profiler import trace_span
+except ImportError:  # executed from inside app/
+    import server
+    import json_codec
+    from blob_codec import encode_json
+    from live_status import TERMINAL, render_changes, render_snapshot
+    from profiler import trace_span
+
+# Threads beyond the Postgres pool size queue inside PgPool (PG_POOL_TIMEOUT_SEC)
+DB_THREADS = int(os.getenv('ASGI_DB_THREADS', 4))
+WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', 8))
+
+db_executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix='hitl-db')
+wsgi_executor = ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix='hitl-wsgi')
+
+
+async def run_db(fn, *args):
+    """Run a blocking DB helper from server.py without blocking the loop."""
+    loop = asyncio.get_running_loop()
+    # Carry the request's trace (profiler.py) into the worker thread
+    return await loop.run_in_executor(db_executor, contextvars.copy_context().run, fn, *args)
+
+
+async def read_body(receive):
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+    return body
+
+
+async def spool_body(receive, limit, max_memory):
+    """Request body in a SpooledTemporaryFile plus its size; None once it exceeds limit."""
+    body = tempfile.SpooledTemporaryFile(max_size=max_memory)
+    size = 0
+    more_body = True
+    while more_body:
+        message = await receive()
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > limit:
+            body.close()
+            return None, size
+        body.write(chunk)
+        more_body = message.get('more_body', False)
+    body.seek(0)
+    return body, size
+
+
+def request_header(scope, name):
+    """Value of request header ``name`` (lower-case), repeated headers joined."""
+    values = [value.decode('latin-1') for key, value in scope.get('headers', [])
+              if key.decode('latin-1').lower() == name]
+    return ','.join(values)
+
+
+async def send_json(scope, send, payload, status=200):
+    # Same codec and compression rules as the Flask app, so both serving modes match
+    if status == 200:
+        body, encoding = encode_json(payload, request_header(scope, 'accept-encoding'))
+    else:
+        body, encoding = json_codec.dumps_bytes(payload), None
+    headers = [
+        (b'content-type', b'application/json'),
+        (b'access-control-allow-origin', b'*'),
+    ]
+    if encoding:
+        # Assembled around a packed blob (blob_codec.py) – already compressed
+        headers.append((b'vary', b'Accept-Encoding'))
+        headers.append((b'content-encoding', encoding.encode('latin-1')))
+    elif json_codec.COMPRESS_MIN_BYTES and len(body) >= json_codec.COMPRESS_MIN_BYTES and status == 200:
+        headers.append((b'vary', b'Accept-Encoding'))
+        encoding = json_codec.negotiate_encoding(request_header(scope, 'accept-encoding'), len(body))
+        if encoding:
+            body = json_codec.compress(body, encoding)
+            headers.append((b'content-encoding', encoding.encode('latin-1')))
+    headers.append((b'content-length', str(len(body)).encode('latin-1')))
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+    return status
+
+# ============================================================================
+# 🕒 NATIVE ASYNC ROUTES
+# ============================================================================
+
+async def get_approved(scope, receive, send):
+    """Async twin of server.get_approved – waits on a coroutine, not a thread."""
+    body = await read_body(receive)
+    if scope['method'] == 'POST':
+        try:
+            data = json_codec.loads(body or b'{}')
+        except ValueError:
+            return await send_json(scope, send, {'error': 'Invalid JSON body'}, 400)
+        execution_id = data.get('execution_id') if isinstance(data, dict) else None
+    else:
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        execution_id = query.get('execution_id', [None])[0]
+
+    if not execution_id:
+        return await send_json(scope, send, {'error': 'No execution_id provided'}, 400)
+
+    try:
+        loop = asyncio.get_running_loop()
+        server.ensure_approval_listener()
+        wait_started = time.monotonic()
+        with server.approval_notifier.watch_async(execution_id) as approved:
+            result = await run_db(server.fetch_approval, execution_id)
+            deadline = loop.time() + server.APPROVAL_WAIT_SEC
+            # Re-check after every wake-up, and once more on timeout
+            while not result:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    with trace_span('wait'):
+                        await asyncio.wait_for(approved.wait(), remaining)
+                    approved.clear()
+                except asyncio.TimeoutError:
+                    pass
+                result = await run_db(server.fetch_approval, execution_id)
+
+        server.observe_approval_wait(wait_started, result)
+
+        payload, status = await run_db(server.deliver_approval, execution_id, result)
+    except server.PoolTimeout as e:
+        server.log.warning('pool_exhausted', '⚠️ Database pool exhausted: {error}', error=str(e))
+        payload, status = {'error': str(e)}, 503
+    except Exception as e:
+        server.log.error('get_approved_failed', '❌ Error getting approved tasks: {error}', error=str(e))
+        payload, status = {'error': str(e)}, 500
+
+    return await send_json(scope, send, payload, status)
+
+
+async def send_static(scope, send):
+    """Serve an in-memory asset without a thread hop; return its status, or None if path isn't one."""
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    path = scope['path'].lstrip('/') or 'index.html'
+    result = server.static_assets.respond(
+        path, request_header(scope, 'accept-encoding'), request_header(scope, 'if-none-match'),
+        query.get('v', [None])[0],
+    )
+    if result is None:
+        return None
+
+    status, asset_headers, body = result
+    raw_headers = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in asset_headers]
+    raw_headers.append((b'access-control-allow-origin', b'*'))
+    if status == 200:
+        raw_headers.append((b'content-length', str(len(body)).encode('latin-1')))
+    await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+    await send({'type': 'http.response.body', 'body': b'' if scope['method'] == 'HEAD' else body})
+    return status
+
+
+async def execution_events(scope, receive, send):
+    """Live status stream for /events/<execution_id>, held open on the event loop."""
+    await read_body(receive)
+    if scope['method'] != 'GET':
+        return await send_json(scope, send, {'error': 'Method not allowed'}, 405)
+    execution_id = scope['path'][len(EVENTS_PREFIX):]
+    live_status = server.live_status
+
+    server.ensure_approval_listener()  # other workers' writes arrive as NOTIFY
+    with live_status.watch_async(execution_id) as changed:
+        try:
+            sent = await run_db(live_status.seed, execution_id)
+        except server.PoolTimeout as e:
+            server.log.warning('pool_exhausted', '⚠️ Database pool exhausted: {error}', error=str(e))
+            return await send_json(scope, send, {'error': str(e)}, 503)
+        if sent['status'] == server.GONE:
+            return await send_json(scope, send, {'error': 'Tasks not found'}, 404)
+
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),  # don't let a proxy buffer the stream
+            (b'access-control-allow-origin', b'*'),
+        ]})
+        await send({'type': 'http.response.body', 'more_body': True,
+                    'body': render_snapshot(sent, server.LIVE_STATUS_RETRY_MS)})
+
+        # The request body has been read, so the next message is http.disconnect
+        disconnected = asyncio.ensure_future(receive())
+        try:
+            while sent['status'] not in TERMINAL:
+                waiting = asyncio.ensure_future(changed.wait())
+                await asyncio.wait({waiting, disconnected}, timeout=server.LIVE_STATUS_HEARTBEAT_SEC,
+                                   return_when=asyncio.FIRST_COMPLETED)
+                waiting.cancel()
+                if disconnected.done():
+                    return 200
+                changed.clear()
+                state = live_status.current(execution_id) or sent
+                chunk = render_changes(sent, state) or b': keep-alive\n\n'
+                sent = state
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+    return 200
+
+
+EVENTS_PREFIX = '/events/'
+
+NATIVE_ROUTES = {
+    '/get-approved': get_approved,
+    '/approved': get_approved,
+}
+
+# ============================================================================
+# 🔁 FLASK BRIDGE (everything else)
+# ============================================================================
+
+def build_environ(scope, body, length):
+    """Translate an ASGI HTTP scope into a PEP 3333 environ."""
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        'CONTENT_LENGTH': str(length),
+    }
+    for raw_name, raw_value in scope.get('headers', []):
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        value = raw_value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+            continue
+        if name == 'CONTENT_LENGTH':
+            continue
+        key = f'HTTP_{name}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def run_wsgi(environ):
+    """Call the Flask app and collect the full response (runs in a thread)."""
+    response = {}
+    chunks = []
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [
+            (name.lower().encode('latin-1'), value.encode('latin-1'))
+            for name, value in headers
+        ]
+        return chunks.append
+
+    result = server.app(environ, start_response)
+    try:
+        for chunk in result:
+            chunks.append(chunk)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return response['status'], response['headers'], b''.join(chunks)
+
+
+async def call_flask(scope, receive, send):
+    # Spooled, so a large upload (/store-tasks) costs disk rather than memory
+    body, length = await spool_body(receive, server.MAX_REQUEST_BYTES, server.INGEST_SPOOL_MEMORY_BYTES)
+    if body is None:
+        return await send_json(scope, send, {'error': f'Request body exceeds {server.MAX_REQUEST_BYTES} bytes'}, 413)
+    loop = asyncio.get_running_loop()
+    try:
+        status, headers, content = await loop.run_in_executor(
+            wsgi_executor, run_wsgi, build_environ(scope, body, length)
+        )
+    finally:
+        body.close()
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': content})
+
+# ============================================================================
+# 🚀 ASGI APPLICATION
+# ============================================================================
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            db_executor.shutdown(wait=False)
+            wsgi_executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        if scope['type'] == 'websocket':
+            await send({'type': 'websocket.close'})
+        return
+
+    started = time.perf_counter()
+    handler = NATIVE_ROUTES.get(scope['path'])
+    if handler is None and scope['path'].startswith(EVENTS_PREFIX):
+        handler = execution_events
+    if handler is not None and scope['method'] in ('GET', 'POST'):
+        # Event streams are long-lived by design, so only get_approved is traced.
+        # No cProfile here: on the loop it would also profile other requests.
+        trace = None if handler is execution_events else server.request_profiler.start(
+            scope['method'], scope['path'], request_header(scope, 'x-profile'), cprofile=False,
+        )
+        status = 500
+        try:
+            status = await handler(scope, receive, send)
+        finally:
+            if trace is not None:
+                server.request_profiler.finish(trace, status, handler.__name__)
+        route = handler.__name__
+    elif scope['method'] in ('GET', 'HEAD') and (status := await send_static(scope, send)):
+        route = 'serve_index' if scope['path'] == '/' else 'serve_static'
+    else:
+        # Timed inside Flask like any other request
+        return await call_flask(scope, receive, send)
+    server.http_request_seconds.observe(
+        time.perf_counter() - started, route=route, method=scope['method'], status=status,
+    )
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Optional compression of stored JSON blobs (BLOB_CODEC).
+
+executions.monday_tasks, executions.meetings_data and approvals.approved_tasks
+hold whole JSON lists. With BLOB_CODEC=zlib|zstd|auto, new rows keep them in
+``*_packed`` binary columns instead (the text column is left empty) and the
+codec is recorded per row (``blob_codec``). Rows written without a codec, or
+blobs under BLOB_CODEC_MIN_BYTES, stay plain text, so every row stays
+readable whatever the current setting.
+
+* zlib – raw deflate ended by a sync flush, behind the text's adler32 and
+         length. A response embedding it is assembled as HTTP ``deflate``
+         around the stored bytes, no recompression.
+* zstd – one zstd frame (``zstandard`` package). Frames concatenate, so the
+         same holds for ``Content-Encoding: zstd``.
+
+Packed values read back as PackedJSON, a RawJSON that is only decompressed
+when something needs the text.
+"""
+import struct
+import zlib
+from itertools import chain
+
+from werkzeug.http import parse_accept_header
+
+try:
+    from . import json_codec
+    from .profiler import trace_span
+except ImportError:  # executed from inside app/
+    import json_codec
+    from profiler import trace_span
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+NONE = 'none'
+ZLIB = 'zlib'
+ZSTD = 'zstd'
+CONTENT_ENCODINGS = {ZLIB: 'deflate', ZSTD: 'zstd'}
+
+_HEADER = struct.Struct('>IQ')   # adler32, length of the uncompressed text
+_ADLER_BASE = 65521
+_ZLIB_HEADER = b'\x78\x9c'
+
+
+class PackedJSON(json_codec.RawJSON):
+    """Compressed JSON text from the database, decompressed on first use."""
+
+    __slots__ = ('codec', 'payload', '_text')
+
+    def __init__(self, codec, payload):
+        self.codec = codec
+        self.payload = bytes(payload)  # psycopg2 returns bytea as a memoryview
+        self._text = None
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = unpack(self.codec, self.payload)
+        return self._text
+
+
+class BlobCodec:
+    """The codec new rows are written with."""
+
+    def __init__(self, name=NONE, level=None, min_bytes=1024):
+        name = name.lower()
+        if name not in (NONE, ZLIB, ZSTD, 'auto'):
+            raise ValueError(f"BLOB_CODEC must be 'none', 'zlib', 'zstd' or 'auto', got {name!r}")
+        if name == 'auto':
+            name = ZSTD if zstandard is not None else ZLIB
+        if name == ZSTD and zstandard is None:
+            raise ImportError('BLOB_CODEC=zstd but the zstandard package is not installed')
+        self.name = name
+        self.level = level if level is not None else (3 if name == ZSTD else 6)
+        self.min_bytes = min_bytes
+
+    @property
+    def enabled(self):
+        return self.name != NONE
+
+    @property
+    def row_codec(self):
+        """Value for a row's blob_codec column."""
+        return self.name if self.enabled else None
+
+    def pack(self, text):
+        """Return (text column, packed column) for a JSON text about to be stored."""
+        if not text:
+            return text, None
+        return self.pack_pieces((text,))
+
+    def pack_pieces(self, pieces):
+        """pack() for a JSON text given as an iterable of str pieces.
+
+        Pieces are compressed as they arrive, so a large text is never held
+        whole (unless the codec is off: the text column needs all of it).
+        """
+        pieces = iter(pieces)
+        if not self.enabled:
+            return ''.join(pieces), None
+        head, size = [], 0
+        for piece in pieces:
+            head.append(piece)
+            size += len(piece)
+            if size >= self.min_bytes:
+                break
+        else:
+            return ''.join(head), None  # short: stays plain text
+        out = bytearray()
+        if self.name == ZSTD:
+            compressor = zstandard.ZstdCompressor(level=self.level).compressobj()
+            for piece in chain(head, pieces):
+                out += compressor.compress(piece.encode('utf-8'))
+            out += compressor.flush()
+            return '', bytes(out)
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        out += _HEADER.pack(0, 0)  # filled in below
+        check, length = 1, 0
+        for piece in chain(head, pieces):
+            data = piece.encode('utf-8')
+            check = zlib.adler32(data, check)
+            length += len(data)
+            out += compressor.compress(data)
+        out += compressor.flush(zlib.Z_SYNC_FLUSH)
+        _HEADER.pack_into(out, 0, check, length)
+        return '', bytes(out)
+
+    def stats(self):
+        return {'codec': self.name, 'level': self.level, 'min_bytes': self.min_bytes}
+
+
+def unpack(codec, payload):
+    """UTF-8 JSON bytes of a packed column."""
+    if codec == ZLIB:
+        return zlib.decompressobj(-zlib.MAX_WBITS).decompress(payload[_HEADER.size:])
+    if codec == ZSTD:
+        if zstandard is None:
+            raise ImportError('Rows were stored with zstd but the zstandard package is not installed')
+        # Streamed frames (pack_pieces) don't record their content size
+        return zstandard.ZstdDecompressor().decompressobj().decompress(payload)
+    raise ValueError(f'Unknown blob codec {codec!r}')
+
+
+def stored_json(text, codec, packed):
+    """RawJSON for a stored blob (PackedJSON when packed), or None if empty."""
+    if packed is not None:
+        return PackedJSON(codec, packed)
+    return json_codec.RawJSON(text) if text else None
+
+
+def encode_json(obj, accept_encoding):
+    """Return (body, content_encoding) for a JSON response.
+
+    When a top-level value is packed with a codec whose encoding the client
+    accepts, the body is built in that encoding around the stored bytes;
+    otherwise it is plain JSON and content_encoding is None.
+    """
+    with trace_span('serialize', 'encode_json'):
+        parts = json_codec.dumps_parts(obj)
+        if json_codec.COMPRESS_MIN_BYTES and accept_encoding:
+            codecs = sorted({part.codec for part in parts if isinstance(part, PackedJSON)})
+            if codecs:
+                accepts = parse_accept_header(accept_encoding)
+                for codec in codecs:
+                    if accepts[CONTENT_ENCODINGS[codec]] > 0:
+                        return _splice(parts, codec), CONTENT_ENCODINGS[codec]
+        return b''.join(_plain(part) for part in parts), None
+
+
+def _plain(part):
+    return part.encoded() if isinstance(part, json_codec.RawJSON) else part
+
+
+def _deflate(data, level, mode):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(mode)
+
+
+def _splice(parts, codec):
+    level = json_codec.COMPRESS_LEVEL
+    if codec == ZSTD:
+        compressor = zstandard.ZstdCompressor(level=level)
+        return b''.join(part.payload if isinstance(part, PackedJSON) and part.codec == ZSTD
+                        else compressor.compress(_plain(part)) for part in parts)
+    out, check = [_ZLIB_HEADER], 1
+    for part in parts:
+        if isinstance(part, PackedJSON) and part.codec == ZLIB:
+            adler, length = _HEADER.unpack_from(part.payload)
+            out.append(part.payload[_HEADER.size:])
+            check = _adler32_combine(check, adler, length)
+        else:
+            data = _plain(part)
+            out.append(_deflate(data, level, zlib.Z_SYNC_FLUSH))
+            check = zlib.adler32(data, check)
+    out.append(_deflate(b'', level, zlib.Z_FINISH))
+    out.append(struct.pack('>I', check))
+    return b''.join(out)
+
+
+def _adler32_combine(adler1, adler2, length2):
+    """adler32 of A + B from adler32(A), adler32(B) and len(B) (zlib's adler32_combine)."""
+    rem = length2 % _ADLER_BASE
+    sum1 = adler1 & 0xffff
+    sum2 = (rem * sum1) % _ADLER_BASE
+    sum1 += (adler2 & 0xffff) + _ADLER_BASE - 1
+    sum2 += ((adler1 >> 16) & 0xffff) + ((adler2 >> 16) & 0xffff) + _ADLER_BASE - rem
+    return (sum1 % _ADLER_BASE) | ((sum2 % _ADLER_BASE) << 16)
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Non-blocking structured event log (replaces print() on request paths).
+
+Callers put a record on a bounded in-memory queue and return; a background
+thread formats and writes records in batches, so a slow stdout (gunicorn
+pipe, log shipper) never stalls a request. Records are:
+
+    log.info('tasks_stored', '📦 Stored {count} tasks for {execution_id}',
+             count=3, execution_id='abc')
+
+* ``LOG_LEVEL``      – debug | info | warning | error (default info)
+* ``LOG_FORMAT``     – text (the formatted message, as print() wrote it) or
+                       json (one object per line with ts, level, event, msg
+                       and the fields)
+* ``LOG_SAMPLE``     – per-event keep ratio, e.g. ``tasks_served=0.01``
+* ``LOG_QUEUE_SIZE`` – records buffered before new ones are dropped (and
+                       counted) instead of blocking the caller
+
+Formatting happens on the writer thread, so a filtered, sampled-out or
+dropped record costs the caller a comparison and a queue put at most.
+"""
+import atexit
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVELS = {'debug': DEBUG, 'info': INFO, 'warning': WARNING, 'error': ERROR}
+LEVEL_NAMES = {value: name for name, value in LEVELS.items()}
+
+WRITE_BATCH = 256
+
+
+def parse_sample_rates(spec):
+    """'event=0.1,other=0.5' -> {'event': 0.1, 'other': 0.5}"""
+    rates = {}
+    for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+        event, _, rate = item.partition('=')
+        rate = float(rate)
+        if not 0 <= rate <= 1:
+            raise ValueError(f'LOG_SAMPLE rate for {event!r} must be between 0 and 1, got {rate}')
+        rates[event.strip()] = rate
+    return rates
+
+
+class EventLog:
+    def __init__(self, level=INFO, fmt='text', sample_rates=None, queue_size=10000, stream=None):
+        if fmt not in ('text', 'json'):
+            raise ValueError(f"LOG_FORMAT must be 'text' or 'json', got {fmt!r}")
+        self.level = level
+        self.format = fmt
+        self.sample_rates = sample_rates or {}
+        self.queue_size = queue_size
+        self.stream = stream  # None: whatever sys.stdout is at write time
+        self._stats_lock = threading.Lock()
+        self._stats = {'written': 0, 'dropped': 0, 'sampled_out': 0, 'write_errors': 0}
+        self._reported_drops = 0
+        self._start_writer()
+        # A forked worker (gunicorn --preload) inherits the queue but not the thread
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    @classmethod
+    def from_env(cls):
+        level = os.environ.get('LOG_LEVEL', 'info').lower()
+        if level not in LEVELS:
+            raise ValueError(f"LOG_LEVEL must be one of {', '.join(LEVELS)}, got {level!r}")
+        return cls(
+            level=LEVELS[level],
+            fmt=os.environ.get('LOG_FORMAT', 'text').lower(),
+            sample_rates=parse_sample_rates(os.environ.get('LOG_SAMPLE')),
+            queue_size=int(os.environ.get('LOG_QUEUE_SIZE', 10000)),
+        )
+
+    def _after_fork(self):
+        self._stats_lock = threading.Lock()
+        self._start_writer()
+
+    def _start_writer(self):
+        self._queue = queue.Queue(self.queue_size)
+        self._writer = threading.Thread(target=self._run, name='hitl-log-writer', daemon=True)
+        self._writer.start()
+
+    # ------------------------------------------------------------------
+    # Producer side (request threads)
+    # ------------------------------------------------------------------
+
+    def log(self, level, event, message, **fields):
+        if level < self.level:
+            return
+        rate = self.sample_rates.get(event)
+        if rate is not None and rate < 1 and random.random() >= rate:
+            with self._stats_lock:
+                self._stats['sampled_out'] += 1
+            return
+        try:
+            self._queue.put_nowait((time.time(), level, event, message, fields))
+        except queue.Full:
+            with self._stats_lock:
+                self._stats['dropped'] += 1
+
+    def debug(self, event, message, **fields):
+        self.log(DEBUG, event, message, **fields)
+
+    def info(self, event, message, **fields):
+        self.log(INFO, event, message, **fields)
+
+    def warning(self, event, message, **fields):
+        self.log(WARNING, event, message, **fields)
+
+    def error(self, event, message, **fields):
+        self.log(ERROR, event, message, **fields)
+
+    def flush(self, timeout=2.0):
+        """Wait until everything queued so far has been written."""
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    # ------------------------------------------------------------------
+    # Writer thread
+    # ------------------------------------------------------------------
+
+    def render(self, record):
+        ts, level, event, message, fields = record
+        try:
+            text = message.format(**fields) if fields else message
+        except (KeyError, IndexError, ValueError):
+            text = message
+        if self.format == 'text':
+            return text + '\n'
+        entry = {
+            'ts': datetime.fromtimestamp(ts, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': LEVEL_NAMES.get(level, str(level)),
+            'event': event,
+            'msg': text,
+        }
+        entry.update(fields)
+        return json.dumps(entry, ensure_ascii=False, default=str) + '\n'
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < WRITE_BATCH:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            records = [item for item in batch if not isinstance(item, threading.Event)]
+            records.extend(self._drop_notice())
+            if records:
+                self._write(records)
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+    def _drop_notice(self):
+        with self._stats_lock:
+            dropped = self._stats['dropped'] - self._reported_drops
+            self._reported_drops = self._stats['dropped']
+        if not dropped:
+            return []
+        return [(time.time(), WARNING, 'log_records_dropped',
+                 '⚠️ Log queue full: dropped {count} records', {'count': dropped})]
+
+    def _write(self, records):
+        lines = []
+        for record in records:
+            try:
+                lines.append(self.render(record))
+            except Exception as e:
+                lines.append(f'log record {record[2]!r} could not be rendered: {e}\n')
+        stream = self.stream or sys.stdout
+        try:
+            stream.write(''.join(lines))
+            stream.flush()
+        except Exception:
+            with self._stats_lock:
+                self._stats['write_errors'] += 1
+            return
+        with self._stats_lock:
+            self._stats['written'] += len(lines)
+
+    # ------------------------------------------------------------------
+    # Introspection
+    # ------------------------------------------------------------------
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update({
+            'queued': self._queue.qsize(),
+            'queue_size': self.queue_size,
+            'level': LEVEL_NAMES.get(self.level, self.level),
+            'format': self.format,
+            'sample_rates': self.sample_rates,
+        })
+        return stats
+
+
+log = EventLog.from_env()
+# Don't lose the last records (e.g. a startup error) when the process exits
+atexit.register(log.flush)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+In-process cache of responses by Idempotency-Key (/store-tasks, /submit-approval).
+
+A client retrying a request sends the same ``Idempotency-Key`` header. The
+first request runs and its 2xx response is kept for ``ttl`` seconds; a
+replay with the same key and the same request fingerprint gets that
+response back without touching the database.
+
+* same key, different fingerprint – MISMATCH (the key was reused for
+  another request; the caller answers 422)
+* same key while the first request still runs – IN_FLIGHT (409)
+* at most ``max_entries`` keys, least recently used evicted first
+
+The cache is per process. A replay landing on another worker runs again,
+where content hashes (executions.content_hash, approvals.content_hash)
+still turn it into a no-op.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+NEW = 'new'
+HIT = 'hit'
+MISMATCH = 'mismatch'
+IN_FLIGHT = 'in_flight'
+
+
+class StoredResponse:
+    __slots__ = ('fingerprint', 'status', 'body', 'deadline')
+
+    def __init__(self, fingerprint, status, body, deadline):
+        self.fingerprint = fingerprint
+        self.status = status      # None while the first request is running
+        self.body = body
+        self.deadline = deadline
+
+
+class IdempotencyCache:
+    def __init__(self, max_entries=10000, ttl=3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> StoredResponse, oldest first
+        self._stats = {'hits': 0, 'misses': 0, 'mismatches': 0, 'in_flight': 0, 'stores': 0, 'evictions': 0}
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.ttl > 0
+
+    def begin(self, key, fingerprint):
+        """Return (state, StoredResponse or None); NEW reserves the key until complete()/release()."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.deadline <= now:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                self._entries[key] = StoredResponse(fingerprint, None, None, now + self.ttl)
+                self._evict()
+                return NEW, None
+            self._entries.move_to_end(key)
+            if entry.fingerprint != fingerprint:
+                self._stats['mismatches'] += 1
+                return MISMATCH, entry
+            if entry.status is None:
+                self._stats['in_flight'] += 1
+                return IN_FLIGHT, entry
+            self._stats['hits'] += 1
+            return HIT, entry
+
+    def complete(self, key, fingerprint, status, body):
+        """Keep a successful response for replays; forget the key otherwise (so a retry runs again)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.fingerprint != fingerprint or entry.status is not None:
+                return
+            if not 200 <= status < 300:
+                del self._entries[key]
+                return
+            entry.status = status
+            entry.body = body
+            entry.deadline = time.monotonic() + self.ttl
+            self._stats['stores'] += 1
+
+    def release(self, key):
+        """Drop a reservation whose request failed without a response."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.status is None:
+                del self._entries[key]
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        stats['max_entries'] = self.max_entries
+        stats['ttl_sec'] = self.ttl
+        return stats
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Incremental parsing of /store-tasks bodies.
+
+request.get_json() buffers the whole body and builds every task as Python
+objects at once. parse_task_upload() reads the body in chunks instead:
+top-level fields are decoded as they arrive, and the ``monday_tasks`` array
+is decoded one element at a time, re-serialized compactly and appended to a
+TaskSpool (memory up to a threshold, then a temporary file). Parsing peaks at
+one chunk plus the largest single task, whatever the meeting size.
+
+Storing keeps that bound with TASK_STORAGE=rows (rows are inserted a chunk
+at a time). The blob layout writes the whole array as one column value:
+with BLOB_CODEC it is compressed from the spool piece by piece, so only
+the compressed blob is held; without it the database driver needs the full
+JSON text in memory once.
+
+Limits (all raise IngestError, ``status`` says 400 or 413):
+
+* max_bytes      – whole body
+* max_tasks      – elements of monday_tasks
+* max_task_bytes – one serialized task
+
+iter_bulk_upload() reads /store-tasks/bulk bodies – a JSON array or NDJSON
+of executions – one execution at a time the same way.
+"""
+import codecs
+import hashlib
+import json
+import tempfile
+
+try:
+    from . import json_codec
+except ImportError:  # executed from inside app/
+    import json_codec
+
+READ_CHUNK = 64 * 1024
+WHITESPACE = ' \t\n\r'
+_decoder = json.JSONDecoder()
+
+
+class IngestError(ValueError):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class TaskSpool:
+    """Serialized tasks in arrival order, one JSON text per line."""
+
+    def __init__(self, max_memory):
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_memory, mode='w+b')
+        self.count = 0
+        self.digest = hashlib.sha256()  # of the lines written so far
+
+    def append(self, task_json):
+        line = task_json.encode('utf-8') + b'\n'
+        self._file.write(line)
+        self.digest.update(line)
+        self.count += 1
+
+    def __iter__(self):
+        """Yield the serialized tasks (JSON text) in order."""
+        self._file.seek(0)
+        for line in self._file:
+            yield line[:-1].decode('utf-8')
+
+    def json_array(self):
+        return ''.join(json_array_pieces(self))
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def json_array_pieces(texts):
+    """Yield the JSON array of the given JSON texts piece by piece."""
+    yield '['
+    for index, text in enumerate(texts):
+        if index:
+            yield ','
+        yield text
+    yield ']'
+
+
+class _Reader:
+    """Pull-based view of a byte stream as decoded text with a moving cursor."""
+
+    def __init__(self, stream, max_bytes):
+        self.stream = stream
+        self.max_bytes = max_bytes
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buf = ''
+        self.pos = 0
+        self.read_bytes = 0
+        self.eof = False
+
+    def fill(self):
+        """Append the next chunk; return False at end of body."""
+        if self.eof:
+            return False
+        chunk = self.stream.read(READ_CHUNK)
+        if not chunk:
+            self.eof = True
+            self.buf += self.decoder.decode(b'', final=True)
+            return False
+        self.read_bytes += len(chunk)
+        if self.read_bytes > self.max_bytes:
+            raise IngestError(f'Request body exceeds {self.max_bytes} bytes', 413)
+        # Drop what has been consumed so the buffer stays about one chunk long
+        if self.pos > READ_CHUNK:
+            self.buf, self.pos = self.buf[self.pos:], 0
+        self.buf += self.decoder.decode(chunk)
+        return True
+
+    def peek(self):
+        """Next non-whitespace character (not consumed), or '' at end of body."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf) or not self.fill():
+                return self.buf[self.pos:self.pos + 1]
+
+    def expect(self, chars):
+        char = self.peek()
+        if not char or char not in chars:
+            found = repr(char) if char else 'end of body'
+            raise IngestError(f"Invalid JSON: expected {' or '.join(repr(c) for c in chars)}, found {found}")
+        self.pos += 1
+        return char
+
+    def value(self, limit):
+        """Decode the JSON value at the cursor; ``limit`` caps its length in characters."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                if self.eof:
+                    raise IngestError(f'Invalid JSON: {e.msg}')
+                wanted = 2 * (len(self.buf) - self.pos)  # grow geometrically: linear total work
+            else:
+                # A number (or literal) cut at a chunk boundary decodes early: make
+                # sure the delimiter that ends it has arrived
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+                wanted = 0
+            if len(self.buf) - self.pos > limit:
+                raise IngestError(f'JSON value exceeds {limit} bytes', 413)
+            while self.fill() and len(self.buf) - self.pos < wanted:
+                pass
+
+
+def parse_task_upload(stream, max_bytes, max_tasks, max_task_bytes, spool_memory, tasks_key='monday_tasks'):
+    """Parse a JSON object body; return (fields, spool).
+
+    ``fields`` holds every top-level key except ``tasks_key``; ``spool`` is a
+    TaskSpool with its elements, or None if the key was absent or null.
+    """
+    reader = _Reader(stream, max_bytes)
+    fields, spool = {}, None
+    try:
+        reader.expect('{')
+        if reader.peek() == '}':
+            reader.pos += 1
+        else:
+            while True:
+                key = reader.value(max_task_bytes)
+                if not isinstance(key, str):
+                    raise IngestError('Invalid JSON: object keys must be strings')
+                reader.expect(':')
+                if key == tasks_key and reader.peek() == '[':
+                    if spool is not None:
+                        spool.close()
+                    spool = TaskSpool(spool_memory)
+                    _read_tasks(reader, spool, max_tasks, max_task_bytes)
+                    fields.pop(tasks_key, None)
+                else:
+                    fields[key] = reader.value(max_bytes)
+                    if key == tasks_key and spool is not None:
+                        spool.close()
+                        spool = None
+                if reader.expect(',}') == '}':
+                    break
+        if reader.peek():
+            raise IngestError('Invalid JSON: unexpected data after the object')
+    except Exception:
+        if spool is not None:
+            spool.close()
+        raise
+    return fields, spool
+
+
+def _read_tasks(reader, spool, max_tasks, max_task_bytes):
+    reader.expect('[')
+    if reader.peek() == ']':
+        reader.pos += 1
+        return
+    while True:
+        if spool.count >= max_tasks:
+            raise IngestError(f'At most {max_tasks} tasks per execution', 413)
+        task = reader.value(max_task_bytes)
+        if not isinstance(task, dict):
+            raise IngestError(f'monday_tasks[{spool.count}] must be an object')
+        text = json_codec.dumps(task)
+        if len(text) > max_task_bytes:
+            raise IngestError(f'monday_tasks[{spool.count}] exceeds {max_task_bytes} bytes', 413)
+        spool.append(text)
+        if reader.expect(',]') == ']':
+            return
+
+
+def iter_bulk_upload(stream, max_bytes, max_items, max_item_bytes, ndjson=False):
+    """Yield (index, item, error) for each execution of a bulk body.
+
+    ``error`` is an IngestError for an item that can be skipped (not an
+    object; in NDJSON also a malformed or oversized line), else None. Errors
+    that leave the rest of the body unreadable are raised instead.
+    """
+    items = _ndjson_items(stream, max_bytes, max_item_bytes) if ndjson else _array_items(stream, max_bytes, max_item_bytes)
+    for index, (item, error) in enumerate(items):
+        if index >= max_items:
+            raise IngestError(f'At most {max_items} executions per request', 413)
+        if error is None and not isinstance(item, dict):
+            error = IngestError(f'Item {index} must be an object')
+        yield index, item, error
+
+
+def _array_items(stream, max_bytes, max_item_bytes):
+    reader = _Reader(stream, max_bytes)
+    reader.expect('[')
+    if reader.peek() == ']':
+        reader.pos += 1
+    else:
+        while True:
+            yield reader.value(max_item_bytes), None
+            if reader.expect(',]') == ']':
+                break
+    if reader.peek():
+        raise IngestError('Invalid JSON: unexpected data after the array')
+
+
+def _ndjson_items(stream, max_bytes, max_item_bytes):
+    read_bytes = 0
+    while True:
+        line = stream.readline(max_item_bytes + 1)
+        if not line:
+            return
+        read_bytes += len(line)
+        if len(line) > max_item_bytes:
+            # Skip the rest of the line; the next one is still readable
+            while line and not line.endswith(b'\n'):
+                line = stream.readline(READ_CHUNK)
+                read_bytes += len(line)
+                if read_bytes > max_bytes:
+                    raise IngestError(f'Request body exceeds {max_bytes} bytes', 413)
+            yield None, IngestError(f'JSON value exceeds {max_item_bytes} bytes', 413)
+            continue
+        if read_bytes > max_bytes:
+            raise IngestError(f'Request body exceeds {max_bytes} bytes', 413)
+        if not line.strip():
+            continue
+        try:
+            yield json_codec.loads(line), None
+        except ValueError as e:
+            yield None, IngestError(f'Invalid JSON: {e}')
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+JSON encoding/decoding and response compression.
+
+* ``orjson`` when installed (JSON_CODEC=auto|orjson), else the stdlib
+  (JSON_CODEC=stdlib forces it); values orjson rejects fall back to stdlib
+* RawJSON wraps JSON text that is already stored in the database so it is
+  spliced into a response verbatim instead of parsed and re-encoded
+* gzip/deflate negotiation for JSON bodies above a size threshold
+
+JSONProvider plugs the codec into Flask, so ``jsonify`` and
+``request.get_json`` use it too.
+"""
+import decimal
+import gzip
+import json
+import os
+import zlib
+from datetime import date
+
+from flask.json.provider import JSONProvider
+from werkzeug.http import http_date, parse_accept_header
+
+try:
+    from .profiler import trace_span
+except ImportError:  # executed from inside app/
+    from profiler import trace_span
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_CODEC = os.environ.get('JSON_CODEC', 'auto').lower()
+if JSON_CODEC not in ('auto', 'orjson', 'stdlib'):
+    raise ValueError(f"JSON_CODEC must be 'auto', 'orjson' or 'stdlib', got {JSON_CODEC!r}")
+if JSON_CODEC == 'orjson' and orjson is None:
+    raise ImportError('JSON_CODEC=orjson but the orjson package is not installed')
+USE_ORJSON = orjson is not None and JSON_CODEC != 'stdlib'
+
+COMPRESS_MIN_BYTES = int(os.environ.get('JSON_COMPRESS_MIN_BYTES', 1024))  # 0 disables
+COMPRESS_LEVEL = int(os.environ.get('JSON_COMPRESS_LEVEL', 1))
+
+
+class RawJSON:
+    """Already-encoded JSON text (e.g. a stored task list) to emit as-is."""
+
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+    def encoded(self):
+        return self.text.encode('utf-8') if isinstance(self.text, str) else self.text
+
+
+def _default(o):
+    # Same representations as Flask's default provider
+    if isinstance(o, RawJSON):
+        # Only top-level values are spliced; anything nested is parsed
+        return loads(o.text)
+    if isinstance(o, date):
+        return http_date(o)
+    if isinstance(o, decimal.Decimal):
+        return str(o)
+    raise TypeError(f'Object of type {type(o).__name__} is not JSON serializable')
+
+
+def _encode(obj):
+    if USE_ORJSON:
+        try:
+            return orjson.dumps(obj, default=_default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:
+            pass  # e.g. integers beyond 64 bits, non-string keys
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def dumps_parts(obj):
+    """Encode obj as a list of bytes and the top-level RawJSON values between them."""
+    if isinstance(obj, RawJSON):
+        return [obj]
+    if not (isinstance(obj, dict) and any(isinstance(v, RawJSON) for v in obj.values())):
+        return [_encode(obj)]
+    parts, pending = [], b'{'
+    for index, (key, value) in enumerate(obj.items()):
+        pending += (b',' if index else b'') + _encode(str(key)) + b':'
+        if isinstance(value, RawJSON):
+            parts.extend((pending, value))
+            pending = b''
+        else:
+            pending += _encode(value)
+    parts.append(pending + b'}')
+    return parts
+
+
+def dumps_bytes(obj):
+    """Encode obj to UTF-8 JSON bytes, splicing top-level RawJSON values."""
+    with trace_span('serialize', 'dumps'):
+        if isinstance(obj, RawJSON):
+            return obj.encoded()
+        return b''.join(part.encoded() if isinstance(part, RawJSON) else part for part in dumps_parts(obj))
+
+
+def dumps(obj):
+    return dumps_bytes(obj).decode('utf-8')
+
+
+def loads(data):
+    with trace_span('serialize', 'loads'):
+        if USE_ORJSON:
+            return orjson.loads(data)
+        return json.loads(data)
+
+
+class FastJSONProvider(JSONProvider):
+    """Flask JSON provider backed by this module."""
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj)
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype='application/json')
+
+
+# ----------------------------------------------------------------------
+# Compression
+# ----------------------------------------------------------------------
+
+def negotiate_encoding(accept_encoding, size, prefer=()):
+    """'gzip', 'deflate' or None for a body of ``size`` bytes.
+
+    Encodings in ``prefer`` (e.g. ones already compressed) are tried first
+    and may include others, such as 'zstd'.
+    """
+    if not COMPRESS_MIN_BYTES or size < COMPRESS_MIN_BYTES or not accept_encoding:
+        return None
+    accepts = parse_accept_header(accept_encoding)
+    for encoding in (*prefer, 'gzip', 'deflate'):
+        if accepts[encoding] > 0:
+            return encoding
+    return None
+
+
+def compress(body, encoding):
+    if encoding not in ('gzip', 'deflate'):
+        return body
+    with trace_span('serialize', encoding):
+        if encoding == 'gzip':
+            return gzip.compress(body, compresslevel=COMPRESS_LEVEL, mtime=0)
+        return zlib.compress(body, COMPRESS_LEVEL)  # HTTP "deflate" is zlib-wrapped
+
+
+def codec_name():
+    return 'orjson' if USE_ORJSON else 'stdlib'
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Live execution status for the dashboard (Server-Sent Events at /events/<id>).
+
+Every process keeps one feed per execution that has at least one open
+stream. Writers don't talk to streams: the existing invalidation path
+(invalidate_tasks ➜ after commit locally, NOTIFY hitl_tasks on Postgres)
+marks the feed dirty, and a single refresher thread reloads its state with
+one query – however many browser tabs are watching – and wakes the streams.
+Each stream diffs the new state against what it last sent:
+
+* ``snapshot``  – full state, first event of every connection
+* ``status``    – status or authoritative expiry changed
+* ``decisions`` – decisions saved by any reviewer since the last event
+
+With SQLite and several worker processes, other processes' writes are only
+seen by the periodic resync. A stream ends after a terminal status.
+"""
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    from . import json_codec
+    from .event_log import log
+    from .notifier import AsyncWaiter
+except ImportError:  # executed from inside app/
+    import json_codec
+    from event_log import log
+    from notifier import AsyncWaiter
+
+PENDING = 'pending'
+GONE = 'gone'  # delivered (self-destructed) or never stored
+TERMINAL = ('approved', 'auto_approved', 'expired', GONE)
+
+
+class Feed:
+    __slots__ = ('state', 'waiters')
+
+    def __init__(self):
+        self.state = None  # last loaded state, replaced (never mutated) on change
+        self.waiters = set()
+
+
+class LiveStatus:
+    """Per-execution state shared by every stream in this process."""
+
+    def __init__(self, load_state, resync_interval=15.0):
+        self.load_state = load_state  # execution_id -> state dict (see server.execution_state)
+        self.resync_interval = resync_interval
+        self._lock = threading.Lock()
+        self._feeds = {}
+        self._dirty = set()
+        self._wake = threading.Event()
+        self._thread = None
+        self._stats = {'refreshes': 0, 'changes': 0, 'errors': 0}
+
+    # ------------------------------------------------------------------
+    # Streams
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def watch_async(self, execution_id):
+        """Subscribe a stream; yield an asyncio.Event set whenever the state changes."""
+        waiter = AsyncWaiter(asyncio.get_running_loop())
+        with self._lock:
+            self._feeds.setdefault(execution_id, Feed()).waiters.add(waiter)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='hitl-live-status', daemon=True)
+                self._thread.start()
+        try:
+            yield waiter.event
+        finally:
+            with self._lock:
+                feed = self._feeds.get(execution_id)
+                if feed is not None:
+                    feed.waiters.discard(waiter)
+                    if not feed.waiters:
+                        del self._feeds[execution_id]
+                        self._dirty.discard(execution_id)
+
+    def current(self, execution_id):
+        with self._lock:
+            feed = self._feeds.get(execution_id)
+            return feed.state if feed else None
+
+    def seed(self, execution_id):
+        """State for a new stream: the feed's if loaded, else load it now (blocking)."""
+        state = self.current(execution_id)
+        if state is not None:
+            return state
+        state = self.load_state(execution_id)
+        with self._lock:
+            feed = self._feeds.get(execution_id)
+            if feed is None:
+                return state
+            if feed.state is None:
+                feed.state = state
+            return feed.state
+
+    # ------------------------------------------------------------------
+    # Change notifications (any thread)
+    # ------------------------------------------------------------------
+
+    def changed(self, *execution_ids):
+        """execution_ids were written – reload those anyone is watching."""
+        with self._lock:
+            watched = [execution_id for execution_id in execution_ids if execution_id in self._feeds]
+            if not watched:
+                return
+            self._dirty.update(watched)
+        self._wake.set()
+
+    def changed_all(self):
+        """Notifications may have been lost (listener reconnect) – reload everything."""
+        with self._lock:
+            self._dirty.update(self._feeds)
+        self._wake.set()
+
+    # ------------------------------------------------------------------
+    # Refresher thread
+    # ------------------------------------------------------------------
+
+    def _run(self):
+        next_resync = time.monotonic() + self.resync_interval
+        while True:
+            self._wake.wait(max(0, next_resync - time.monotonic()))
+            self._wake.clear()
+            with self._lock:
+                if time.monotonic() >= next_resync:
+                    self._dirty.update(self._feeds)
+                    next_resync = time.monotonic() + self.resync_interval
+                execution_ids, self._dirty = self._dirty, set()
+            for execution_id in execution_ids:
+                self._refresh(execution_id)
+
+    def _refresh(self, execution_id):
+        try:
+            state = self.load_state(execution_id)
+        except Exception as e:
+            with self._lock:
+                self._stats['errors'] += 1
+            log.error('live_status_refresh_failed', '❌ Live status refresh for {execution_id} failed: {error}',
+                      execution_id=execution_id, error=str(e))
+            return
+        with self._lock:
+            self._stats['refreshes'] += 1
+            feed = self._feeds.get(execution_id)
+            if feed is None or feed.state == state:
+                return
+            feed.state = state
+            self._stats['changes'] += 1
+            waiters = list(feed.waiters)
+        for waiter in waiters:
+            waiter.set()
+
+    # ------------------------------------------------------------------
+    # Introspection
+    # ------------------------------------------------------------------
+
+    def streams(self):
+        with self._lock:
+            return sum(len(feed.waiters) for feed in self._feeds.values())
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['feeds'] = len(self._feeds)
+            stats['streams'] = sum(len(feed.waiters) for feed in self._feeds.values())
+        stats['resync_interval_sec'] = self.resync_interval
+        return stats
+
+
+# ----------------------------------------------------------------------
+# SSE wire format
+# ----------------------------------------------------------------------
+
+def _decision_list(decisions):
+    return [{'task_index': index, 'approved': approved} for index, approved in sorted(decisions.items())]
+
+
+def _status(state):
+    expires_at = state.get('expires_ts')
+    return {
+        'execution_id': state['execution_id'],
+        'status': state['status'],
+        'expires_at': state.get('expires_at'),
+        # Relative, so a client with a skewed clock still counts down correctly
+        'expires_in': None if expires_at is None else round(max(0.0, expires_at - time.time()), 1),
+    }
+
+
+def sse_event(event, data):
+    return f'event: {event}\ndata: {json_codec.dumps(data)}\n\n'.encode('utf-8')
+
+
+def render_snapshot(state, retry_ms=None, push=True):
+    """First message of a connection: the full state.
+
+    push=False (sync workers) tells the dashboard no changes will follow.
+    """
+    data = _status(state)
+    if not push:
+        data['push'] = False
+    if state['status'] != GONE:
+        data.update(
+            total_tasks=state['total_tasks'],
+            approved_count=state['approved_count'],
+            decisions=_decision_list(state['decisions']),
+        )
+    prefix = f'retry: {int(retry_ms)}\n\n'.encode('utf-8') if retry_ms else b''
+    return prefix + sse_event('snapshot', data)
+
+
+def render_changes(sent, state):
+    """Events taking a client from ``sent`` to ``state`` (b'' if nothing changed)."""
+    chunks = []
+    decisions = state.get('decisions', {})
+    changed = {index: approved for index, approved in decisions.items()
+               if sent.get('decisions', {}).get(index) != approved}
+    if changed:
+        chunks.append(sse_event('decisions', {
+            'decisions': _decision_list(changed),
+            'approved_count': state['approved_count'],
+        }))
+    if state['status'] != sent['status'] or state.get('expires_at') != sent.get('expires_at'):
+        chunks.append(sse_event('status', _status(state)))
+    return b''.join(chunks)
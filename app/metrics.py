@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Minimal Prometheus metrics, aggregated across worker processes.
+
+Each process records into an in-memory Registry (a lock and a few dict
+operations per observation). A background thread writes the registry as a
+JSON snapshot to ``<dir>/<pid>.json`` every few seconds; /metrics merges the
+serving process's live registry with every other worker's snapshot and
+renders the Prometheus text format.
+
+Merging sums counters and histograms (including those of workers that have
+exited, so totals never go backwards) and sums gauges of live workers only.
+"""
+import bisect
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from functools import lru_cache
+
+try:
+    from .event_log import log
+except ImportError:  # executed from inside app/
+    from event_log import log
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LABEL_SEP = '\x1f'
+
+
+class Metric:
+    type = None
+
+    def __init__(self, registry, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = registry._lock
+        self._values = {}
+
+    def _key(self, labels):
+        return LABEL_SEP.join(str(labels.get(name, '')) for name in self.labelnames)
+
+    def snapshot(self):
+        # Called with the registry lock held
+        return {
+            'type': self.type,
+            'help': self.help,
+            'labelnames': list(self.labelnames),
+            'samples': dict(self._values),
+        }
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value, **labels):
+        """Mirror a cumulative total kept elsewhere (e.g. PgPool.stats())."""
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, registry, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            sample = self._values.get(key)
+            if sample is None:
+                # per-bucket counts (last one is +Inf), then sum
+                sample = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            sample[index] += 1
+            sample[-1] += value
+
+    def snapshot(self):
+        snap = super().snapshot()
+        snap['buckets'] = list(self.buckets)
+        snap['samples'] = {key: list(sample) for key, sample in self._values.items()}
+        return snap
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._collectors = []
+
+    def _add(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(self, name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._add(Gauge(self, name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(self, name, help, labelnames, buckets))
+
+    def on_collect(self, callback):
+        """Run callback() before every snapshot (to refresh gauges/mirrored totals)."""
+        self._collectors.append(callback)
+        return callback
+
+    def snapshot(self):
+        for callback in self._collectors:
+            try:
+                callback()
+            except Exception as e:
+                log.error('metrics_collector_error', '❌ Metrics collector error: {error}', error=str(e))
+        with self._lock:
+            return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+
+# ----------------------------------------------------------------------
+# SQL statement labels
+# ----------------------------------------------------------------------
+
+_IN_LIST = re.compile(r'\(\s*(?:\?|%s)(?:\s*,\s*(?:\?|%s))+\s*\)')
+_VALUES_LIST = re.compile(r'(\(\s*(?:\?|%s)(?:\s*,\s*(?:\?|%s))*\s*\))(?:\s*,\s*\(\s*(?:\?|%s)(?:\s*,\s*(?:\?|%s))*\s*\))+')
+
+
+@lru_cache(maxsize=2048)
+def statement_label(query, max_length=120):
+    """Low-cardinality label for a SQL statement (whitespace and ?-lists collapsed)."""
+    text = ' '.join(query.split())
+    text = _VALUES_LIST.sub(r'\1, ...', text)
+    text = _IN_LIST.sub('(...)', text)
+    return text if len(text) <= max_length else text[:max_length - 3] + '...'
+
+
+# ----------------------------------------------------------------------
+# Cross-process aggregation
+# ----------------------------------------------------------------------
+
+def default_metrics_dir():
+    """Shared by all workers of one gunicorn/uvicorn master (their parent)."""
+    return os.path.join(tempfile.gettempdir(), f'hitl-metrics-{os.getppid()}')
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MultiProcessExporter(threading.Thread):
+    """Flush this process's snapshot periodically; merge all of them on demand."""
+
+    def __init__(self, registry, directory, interval=5.0):
+        super().__init__(name='hitl-metrics', daemon=True)
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                log.error('metrics_flush_error', '❌ Metrics flush error: {error}', error=str(e))
+
+    def flush(self):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'{os.getpid()}.json')
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.registry.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def collect(self):
+        """Live snapshot of this process plus every other worker's last flush."""
+        snapshots = [(True, self.registry.snapshot())]
+        own = f'{os.getpid()}.json'
+        try:
+            filenames = os.listdir(self.directory)
+        except FileNotFoundError:
+            filenames = []
+        for filename in filenames:
+            if not filename.endswith('.json') or filename == own:
+                continue
+            try:
+                with open(os.path.join(self.directory, filename)) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue  # mid-write or removed
+            snapshots.append((pid_alive(int(filename[:-5])), snapshot))
+        return merge(snapshots)
+
+
+def merge(snapshots):
+    merged = {}
+    for alive, snapshot in snapshots:
+        for name, metric in snapshot.items():
+            if metric['type'] == 'gauge' and not alive:
+                continue
+            target = merged.setdefault(name, dict(metric, samples={}))
+            for key, value in metric['samples'].items():
+                if metric['type'] == 'histogram':
+                    current = target['samples'].get(key)
+                    target['samples'][key] = value if current is None else [a + b for a, b in zip(current, value)]
+                else:
+                    target['samples'][key] = target['samples'].get(key, 0) + value
+    return merged
+
+
+def _labels(labelnames, key, extra=()):
+    values = key.split(LABEL_SEP) if labelnames else []
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        f'{name}="' + value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') + '"'
+        for name, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(merged):
+    """Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for name in sorted(merged):
+        metric = merged[name]
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        labelnames = metric['labelnames']
+        for key in sorted(metric['samples']):
+            value = metric['samples'][key]
+            if metric['type'] != 'histogram':
+                lines.append(f'{name}{_labels(labelnames, key)} {_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(metric['buckets'] + ['+Inf'], value[:-1]):
+                cumulative += count
+                le = bound if bound == '+Inf' else _number(float(bound))
+                lines.append(f'{name}_bucket{_labels(labelnames, key, [("le", le)])} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labelnames, key)} {_number(float(value[-1]))}')
+            lines.append(f'{name}_count{_labels(labelnames, key)} {cumulative}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Versioned schema migrations for both backends.
+
+MIGRATIONS is an ordered list of (version, name, statements). A statement is
+plain SQL shared by both backends, a dict keyed by 'postgres' / 'sqlite', or
+a callable(conn, use_postgres) for steps SQL alone can't make idempotent.
+Every statement must be idempotent (IF NOT EXISTS …) so databases created
+before this module existed migrate cleanly.
+
+run_migrations() applies the missing versions in a single transaction while
+holding a lock, so concurrent gunicorn workers apply each step exactly once:
+
+* Postgres – pg_advisory_xact_lock (released on commit/rollback)
+* SQLite   – BEGIN IMMEDIATE (database write lock)
+"""
+try:
+    from .event_log import log
+except ImportError:  # executed from inside app/
+    from event_log import log
+
+MIGRATION_LOCK_KEY = 0x4849544d  # "HITM"
+BINARY = {'postgres': 'BYTEA', 'sqlite': 'BLOB'}
+
+
+def add_column(table, column, definition):
+    """Step adding a column unless it already exists (SQLite lacks IF NOT EXISTS).
+
+    ``definition`` may be a dict keyed by backend, like a statement.
+    """
+    def step(conn, use_postgres):
+        definition_sql = dialect_sql(definition, use_postgres)
+        if use_postgres:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {definition_sql}')
+            return
+        existing = {row[0] for row in conn.execute(f"SELECT name FROM pragma_table_info('{table}')")}
+        if column not in existing:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition_sql}')
+    return step
+
+
+MIGRATIONS = [
+    (1, 'create executions and approvals', [
+        '''
+        CREATE TABLE IF NOT EXISTS executions (
+            execution_id TEXT PRIMARY KEY,
+            monday_tasks TEXT NOT NULL,
+            meeting_title TEXT,
+            meeting_organizer TEXT,
+            total_tasks INTEGER,
+            status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP,
+            meetings_data TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS approvals (
+            execution_id TEXT PRIMARY KEY,
+            approved_tasks TEXT NOT NULL,
+            approved_count INTEGER,
+            total_tasks INTEGER,
+            submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            method TEXT DEFAULT 'manual'
+        )
+        ''',
+    ]),
+    (2, 'create scheduler_leases', [
+        '''
+        CREATE TABLE IF NOT EXISTS scheduler_leases (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at TIMESTAMP NOT NULL
+        )
+        ''',
+    ]),
+    (3, 'index pending executions by expires_at', [
+        '''
+        CREATE INDEX IF NOT EXISTS idx_executions_pending_expires
+        ON executions (expires_at) WHERE status = 'pending'
+        ''',
+    ]),
+    (4, 'index approvals by submitted_at', [
+        '''
+        CREATE INDEX IF NOT EXISTS idx_approvals_submitted_at
+        ON approvals (submitted_at)
+        ''',
+    ]),
+    (5, 'index finished executions by expires_at', [
+        '''
+        CREATE INDEX IF NOT EXISTS idx_executions_finished_expires
+        ON executions (expires_at) WHERE status <> 'pending'
+        ''',
+    ]),
+    (6, 'per-task storage layout', [
+        '''
+        CREATE TABLE IF NOT EXISTS execution_tasks (
+            execution_id TEXT NOT NULL,
+            task_index INTEGER NOT NULL,
+            task TEXT NOT NULL,
+            approved BOOLEAN,
+            auto_approved BOOLEAN NOT NULL DEFAULT FALSE,
+            approval_reason TEXT,
+            PRIMARY KEY (execution_id, task_index)
+        )
+        ''',
+        add_column('executions', 'task_layout', "TEXT NOT NULL DEFAULT 'blob'"),
+        add_column('approvals', 'task_layout', "TEXT NOT NULL DEFAULT 'blob'"),
+    ]),
+    (7, 'autosaved decisions for blob executions', [
+        '''
+        CREATE TABLE IF NOT EXISTS task_decisions (
+            execution_id TEXT NOT NULL,
+            task_index INTEGER NOT NULL,
+            approved BOOLEAN NOT NULL,
+            decided_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (execution_id, task_index)
+        )
+        ''',
+    ]),
+    (8, 'sweeper status snapshot', [
+        '''
+        CREATE TABLE IF NOT EXISTS sweeper_status (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            last_run_at TIMESTAMP NOT NULL,
+            duration_ms REAL,
+            pending_executions INTEGER NOT NULL,
+            expired_backlog INTEGER NOT NULL,
+            completed_approvals INTEGER NOT NULL
+        )
+        ''',
+    ]),
+    (9, 'webhook deliveries', [
+        add_column('executions', 'callback_url', 'TEXT'),
+        '''
+        CREATE TABLE IF NOT EXISTS webhook_deliveries (
+            execution_id TEXT PRIMARY KEY,
+            callback_url TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at TIMESTAMP NOT NULL,
+            last_error TEXT,
+            claim_token TEXT,
+            claimed_until TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_webhook_deliveries_due
+        ON webhook_deliveries (next_attempt_at) WHERE status = 'pending'
+        ''',
+    ]),
+    (10, 'index executions for the reviewer inbox', [
+        # Keyset pages ordered by (expires_at, execution_id), with and without an organizer filter
+        '''
+        CREATE INDEX IF NOT EXISTS idx_executions_inbox
+        ON executions (status, expires_at, execution_id)
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_executions_inbox_organizer
+        ON executions (meeting_organizer, status, expires_at, execution_id)
+        ''',
+    ]),
+    (11, 'partition key and delivery flag for approvals', [
+        # Creation time of the approved execution (the partition key with PARTITIONED_STORAGE)
+        add_column('approvals', 'execution_created_at', 'TIMESTAMP'),
+        # Set instead of deleting the row when partitioned
+        add_column('approvals', 'delivered_at', 'TIMESTAMP'),
+    ]),
+    (12, 'content hashes for replay detection', [
+        add_column('executions', 'content_hash', 'TEXT'),
+        add_column('approvals', 'content_hash', 'TEXT'),
+    ]),
+    (13, 'compressed blob columns', [
+        # Codec of the *_packed columns (blob_codec.py); NULL / unset packed column ➜ plain text
+        add_column('executions', 'blob_codec', 'TEXT'),
+        add_column('executions', 'monday_tasks_packed', BINARY),
+        add_column('executions', 'meetings_data_packed', BINARY),
+        add_column('approvals', 'blob_codec', 'TEXT'),
+        add_column('approvals', 'approved_tasks_packed', BINARY),
+        # Already compressed: keep TOAST from trying again
+        {'postgres': '''
+            ALTER TABLE executions
+                ALTER COLUMN monday_tasks_packed SET STORAGE EXTERNAL,
+                ALTER COLUMN meetings_data_packed SET STORAGE EXTERNAL
+        '''},
+        {'postgres': 'ALTER TABLE approvals ALTER COLUMN approved_tasks_packed SET STORAGE EXTERNAL'},
+    ]),
+]
+
+
+def dialect_sql(statement, use_postgres):
+    if isinstance(statement, dict):
+        return statement.get('postgres' if use_postgres else 'sqlite')
+    return statement
+
+
+def run_migrations(connect_db, use_postgres, migrations=MIGRATIONS):
+    """Apply pending migrations; return the list of versions applied."""
+    applied_now = []
+    with connect_db() as conn:
+        if use_postgres:
+            conn.execute('SELECT pg_advisory_xact_lock(?)', (MIGRATION_LOCK_KEY,))
+        else:
+            conn.execute('BEGIN IMMEDIATE')
+
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        applied = {row[0] for row in conn.execute('SELECT version FROM schema_migrations')}
+
+        for version, name, statements in sorted(migrations, key=lambda m: m[0]):
+            if version in applied:
+                continue
+            for statement in statements:
+                if callable(statement):
+                    statement(conn, use_postgres)
+                    continue
+                sql = dialect_sql(statement, use_postgres)
+                if sql:
+                    conn.execute(sql)
+            conn.execute('INSERT INTO schema_migrations (version, name) VALUES (?, ?)', (version, name))
+            log.info('migration_applied', '🗄️ Applied migration {version}: {name}', version=version, name=name)
+            applied_now.append(version)
+    return applied_now
+
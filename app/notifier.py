@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Approval notifications for the /get-approved long-poll.
+
+Waiters register interest in an execution_id and block on an event instead of
+re-querying the approvals table. Writers publish the execution_id once the
+approval row is committed:
+
+* SQLite   – in-process fan-out (ApprovalNotifier.publish after commit);
+             approvals committed by other processes sharing the file are
+             picked up by a SqliteApprovalWatcher thread
+* Postgres – NOTIFY inside the writing transaction, relayed into every
+             worker's ApprovalNotifier by a PgApprovalListener thread
+
+The same listener relays TASKS_CHANNEL (execution changed) so every worker
+can drop its cached /get-tasks response.
+"""
+import asyncio
+import select
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    from .event_log import log
+except ImportError:  # executed from inside app/
+    from event_log import log
+
+APPROVAL_CHANNEL = 'hitl_approvals'
+TASKS_CHANNEL = 'hitl_tasks'
+
+
+class ApprovalNotifier:
+    """In-process registry of approval waiters keyed by execution_id."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = {}
+
+    @contextmanager
+    def watch(self, execution_id):
+        """Register a waiter for execution_id and yield its threading.Event.
+
+        Subscribe *before* checking the database so an approval committed in
+        between cannot be missed.
+        """
+        event = threading.Event()
+        self.subscribe(execution_id, event)
+        try:
+            yield event
+        finally:
+            self.unsubscribe(execution_id, event)
+
+    @contextmanager
+    def watch_async(self, execution_id):
+        """Like watch(), but yield an asyncio.Event bound to the running loop."""
+        waiter = AsyncWaiter(asyncio.get_running_loop())
+        self.subscribe(execution_id, waiter)
+        try:
+            yield waiter.event
+        finally:
+            self.unsubscribe(execution_id, waiter)
+
+    def subscribe(self, execution_id, waiter):
+        """Add any object with a ``set()`` method as a waiter."""
+        with self._lock:
+            self._waiters.setdefault(execution_id, set()).add(waiter)
+
+    def unsubscribe(self, execution_id, waiter):
+        with self._lock:
+            waiters = self._waiters.get(execution_id)
+            if waiters is not None:
+                waiters.discard(waiter)
+                if not waiters:
+                    del self._waiters[execution_id]
+
+    def publish(self, *execution_ids):
+        """Wake every waiter for execution_ids."""
+        with self._lock:
+            waiters = [w for execution_id in execution_ids for w in self._waiters.get(execution_id, ())]
+        for waiter in waiters:
+            waiter.set()
+
+    def watched(self):
+        """execution_ids that currently have waiters."""
+        with self._lock:
+            return list(self._waiters)
+
+    def publish_all(self):
+        """Wake every waiter (e.g. after notifications may have been lost)."""
+        with self._lock:
+            waiters = [w for group in self._waiters.values() for w in group]
+        for waiter in waiters:
+            waiter.set()
+
+    def waiting(self):
+        """Number of registered waiters."""
+        with self._lock:
+            return sum(len(group) for group in self._waiters.values())
+
+
+class AsyncWaiter:
+    """Waiter that sets an asyncio.Event from whichever thread publishes."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.event = asyncio.Event()
+
+    def set(self):
+        self.loop.call_soon_threadsafe(self.event.set)
+
+
+class SqliteApprovalWatcher(threading.Thread):
+    """Relay approvals committed by other processes (gunicorn workers) sharing a SQLite file.
+
+    While this process has waiters, every ``interval`` seconds it reads
+    ``PRAGMA data_version`` on its own connection – a header read that
+    changes only when another connection has committed. Only then does it
+    ask ``find_approved(conn, execution_ids)`` which watched executions
+    now have an approval, and wakes their waiters. Waiters never poll.
+    """
+
+    def __init__(self, connect, notifier, find_approved, interval=2.0):
+        super().__init__(name='sqlite-approval-watcher', daemon=True)
+        self.connect = connect              # () -> this thread's sqlite3 connection
+        self.notifier = notifier
+        self.find_approved = find_approved
+        self.interval = interval
+
+    def run(self):
+        last_version = None
+        while True:
+            time.sleep(self.interval)
+            try:
+                watched = self.notifier.watched()
+                if not watched:
+                    last_version = None  # re-check once as soon as someone waits again
+                    continue
+                conn = self.connect()
+                version = conn.execute('PRAGMA data_version').fetchone()[0]
+                if version == last_version:
+                    continue
+                last_version = version
+                approved = self.find_approved(conn, watched)
+                if approved:
+                    self.notifier.publish(*approved)
+            except Exception as e:
+                log.error('approval_watcher_error', '❌ Approval watcher error: {error}', error=str(e))
+
+
+class PgApprovalListener(threading.Thread):
+    """LISTEN on a dedicated Postgres connection and relay NOTIFY payloads.
+
+    One listener runs per worker process; the connection is kept outside the
+    request pool so waiting never consumes a pooled connection.
+    """
+
+    KEEPALIVE_SEC = 30
+
+    def __init__(self, dsn, notifier, channel=APPROVAL_CHANNEL, reconnect_delay=1.0, handlers=None):
+        super().__init__(name='pg-approval-listener', daemon=True)
+        self.dsn = dsn
+        self.notifier = notifier
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        # channel -> (on_notify(payload), on_reconnect())
+        self.handlers = {channel: (notifier.publish, notifier.publish_all)}
+        self.handlers.update(handlers or {})
+
+    def run(self):
+        import psycopg2
+        from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    for channel in self.handlers:
+                        cur.execute(f'LISTEN {channel}')
+                # Anything committed while we were (re)connecting was not seen:
+                # let every waiter re-check the database once.
+                for _, on_reconnect in self.handlers.values():
+                    on_reconnect()
+
+                while True:
+                    readable, _, _ = select.select([conn], [], [], self.KEEPALIVE_SEC)
+                    if not readable:
+                        # Idle – make sure the connection is still alive
+                        with conn.cursor() as cur:
+                            cur.execute('SELECT 1')
+                    conn.poll()
+                    while conn.notifies:
+                        note = conn.notifies.pop(0)
+                        handler = self.handlers.get(note.channel)
+                        if handler:
+                            handler[0](note.payload)
+            except Exception as e:
+                log.error('approval_listener_error', '❌ Approval listener error: {error}', error=str(e))
+                time.sleep(self.reconnect_delay)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Time-partitioned executions / approvals (PARTITIONED_STORAGE=true, Postgres).
+
+Both tables are range-partitioned on the execution's creation time
+(executions.created_at, approvals.execution_created_at) in spans of
+``span``, so an execution and its approval always land in partitions with
+the same bounds. In this mode:
+
+* delivering an approval flags the rows (status 'delivered', delivered_at)
+  instead of deleting them – no DELETE churn for autovacuum on the hot path
+* retention detaches whole partitions once their span ended ``retention``
+  ago, then removes the per-task rows of the executions they held
+* with ``archive`` set, detached partitions are kept as archive_<name>
+  tables for that long (for audit), then dropped
+* a DEFAULT partition catches rows outside the premade spans; the sweeper
+  purges it row by row as in the classic layout
+
+Primary keys include the partition key, so execution_id alone is no longer
+unique: a delivered execution stored again gets a new row (a new
+generation), and every read skips delivered rows.
+
+The tables are converted in place (one transaction) the first time the mode
+is enabled. Once partitioned they stay partitioned, whatever the setting.
+"""
+import re
+import threading
+from datetime import datetime, timedelta
+
+try:
+    from .event_log import log
+except ImportError:  # executed from inside app/
+    from event_log import log
+
+DELIVERED = 'delivered'
+
+EPOCH = datetime(2000, 1, 1)
+LOCK_KEY = 0x48495450        # "HITP" – partition DDL
+STORE_LOCK_CLASS = 0x48495453  # "HITS" – (class, hashtext(execution_id)) while storing
+
+# (table, partition key, backfill for rows written before the key existed)
+TABLES = (
+    ('executions', 'created_at', 'CURRENT_TIMESTAMP'),
+    ('approvals', 'execution_created_at', '''COALESCE(
+        (SELECT MAX(e.created_at) FROM executions e WHERE e.execution_id = approvals.execution_id),
+        submitted_at, CURRENT_TIMESTAMP)'''),
+)
+PARTITION_NAME = re.compile(r'^(executions|approvals)_p(\d{10})$')
+
+
+def sql_timestamp(ts):
+    return ts.strftime('%Y-%m-%d %H:%M:%S')
+
+
+class TimePartitions:
+    """Partition DDL and retention for the executions and approvals tables."""
+
+    def __init__(self, span=timedelta(hours=24), retention=timedelta(hours=24),
+                 archive=timedelta(0), premake=3):
+        if span < timedelta(hours=1) or span % timedelta(hours=1):
+            raise ValueError('Partition span must be a whole number of hours')
+        self.span = span
+        self.retention = retention
+        self.archive = archive
+        self.premake = premake
+        self.active = False  # set by setup(): the tables are partitioned
+        self._lock = threading.Lock()
+        self._stats = {'created': 0, 'detached': 0, 'archived': 0, 'dropped': 0, 'deferred': 0}
+
+    # ------------------------------------------------------------------
+    # Keys (ON CONFLICT targets)
+    # ------------------------------------------------------------------
+
+    @property
+    def execution_key(self):
+        return 'execution_id, created_at' if self.active else 'execution_id'
+
+    @property
+    def approval_key(self):
+        return 'execution_id, execution_created_at' if self.active else 'execution_id'
+
+    def live_created_at(self, conn, execution_id):
+        """created_at of the undelivered row for execution_id, or None for a new generation.
+
+        Nothing enforces one live row per execution_id across partitions, so
+        concurrent stores of the same id are serialized here.
+        """
+        conn.execute('SELECT pg_advisory_xact_lock(?, hashtext(?))', (STORE_LOCK_CLASS, execution_id))
+        rows = conn.execute(f'''
+            SELECT created_at FROM executions WHERE execution_id = ? AND status <> '{DELIVERED}'
+        ''', (execution_id,))
+        return rows[0][0] if rows else None
+
+    # ------------------------------------------------------------------
+    # Setup (every worker at startup)
+    # ------------------------------------------------------------------
+
+    def setup(self, conn, enabled, now=None):
+        """Convert the tables if enabled; return whether they are partitioned."""
+        now = now or datetime.now()
+        conn.execute('SELECT pg_advisory_xact_lock(?)', (LOCK_KEY,))
+        rows = conn.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('executions')")
+        partitioned = bool(rows) and rows[0][0] == 'p'
+        if enabled and not partitioned:
+            for table, key, backfill in TABLES:
+                self._convert(conn, table, key, backfill, now)
+            log.info('partitions_converted', '🗂️ Converted executions and approvals to time partitions '
+                     '({span_hours:.0f}h spans)', span_hours=self.span / timedelta(hours=1))
+            partitioned = True
+        elif partitioned and not enabled:
+            log.warning('partitions_kept', '⚠️ PARTITIONED_STORAGE is off but the tables are partitioned – '
+                        'keeping partitioned storage')
+        if partitioned:
+            self.ensure(conn, now)
+        self.active = partitioned
+        return partitioned
+
+    def _convert(self, conn, table, key, backfill, now):
+        """Rebuild ``table`` as a partitioned table with the same columns, indexes and rows."""
+        staging = f'{table}_partitioned'
+        indexes = [row[0] for row in conn.execute('''
+            SELECT pg_get_indexdef(indexrelid) FROM pg_index
+            WHERE indrelid = to_regclass(?) AND NOT indisprimary
+        ''', (table,))]
+        conn.execute(f'UPDATE {table} SET {key} = {backfill} WHERE {key} IS NULL')
+        conn.execute(f'''
+            CREATE TABLE {staging} (LIKE {table} INCLUDING DEFAULTS INCLUDING STORAGE, PRIMARY KEY (execution_id, {key}))
+            PARTITION BY RANGE ({key})
+        ''')
+        conn.execute(f'CREATE TABLE {table}_default PARTITION OF {staging} DEFAULT')
+        # Spans for recent rows; anything older goes to the default partition
+        newest = conn.execute(f'SELECT MAX({key}) FROM {table}')[0][0]
+        start = self.bounds(now - self.retention)[0]
+        if newest:
+            start = min(start, self.bounds(newest)[0])
+        while start <= now + self.span * self.premake:
+            self._create(conn, staging, table, start)
+            start += self.span
+        conn.execute(f'INSERT INTO {staging} SELECT * FROM {table}')
+        conn.execute(f'DROP TABLE {table}')
+        conn.execute(f'ALTER TABLE {staging} RENAME TO {table}')
+        conn.execute(f'ALTER TABLE {table} RENAME CONSTRAINT {staging}_pkey TO {table}_pkey')
+        for definition in indexes:
+            conn.execute(definition)
+
+    # ------------------------------------------------------------------
+    # Partition DDL
+    # ------------------------------------------------------------------
+
+    def bounds(self, ts):
+        """[start, end) of the span holding ts."""
+        start = EPOCH + (ts - EPOCH) // self.span * self.span
+        return start, start + self.span
+
+    def ensure(self, conn, now=None):
+        """Create the partitions for the current span and ``premake`` spans ahead."""
+        start = self.bounds(now or datetime.now())[0]
+        for _ in range(self.premake + 1):
+            for table, _, _ in TABLES:
+                self._create(conn, table, table, start)
+            start += self.span
+
+    def _create(self, conn, parent, table, start):
+        name = f'{table}_p{start:%Y%m%d%H}'
+        if conn.execute('SELECT to_regclass(?) IS NOT NULL', (name,))[0][0]:
+            return
+        # Fails if the default partition already holds rows of this span: those
+        # stay there (purged row by row), the rest of the transaction goes on
+        conn.execute('SAVEPOINT create_partition')
+        try:
+            conn.execute(f'''
+                CREATE TABLE {name} PARTITION OF {parent}
+                FOR VALUES FROM ('{sql_timestamp(start)}') TO ('{sql_timestamp(start + self.span)}')
+            ''')
+        except Exception as e:
+            conn.execute('ROLLBACK TO SAVEPOINT create_partition')
+            log.error('partition_create_failed', '❌ Could not create partition {partition}: {error}',
+                      partition=name, error=str(e))
+            return
+        conn.execute('RELEASE SAVEPOINT create_partition')
+        with self._lock:
+            self._stats['created'] += 1
+
+    # ------------------------------------------------------------------
+    # Retention (sweeper leader)
+    # ------------------------------------------------------------------
+
+    def maintain(self, connect_db, stores=(), batch_size=500, now=None):
+        """Premake spans, retire expired partitions; return (executions, approvals) rows retired.
+
+        ``stores`` are the per-task stores (delete_orphans(conn, ids)) whose
+        rows are removed with the executions of a retired partition.
+        """
+        now = now or datetime.now()
+        with connect_db() as conn:
+            conn.execute('SELECT pg_advisory_xact_lock(?)', (LOCK_KEY,))
+            self.ensure(conn, now)
+            attached = [row[0] for row in conn.execute('''
+                SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = to_regclass('executions')
+            ''')]
+
+        retired = [0, 0]
+        for name in sorted(attached):
+            start = self._start(name)
+            if start is None or start + self.span + self.retention > now:
+                continue
+            counts = self._detach(connect_db, start)
+            if counts:
+                retired = [retired[0] + counts[0], retired[1] + counts[1]]
+
+        with connect_db() as conn:
+            detached = [row[0] for row in conn.execute('''
+                SELECT relname FROM pg_class
+                WHERE relkind = 'r' AND pg_table_is_visible(oid) AND relname ~ ?
+                  AND NOT EXISTS (SELECT 1 FROM pg_inherits i WHERE i.inhrelid = pg_class.oid)
+            ''', (r'^(archive_)?(executions|approvals)_p[0-9]{10}$',))]
+        for name in sorted(detached):
+            if name.startswith('archive_'):
+                self._expire_archive(connect_db, name, now)
+            else:
+                self._retire(connect_db, name, stores, batch_size)
+        return retired[0], retired[1]
+
+    def _start(self, name):
+        match = PARTITION_NAME.match(name[len('archive_'):] if name.startswith('archive_') else name)
+        return datetime.strptime(match.group(2), '%Y%m%d%H') if match else None
+
+    def _detach(self, connect_db, start):
+        """Detach both tables' partitions for the span at ``start`` unless work is still pending there."""
+        suffix = f'_p{start:%Y%m%d%H}'
+        with connect_db() as conn:
+            conn.execute('SELECT pg_advisory_xact_lock(?)', (LOCK_KEY,))
+            busy = conn.execute(f'''
+                SELECT EXISTS (
+                    SELECT 1 FROM executions{suffix} e
+                    WHERE e.status = 'pending'
+                       OR EXISTS (SELECT 1 FROM webhook_deliveries w
+                                  WHERE w.execution_id = e.execution_id AND w.status = 'pending'))
+            ''')[0][0]
+            if busy:
+                with self._lock:
+                    self._stats['deferred'] += 1
+                log.info('partition_deferred', '⏳ Keeping partition {partition}: executions still pending',
+                         partition=f'executions{suffix}')
+                return None
+            counts = []
+            for table, _, _ in TABLES:
+                name = f'{table}{suffix}'
+                if not conn.execute('SELECT to_regclass(?) IS NOT NULL', (name,))[0][0]:
+                    counts.append(0)
+                    continue
+                counts.append(conn.execute(f'SELECT COUNT(*) FROM {name}')[0][0])
+                conn.execute(f'ALTER TABLE {table} DETACH PARTITION {name}')
+        with self._lock:
+            self._stats['detached'] += 1
+        log.info('partition_detached', '🗂️ Detached partitions for {span_start}: {executions} executions, '
+                 '{approvals} approvals', span_start=start.isoformat(), executions=counts[0], approvals=counts[1])
+        return counts
+
+    def _retire(self, connect_db, name, stores, batch_size):
+        """Remove the per-task rows of a detached partition's executions, then archive or drop it."""
+        last = ''
+        while True:
+            with connect_db() as conn:
+                execution_ids = [row[0] for row in conn.execute(f'''
+                    SELECT execution_id FROM {name} WHERE execution_id > ? ORDER BY execution_id LIMIT ?
+                ''', (last, batch_size))]
+                if execution_ids:
+                    for store in stores:
+                        store.delete_orphans(conn, execution_ids)
+            if len(execution_ids) < batch_size:
+                break
+            last = execution_ids[-1]
+
+        with connect_db() as conn:
+            if self.archive > timedelta(0):
+                conn.execute(f'ALTER TABLE {name} RENAME TO archive_{name}')
+                stat = 'archived'
+            else:
+                conn.execute(f'DROP TABLE {name}')
+                stat = 'dropped'
+        with self._lock:
+            self._stats[stat] += 1
+
+    def _expire_archive(self, connect_db, name, now):
+        start = self._start(name)
+        if start is None or start + self.span + self.retention + self.archive > now:
+            return
+        with connect_db() as conn:
+            conn.execute(f'DROP TABLE {name}')
+        with self._lock:
+            self._stats['dropped'] += 1
+        log.info('partition_archive_dropped', '🗑️ Dropped archived partition {partition}', partition=name)
+
+    # ------------------------------------------------------------------
+    # Introspection
+    # ------------------------------------------------------------------
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update(
+            active=self.active,
+            span_hours=self.span / timedelta(hours=1),
+            retention_hours=self.retention / timedelta(hours=1),
+            archive_hours=self.archive / timedelta(hours=1),
+        )
+        return stats
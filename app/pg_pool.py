@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Thread-safe Postgres connection pool.
+
+Replaces psycopg2's SimpleConnectionPool (not thread-safe, fails instantly
+when empty) with:
+
+* a bounded wait queue – borrowers wait up to ``timeout`` seconds for a
+  connection, and at most ``max_waiters`` may wait at once
+* validation on borrow – closed connections, or ones idle for longer than
+  ``validate_idle_sec`` that fail ``SELECT 1``, are transparently replaced
+  (e.g. after a Postgres failover)
+* counters for borrows, wait time, timeouts and connections in use
+"""
+import threading
+import time
+
+
+class PoolTimeout(Exception):
+    """No connection became available in time (or the wait queue is full)."""
+
+
+class PgPool:
+    def __init__(self, dsn, minconn=1, maxconn=5, timeout=5.0, max_waiters=64,
+                 validate_idle_sec=10.0, connect=None):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_waiters = max_waiters
+        self.validate_idle_sec = validate_idle_sec
+        self._connect = connect or self._psycopg2_connect
+        self._cond = threading.Condition()
+        self._idle = []          # [(conn, last_used_monotonic)]
+        self._size = 0           # open connections, idle + in use
+        self._in_use = 0
+        self._waiting = 0
+        self._stats = {
+            'borrows': 0,
+            'timeouts': 0,
+            'rejected': 0,
+            'reconnects': 0,
+            'wait_time_total_ms': 0.0,
+            'max_wait_ms': 0.0,
+        }
+
+    def _psycopg2_connect(self):
+        import psycopg2
+        return psycopg2.connect(self.dsn)
+
+    # ------------------------------------------------------------------
+    # Borrow / return
+    # ------------------------------------------------------------------
+
+    def getconn(self, timeout=None):
+        """Borrow a validated connection, waiting up to ``timeout`` seconds."""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        conn, last_used = None, None
+
+        with self._cond:
+            if not self._idle and self._size >= self.maxconn and self._waiting >= self.max_waiters:
+                self._stats['rejected'] += 1
+                raise PoolTimeout(f'Database pool wait queue is full ({self.max_waiters} waiting)')
+            self._waiting += 1
+            try:
+                while True:
+                    if self._idle:
+                        conn, last_used = self._idle.pop()
+                        break
+                    if self._size < self.maxconn:
+                        self._size += 1  # reserve a slot; connect outside the lock
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(
+                            f'No database connection available within {timeout:g}s '
+                            f'({self.maxconn} in use)')
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+
+        try:
+            if conn is None:
+                conn = self._connect()
+            elif not self._usable(conn, last_used):
+                self._discard(conn)
+                conn = self._connect()
+                with self._cond:
+                    self._stats['reconnects'] += 1
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        waited_ms = (time.monotonic() - started) * 1000
+        with self._cond:
+            self._in_use += 1
+            self._stats['borrows'] += 1
+            self._stats['wait_time_total_ms'] += waited_ms
+            self._stats['max_wait_ms'] = max(self._stats['max_wait_ms'], waited_ms)
+        return conn
+
+    def putconn(self, conn, close=False):
+        """Return a connection; ``close=True`` (or a dead one) frees its slot."""
+        close = close or conn.closed
+        if close:
+            self._discard(conn)
+        with self._cond:
+            self._in_use -= 1
+            if close:
+                self._size -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _usable(self, conn, last_used):
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.validate_idle_sec:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _discard(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    # ------------------------------------------------------------------
+    # Lifecycle & introspection
+    # ------------------------------------------------------------------
+
+    def prewarm(self):
+        """Open ``minconn`` connections up front."""
+        conns = [self.getconn() for _ in range(max(0, self.minconn - self._size))]
+        for conn in conns:
+            self.putconn(conn)
+
+    def closeall(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'size': self._size,
+                'max_size': self.maxconn,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+            })
+        stats['wait_time_total_ms'] = round(stats['wait_time_total_ms'], 1)
+        stats['max_wait_ms'] = round(stats['max_wait_ms'], 1)
+        return stats
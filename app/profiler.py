@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Opt-in request tracing, slow-request capture and per-request cProfile.
+
+A trace records how a request spent its time, one span per phase:
+
+* pool_wait – borrowing a database connection (connect_db)
+* query     – each DBConn.execute, labelled with its statement
+* serialize – JSON encoding/decoding and response compression
+* wait      – blocking for an approval (/get-approved long-poll)
+
+Everything else is reported as ``other``. Which requests are traced:
+
+* ``PROFILE_SLOW_MS``     – every request is traced; those at least this slow
+                            are logged (``slow_request``) and kept
+* ``PROFILE_SAMPLE_RATE`` – this fraction of requests also runs under cProfile
+* ``X-Profile: <DEBUG_TOKEN>`` – profile this one request
+
+Kept traces go to a ring of the last ``PROFILE_RING_SIZE``, served by
+GET /debug/traces (``Authorization: Bearer <DEBUG_TOKEN>``). With all of it
+off, an instrumented call costs one ContextVar lookup.
+"""
+import contextvars
+import cProfile
+import hmac
+import io
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from datetime import datetime
+
+MAX_SPANS = 200          # per trace; later spans only count towards their phase
+PROFILE_TOP_FUNCTIONS = 30
+
+_current = contextvars.ContextVar('hitl_trace', default=None)
+_NO_SPAN = nullcontext()
+
+
+class Trace:
+    __slots__ = ('method', 'path', 'reason', 'started_at', 'started', 'phases', 'spans', 'dropped_spans',
+                 'profile', 'token')
+
+    def __init__(self, method, path, reason):
+        self.method = method
+        self.path = path
+        self.reason = reason          # 'slow', 'sampled' or 'header'
+        self.started_at = datetime.now()
+        self.started = time.perf_counter()
+        self.phases = {}              # phase -> [count, seconds]
+        self.spans = []
+        self.dropped_spans = 0
+        self.profile = None
+        self.token = None
+
+    def add(self, phase, label, seconds):
+        totals = self.phases.get(phase)
+        if totals is None:
+            self.phases[phase] = [1, seconds]
+        else:
+            totals[0] += 1
+            totals[1] += seconds
+        if len(self.spans) < MAX_SPANS:
+            self.spans.append((phase, label, round((time.perf_counter() - self.started - seconds) * 1000, 3),
+                               round(seconds * 1000, 3)))
+        else:
+            self.dropped_spans += 1
+
+
+class _Span:
+    __slots__ = ('trace', 'phase', 'label', 'started')
+
+    def __init__(self, trace, phase, label):
+        self.trace = trace
+        self.phase = phase
+        self.label = label
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.add(self.phase, self.label, time.perf_counter() - self.started)
+
+
+def current_trace():
+    return _current.get()
+
+
+def trace_span(phase, label=None):
+    """Context manager timing a phase of the current request (no-op when untraced)."""
+    trace = _current.get()
+    return _NO_SPAN if trace is None else _Span(trace, phase, label)
+
+
+def record_span(phase, label, seconds):
+    """Add an already-measured span to the current request, if traced."""
+    trace = _current.get()
+    if trace is not None:
+        trace.add(phase, label, seconds)
+
+
+class RequestProfiler:
+    def __init__(self, slow_ms=0.0, sample_rate=0.0, ring_size=100, token=None, log=None):
+        if not 0 <= sample_rate <= 1:
+            raise ValueError(f'PROFILE_SAMPLE_RATE must be between 0 and 1, got {sample_rate}')
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+        self.token = token or None
+        self.log = log
+        self.traces = deque(maxlen=ring_size)
+        self._cprofile_lock = threading.Lock()  # one cProfile at a time (one active profiler per process on 3.12+)
+        self._lock = threading.Lock()
+        self._stats = {'traced': 0, 'slow': 0, 'profiled': 0, 'profiler_busy': 0}
+
+    @property
+    def enabled(self):
+        return bool(self.slow_ms or self.sample_rate or self.token)
+
+    def authorized(self, secret):
+        """True if ``secret`` (header value) matches DEBUG_TOKEN."""
+        return bool(self.token and secret) and hmac.compare_digest(secret.encode('utf-8'), self.token.encode('utf-8'))
+
+    def start(self, method, path, profile_header=None, cprofile=True):
+        """Begin tracing the current request; return its Trace, or None if it isn't traced."""
+        if not self.enabled:
+            return None
+        if profile_header and self.authorized(profile_header):
+            reason = 'header'
+        elif self.sample_rate and random.random() < self.sample_rate:
+            reason = 'sampled'
+        elif self.slow_ms:
+            reason = 'slow'
+        else:
+            return None
+        trace = Trace(method, path, reason)
+        if reason != 'slow' and cprofile:
+            if self._cprofile_lock.acquire(blocking=False):
+                trace.profile = cProfile.Profile()
+                trace.profile.enable()
+            else:
+                self._count('profiler_busy')
+        trace.token = _current.set(trace)
+        return trace
+
+    def finish(self, trace, status, endpoint=None):
+        """End a trace from start(); keep it if it was profiled or slow."""
+        duration = time.perf_counter() - trace.started
+        profile_text = None
+        if trace.profile is not None:
+            trace.profile.disable()
+            self._cprofile_lock.release()
+            profile_text = self._format_profile(trace.profile)
+        try:
+            _current.reset(trace.token)
+        except ValueError:
+            _current.set(None)  # finished from another context (e.g. a streamed response)
+        self._count('traced')
+        duration_ms = duration * 1000
+        slow = bool(self.slow_ms) and duration_ms >= self.slow_ms
+        if not slow and trace.reason == 'slow':
+            return None
+
+        phases = {phase: {'count': count, 'ms': round(seconds * 1000, 3)}
+                  for phase, (count, seconds) in trace.phases.items()}
+        accounted = sum(seconds for _, seconds in trace.phases.values())
+        phases['other'] = {'count': 1, 'ms': round(max(0.0, duration - accounted) * 1000, 3)}
+        report = {
+            'method': trace.method,
+            'path': trace.path,
+            'endpoint': endpoint,
+            'status': status,
+            'reason': trace.reason,
+            'slow': slow,
+            'started_at': trace.started_at.isoformat(),
+            'duration_ms': round(duration_ms, 3),
+            'phases': phases,
+            'spans': [{'phase': phase, 'label': label, 'at_ms': at_ms, 'ms': ms}
+                      for phase, label, at_ms, ms in trace.spans],
+            'dropped_spans': trace.dropped_spans,
+            'profile': profile_text,
+        }
+        with self._lock:
+            self.traces.append(report)
+        if trace.profile is not None:
+            self._count('profiled')
+        if slow:
+            self._count('slow')
+            if self.log:
+                self.log.warning(
+                    'slow_request', '🐢 Slow request {method} {path}: {duration_ms:.0f} ms ({breakdown})',
+                    method=trace.method, path=trace.path, status=status, duration_ms=round(duration_ms, 1),
+                    breakdown=', '.join(f"{phase} {totals['ms']:.1f} ms" for phase, totals in phases.items()),
+                    phases={phase: totals['ms'] for phase, totals in phases.items()},
+                )
+        return report
+
+    def recent(self, limit=None):
+        """Kept traces, newest first."""
+        with self._lock:
+            traces = list(self.traces)
+        traces.reverse()
+        return traces[:limit] if limit and limit > 0 else traces
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    @staticmethod
+    def _format_profile(profile):
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+        return out.getvalue()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['kept'] = len(self.traces)
+        stats.update(enabled=self.enabled, slow_ms=self.slow_ms, sample_rate=self.sample_rate,
+                     ring_size=self.traces.maxlen, debug_endpoint=self.token is not None)
+        return stats
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+In-process LRU cache of serialized responses (used for /get-tasks).
+
+* entries expire after ``ttl`` seconds (or earlier, per entry)
+* least recently used entries are evicted once ``max_bytes`` is exceeded
+* each entry carries a strong ETag (hash of the body), so clients sending
+  If-None-Match can be answered with a 304 straight from memory
+
+Writers call invalidate(). To stop a slow reader from caching a body it
+built before the invalidation, readers take a version token before reading
+the database and pass it to put(); puts older than the last invalidation of
+that key are dropped.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+ENTRY_OVERHEAD = 256  # rough per-entry bytes beyond the body (key, tuple, dict slot)
+
+
+class CachedResponse:
+    __slots__ = ('body', 'encoded', 'etag', 'version', 'deadline', 'size')
+
+    def __init__(self, body, encoded, etag, version, deadline, size):
+        self.body = body
+        self.encoded = encoded  # Content-Encoding -> compressed body
+        self.etag = etag
+        self.version = version
+        self.deadline = deadline
+        self.size = size
+
+
+def strong_etag(body):
+    """Unquoted strong ETag for a response body."""
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, max_bytes=32 * 1024 * 1024, ttl=30.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> CachedResponse, oldest first
+        self._bytes = 0
+        self._version = 0
+        self._floor = 0                 # tokens below this predate a clear()
+        self._invalidated = OrderedDict()  # key -> (version, monotonic time), oldest first
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'not_modified': 0,
+            'stores': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0,
+        }
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0 and self.ttl > 0
+
+    # ------------------------------------------------------------------
+    # Read / fill
+    # ------------------------------------------------------------------
+
+    def get(self, key):
+        """Return the fresh CachedResponse for key, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.deadline <= time.monotonic():
+                self._remove(key)
+                self._stats['expirations'] += 1
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry
+
+    def token(self):
+        """Version token to take *before* reading the data to be cached."""
+        with self._lock:
+            return self._version
+
+    def put(self, key, token, body, ttl=None, encoded=None):
+        """Cache body (bytes) and its compressed variants for key.
+
+        Returns the CachedResponse whether or not it was cached.
+        """
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        encoded = encoded or {}
+        size = len(body) + sum(len(v) for v in encoded.values()) + len(key) + ENTRY_OVERHEAD
+        entry = CachedResponse(body, encoded, strong_etag(body), token, time.monotonic() + ttl, size)
+        if not self.enabled or ttl <= 0 or entry.size > self.max_bytes:
+            return entry
+        with self._lock:
+            invalidated = self._invalidated.get(key)
+            if token < self._floor or (invalidated is not None and token < invalidated[0]):
+                return entry  # built from data that has since changed
+            self._remove(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            self._stats['stores'] += 1
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats['evictions'] += 1
+        return entry
+
+    def record_not_modified(self):
+        with self._lock:
+            self._stats['not_modified'] += 1
+
+    # ------------------------------------------------------------------
+    # Invalidation
+    # ------------------------------------------------------------------
+
+    def invalidate(self, *keys):
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                self._version += 1
+                self._invalidated.pop(key, None)  # re-added at the end: oldest stays first
+                self._invalidated[key] = (self._version, now)
+                if self._remove(key):
+                    self._stats['invalidations'] += 1
+            # Forget old invalidations, oldest first; readers that started
+            # before them (slower than the TTL) are rejected via the floor instead
+            while len(self._invalidated) > 1024:
+                version, invalidated_at = next(iter(self._invalidated.values()))
+                if now - invalidated_at < self.ttl:
+                    break
+                self._invalidated.popitem(last=False)
+                self._floor = max(self._floor, version)
+
+    def clear(self):
+        """Drop everything (e.g. when invalidations may have been missed)."""
+        with self._lock:
+            self._version += 1
+            self._floor = self._version
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+        return entry is not None
+
+    # ------------------------------------------------------------------
+    # Introspection
+    # ------------------------------------------------------------------
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl_sec': self.ttl,
+            })
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 3) if lookups else None
+        return stats
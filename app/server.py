@@ -1,22 +1,170 @@
 #!/usr/bin/env python3
-from flask import Flask, send_from_directory, request, jsonify
+from flask import Flask, Response, abort, g, request, jsonify
+import base64
+import hashlib
 import os
 import requests
-import json
-import sqlite3
 from datetime import datetime, timedelta
 from flask_cors import CORS
 import threading
 import time
 try:
     import psycopg2
-    from psycopg2 import pool
 except ImportError:
     psycopg2 = None  # Will fallback to SQLite
 
+try:
+    from .notifier import APPROVAL_CHANNEL, TASKS_CHANNEL, ApprovalNotifier, PgApprovalListener, SqliteApprovalWatcher
+    from .sweeper import Sweeper
+    from .migrations import MIGRATIONS, run_migrations
+    from .sqlite_engine import SqliteEngine
+    from .pg_pool import PgPool, PoolTimeout
+    from .task_store import BLOB, ROWS, UPDATE_CHUNK, TaskDecisions, TaskRows, apply_decisions, approved_indexes
+    from .sql_helpers import chunks, placeholders, pyformat
+    from .response_cache import ResponseCache
+    from .static_assets import StaticAssets
+    from . import json_codec
+    from .event_log import log
+    from .webhooks import WebhookDeliveries, WebhookDispatcher, validate_callback_url
+    from .live_status import GONE, LiveStatus, render_snapshot
+    from .ingest import IngestError, TaskSpool, iter_bulk_upload, json_array_pieces, parse_task_upload
+    from .partitions import DELIVERED, TimePartitions
+    from .idempotency import HIT, IN_FLIGHT, MISMATCH, IdempotencyCache
+    from .blob_codec import BlobCodec, encode_json, stored_json
+    from .profiler import RequestProfiler, record_span, trace_span
+    from .metrics import MultiProcessExporter, Registry, default_metrics_dir, render, statement_label
+except ImportError:  # executed as a script: python app/server.py
+    from notifier import APPROVAL_CHANNEL, TASKS_CHANNEL, ApprovalNotifier, PgApprovalListener, SqliteApprovalWatcher
+    from sweeper import Sweeper
+    from migrations import MIGRATIONS, run_migrations
+    from sqlite_engine import SqliteEngine
+    from pg_pool import PgPool, PoolTimeout
+    from task_store import BLOB, ROWS, UPDATE_CHUNK, TaskDecisions, TaskRows, apply_decisions, approved_indexes
+    from sql_helpers import chunks, placeholders, pyformat
+    from response_cache import ResponseCache
+    from static_assets import StaticAssets
+    import json_codec
+    from event_log import log
+    from webhooks import WebhookDeliveries, WebhookDispatcher, validate_callback_url
+    from live_status import GONE, LiveStatus, render_snapshot
+    from ingest import IngestError, TaskSpool, iter_bulk_upload, json_array_pieces, parse_task_upload
+    from partitions import DELIVERED, TimePartitions
+    from idempotency import HIT, IN_FLIGHT, MISMATCH, IdempotencyCache
+    from blob_codec import BlobCodec, encode_json, stored_json
+    from profiler import RequestProfiler, record_span, trace_span
+    from metrics import MultiProcessExporter, Registry, default_metrics_dir, render, statement_label
+
 app = Flask(__name__)
+app.json = json_codec.FastJSONProvider(app)
 CORS(app)
 
+# ============================================================================
+# 📈 METRICS (Prometheus text format at /metrics)
+# ============================================================================
+
+# Recorded per process, merged across gunicorn workers by metrics_exporter
+metrics = Registry()
+http_request_seconds = metrics.histogram(
+    'hitl_http_request_duration_seconds', 'Request latency by route (Flask endpoint name).',
+    ('route', 'method', 'status'),
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+db_query_seconds = metrics.histogram(
+    'hitl_db_query_duration_seconds', 'SQL statement latency measured in DBConn.execute.', ('statement',),
+)
+approval_wait_seconds = metrics.histogram(
+    'hitl_approval_wait_duration_seconds', 'Time each /get-approved request waited for an approval.',
+    ('outcome',), buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 120, 180, 240, 300, 600),
+)
+approval_waiters_gauge = metrics.gauge('hitl_approval_waiters', 'Requests currently waiting in /get-approved.')
+live_streams_gauge = metrics.gauge('hitl_live_status_streams', 'Open /events live status streams.')
+pool_in_use_gauge = metrics.gauge('hitl_db_pool_in_use', 'Postgres connections currently borrowed.')
+pool_waiting_gauge = metrics.gauge('hitl_db_pool_waiting', 'Requests waiting for a Postgres connection.')
+pool_size_gauge = metrics.gauge('hitl_db_pool_size', 'Open Postgres connections.')
+pool_borrows_total = metrics.counter('hitl_db_pool_borrows_total', 'Postgres connections borrowed.')
+pool_timeouts_total = metrics.counter('hitl_db_pool_timeouts_total', 'Borrows that timed out or were rejected.')
+pool_wait_seconds_total = metrics.counter('hitl_db_pool_wait_seconds_total', 'Time spent waiting for a connection.')
+sweeper_run_seconds = metrics.histogram(
+    'hitl_sweeper_run_duration_seconds', 'Duration of a full sweep (leader only).',
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+sweeper_rows_total = metrics.counter('hitl_sweeper_rows_total', 'Rows handled by the sweeper.', ('action',))
+log_queue_gauge = metrics.gauge('hitl_log_queue_depth', 'Log records waiting for the writer thread.')
+log_records_total = metrics.counter(
+    'hitl_log_records_total', 'Log records by outcome (written, dropped, sampled_out, write_errors).', ('outcome',),
+)
+auto_approvals_total = metrics.counter('hitl_auto_approvals_total', 'Executions auto-approved, by method.', ('method',))
+webhook_attempt_seconds = metrics.histogram(
+    'hitl_webhook_attempt_duration_seconds', 'Callback webhook attempts by outcome (delivered, retried, failed, ...).',
+    ('outcome',), buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+metrics_exporter = MultiProcessExporter(
+    metrics,
+    os.environ.get('METRICS_DIR') or default_metrics_dir(),
+    interval=float(os.environ.get('METRICS_FLUSH_SEC', 5)),
+)
+
+# ------------ Request profiling (opt-in, see profiler.py) -------------
+
+# Off unless one of these is set; then each request's time is broken down
+# into pool wait, queries, serialization and waiting.
+request_profiler = RequestProfiler(
+    slow_ms=float(os.environ.get('PROFILE_SLOW_MS', 0)),
+    sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', 0)),
+    ring_size=int(os.environ.get('PROFILE_RING_SIZE', 100)),
+    token=os.environ.get('DEBUG_TOKEN'),
+    log=log,
+)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    trace = request_profiler.start(request.method, request.path, request.headers.get('X-Profile'))
+    if trace is not None:
+        g.trace = trace
+
+@app.after_request
+def record_request_metrics(response):
+    # Registered before the compression hook, so it runs after it
+    started = g.pop('request_started', None)
+    if started is not None:
+        http_request_seconds.observe(
+            time.perf_counter() - started,
+            route=request.endpoint or 'unmatched', method=request.method, status=response.status_code,
+        )
+    trace = g.pop('trace', None)
+    if trace is not None:
+        request_profiler.finish(trace, response.status_code, request.endpoint)
+    return response
+
+@app.teardown_request
+def finish_failed_trace(exc):
+    # after_request is skipped when a view raises
+    trace = g.pop('trace', None)
+    if trace is not None:
+        request_profiler.finish(trace, 500, request.endpoint)
+
+# ------------ Payload limits -------------
+
+MAX_REQUEST_BYTES = int(os.environ.get('MAX_REQUEST_BYTES', 32 * 1024 * 1024))
+MAX_TASKS_PER_EXECUTION = int(os.environ.get('MAX_TASKS_PER_EXECUTION', 50000))
+MAX_TASK_BYTES = int(os.environ.get('MAX_TASK_BYTES', 64 * 1024))
+# /store-tasks keeps parsed tasks in memory up to this much, then in a temp file
+INGEST_SPOOL_MEMORY_BYTES = int(os.environ.get('INGEST_SPOOL_MEMORY_BYTES', 1024 * 1024))
+# /store-tasks/bulk: executions per request, and per transaction (by count or by stored bytes)
+BULK_MAX_EXECUTIONS = int(os.environ.get('BULK_MAX_EXECUTIONS', 10000))
+BULK_CHUNK_SIZE = int(os.environ.get('BULK_CHUNK_SIZE', 200))
+BULK_CHUNK_BYTES = int(os.environ.get('BULK_CHUNK_BYTES', 4 * 1024 * 1024))
+app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_BYTES
+
+@app.before_request
+def reject_oversized_body():
+    # Declared lengths are refused before any byte is read; chunked bodies are
+    # cut off while reading (werkzeug / the /store-tasks parser)
+    if request.content_length is not None and request.content_length > MAX_REQUEST_BYTES:
+        return jsonify({'error': f'Request body exceeds {MAX_REQUEST_BYTES} bytes'}), 413
+
 # ============================================================================
 # 🛢️ DATABASE CONFIG: Postgres (locally & Railway)
 # ============================================================================
@@ -29,30 +177,53 @@ USE_POSTGRES = bool(DATABASE_URL and psycopg2)
 # ------------ Connection wrappers (uniform API) -------------
 
 if USE_POSTGRES:
-    # Create pool once
-    pg_pool = pool.SimpleConnectionPool(minconn=1, maxconn=5, dsn=DATABASE_URL)
+    # Created lazily – no connection is opened until the first borrow
+    pg_pool = PgPool(
+        DATABASE_URL,
+        minconn=int(os.environ.get('PG_POOL_MIN', 1)),
+        maxconn=int(os.environ.get('PG_POOL_MAX', 5)),
+        timeout=float(os.environ.get('PG_POOL_TIMEOUT_SEC', 5)),
+        max_waiters=int(os.environ.get('PG_POOL_MAX_WAITERS', 64)),
+        validate_idle_sec=float(os.environ.get('PG_POOL_VALIDATE_IDLE_SEC', 10)),
+    )
 
     class DBConn:
         """Context-manager wrapper with sqlite-like API on Postgres."""
-        def __init__(self):
-            self.conn = pg_pool.getconn()
+        def __init__(self, timeout=None):
+            self.conn = pg_pool.getconn(timeout)
+            self._after_commit = []
 
         def __enter__(self):
             return self
 
         def __exit__(self, exc_type, exc, tb):
-            if exc_type is None:
-                self.conn.commit()
-            else:
-                self.conn.rollback()
+            try:
+                if exc_type is None:
+                    self.conn.commit()
+                else:
+                    self.conn.rollback()
+            except Exception:
+                # Broken connection or failed commit: never hand it back as-is
+                pg_pool.putconn(self.conn, close=True)
+                if exc_type is None:
+                    raise
+                return False
             pg_pool.putconn(self.conn)
+            if exc_type is None:
+                for callback, args in self._after_commit:
+                    callback(*args)
 
         def execute(self, query, params=()):
-            query = query.replace("?", "%s")
-            with self.conn.cursor() as cur:
-                cur.execute(query, params)
-                if query.strip().lower().startswith("select"):
-                    return cur.fetchall()
+            started = time.perf_counter()
+            try:
+                with self.conn.cursor() as cur:
+                    cur.execute(pyformat(query), params)
+                    if query.strip().lower().startswith("select"):
+                        return cur.fetchall()
+            finally:
+                elapsed, label = time.perf_counter() - started, statement_label(query)
+                db_query_seconds.observe(elapsed, statement=label)
+                record_span('query', label, elapsed)
 
         def cursor(self):
             return self.conn.cursor()
@@ -60,14 +231,28 @@ if USE_POSTGRES:
         def commit(self):
             self.conn.commit()
 
+        def after_commit(self, callback, *args):
+            """Run callback(*args) once this transaction has committed."""
+            self._after_commit.append((callback, args))
+
 else:
     # Use local SQLite file
     LOCAL_DB_FILE = os.environ.get("DB_FILE", "hitl.db")
 
+    sqlite_engine = SqliteEngine(
+        LOCAL_DB_FILE,
+        synchronous=os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        busy_timeout_ms=int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+        cache_size_kib=int(os.environ.get('SQLITE_CACHE_SIZE_KIB', 20000)),
+        mmap_size=int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+        cached_statements=int(os.environ.get('SQLITE_STATEMENT_CACHE', 256)),
+    )
+
     class DBConn:
-        def __init__(self):
-            # Allow connections to be shared across Flask threads during local testing
-            self.conn = sqlite3.connect(LOCAL_DB_FILE, check_same_thread=False)
+        """Transaction on the calling thread's persistent WAL connection."""
+        def __init__(self, timeout=None):  # no pool to wait for
+            self.conn = sqlite_engine.connection()
+            self._after_commit = []
 
         def __enter__(self):
             return self  # return wrapper for unified API
@@ -77,13 +262,21 @@ else:
                 self.conn.commit()
             else:
                 self.conn.rollback()
-            self.conn.close()
+            if exc_type is None:
+                for callback, args in self._after_commit:
+                    callback(*args)
 
         def execute(self, query, params=()):
-            cur = self.conn.execute(query, params)
-            if query.strip().lower().startswith("select"):
-                return cur.fetchall()
-            return []
+            started = time.perf_counter()
+            try:
+                cur = self.conn.execute(query, params)
+                if query.strip().lower().startswith("select"):
+                    return cur.fetchall()
+                return []
+            finally:
+                elapsed, label = time.perf_counter() - started, statement_label(query)
+                db_query_seconds.observe(elapsed, statement=label)
+                record_span('query', label, elapsed)
 
         def cursor(self):
             return self.conn.cursor()
@@ -91,114 +284,681 @@ else:
         def commit(self):
             self.conn.commit()
 
+        def after_commit(self, callback, *args):
+            """Run callback(*args) once this transaction has committed."""
+            self._after_commit.append((callback, args))
+
+
+def connect_db(timeout=None):
+    """Return a DBConn context manager (Postgres or SQLite).
+
+    Raises PoolTimeout when no Postgres connection frees up within
+    ``timeout`` seconds (default PG_POOL_TIMEOUT_SEC).
+    """
+    with trace_span('pool_wait'):
+        return DBConn(timeout)
+
+# ------------ Task storage layout -------------
+
+# 'blob' keeps each task list as one JSON text column; 'rows' stores one
+# execution_tasks row per task (see task_store.py). Reads follow each row's
+# recorded layout, so this only decides how new executions are written.
+TASK_STORAGE = os.environ.get('TASK_STORAGE', BLOB).lower()
+if TASK_STORAGE not in (BLOB, ROWS):
+    raise ValueError(f"TASK_STORAGE must be '{BLOB}' or '{ROWS}', got {TASK_STORAGE!r}")
+
+# ------------ Time-partitioned storage (Postgres, optional) -------------
+
+# executions/approvals partitioned by creation time: delivered rows are
+# flagged instead of deleted and retention drops whole partitions (see
+# partitions.py). Whether the tables are partitioned is settled at startup.
+PARTITIONED_STORAGE = os.environ.get('PARTITIONED_STORAGE', 'false').lower() in ('1', 'true', 'yes')
+if PARTITIONED_STORAGE and not USE_POSTGRES:
+    raise ValueError('PARTITIONED_STORAGE requires Postgres (DATABASE_URL)')
+
+partitions = TimePartitions(
+    span=timedelta(hours=int(os.environ.get('PARTITION_SPAN_HOURS', 24))),
+    retention=timedelta(hours=float(os.environ.get('PARTITION_RETENTION_HOURS', 24))),
+    archive=timedelta(hours=float(os.environ.get('PARTITION_ARCHIVE_HOURS', 0))),
+    premake=int(os.environ.get('PARTITION_PREMAKE', 3)),
+)
+
+task_rows = TaskRows(USE_POSTGRES)
+task_decisions = TaskDecisions()
+webhook_deliveries = WebhookDeliveries()
+# Callback hosts exempt from the public-address check (webhooks.check_callback_host)
+CALLBACK_ALLOWED_HOSTS = frozenset(
+    host.strip().lower() for host in os.environ.get('CALLBACK_ALLOWED_HOSTS', '').split(',') if host.strip()
+)
+
+# Compression of stored task lists for new rows (rows keep the codec they were written with)
+blob_codec = BlobCodec(
+    os.environ.get('BLOB_CODEC', 'none'),
+    level=int(os.environ['BLOB_CODEC_LEVEL']) if os.environ.get('BLOB_CODEC_LEVEL') else None,
+    min_bytes=int(os.environ.get('BLOB_CODEC_MIN_BYTES', 1024)),
+)
+
+# Upper bound on decisions per /save-decisions call (dashboard autosave batches)
+DECISION_BATCH_LIMIT = int(os.environ.get('DECISION_BATCH_LIMIT', 500))
+
+# Largest slice served by /get-tasks/<id>?start=&limit=
+TASKS_PAGE_MAX = int(os.environ.get('TASKS_PAGE_MAX', 1000))
 
-def connect_db():
-    """Return a DBConn context manager (Postgres or SQLite)."""
-    return DBConn()
+# Reviewer inbox (/executions) page sizes
+INBOX_PAGE_SIZE = int(os.environ.get('INBOX_PAGE_SIZE', 50))
+INBOX_MAX_PAGE_SIZE = int(os.environ.get('INBOX_MAX_PAGE_SIZE', 200))
+# 'pending' lists executions still open for review, 'expired' those awaiting auto-approval
+INBOX_STATUSES = ('pending', 'expired', 'approved', 'auto_approved')
+
+# ------------ /get-tasks response cache -------------
+
+# Serialized responses per execution, invalidated by every write path (and,
+# on Postgres, by the other workers via NOTIFY). With SQLite and several
+# worker processes, other processes' writes are only picked up after the TTL.
+tasks_cache = ResponseCache(
+    max_bytes=int(os.environ.get('TASKS_CACHE_MAX_BYTES', 32 * 1024 * 1024)),
+    ttl=float(os.environ.get('TASKS_CACHE_TTL_SEC', 30)),
+)
+
+# ------------ Idempotency-Key replays (/store-tasks, /submit-approval) -------------
+
+# Successful responses by key, per worker. Replays reaching another worker
+# run again but change nothing: stored content hashes make them no-ops.
+idempotency_cache = IdempotencyCache(
+    max_entries=int(os.environ.get('IDEMPOTENCY_MAX_ENTRIES', 10000)),
+    ttl=float(os.environ.get('IDEMPOTENCY_TTL_SEC', 3600)),
+)
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+# ------------ Live status streams (/events/<execution_id>) -------------
+
+# Fed by the same invalidations as tasks_cache; one reload per execution per
+# process however many dashboards watch it. The resync catches what can't be
+# notified (other SQLite processes, the approval window running out).
+live_status = LiveStatus(
+    lambda execution_id: execution_state(execution_id),
+    resync_interval=float(os.environ.get('LIVE_STATUS_RESYNC_SEC', 15)),
+)
+LIVE_STATUS_HEARTBEAT_SEC = float(os.environ.get('LIVE_STATUS_HEARTBEAT_SEC', 15))
+# Sync workers answer each connection with one snapshot; browsers reconnect after this
+LIVE_STATUS_RETRY_MS = int(os.environ.get('LIVE_STATUS_RETRY_MS', 5000))
+
+def db_pool_stats():
+    """Postgres pool counters (None on SQLite)."""
+    return pg_pool.stats() if USE_POSTGRES else None
+
+def pool_timeout_response(e):
+    log.warning('pool_exhausted', '⚠️ Database pool exhausted: {error}', error=str(e))
+    return jsonify({'error': str(e)}), 503
+
+# ------------ Approval notifications (wake /get-approved waiters) -------------
+
+APPROVAL_WAIT_SEC = int(os.getenv('APPROVAL_WAIT_SEC', 300))  # 300 s default
+# SQLite: how often a worker looks for approvals committed by other workers
+# (0 = single process, in-process wake-ups only)
+APPROVAL_POLL_SEC = float(os.getenv('APPROVAL_POLL_SEC', 2))
+
+approval_notifier = ApprovalNotifier()
+approval_listener = None
+_listener_lock = threading.Lock()
+
+@metrics.on_collect
+def collect_runtime_metrics():
+    approval_waiters_gauge.set(approval_notifier.waiting())
+    live_streams_gauge.set(live_status.streams())
+    log_stats = log.stats()
+    log_queue_gauge.set(log_stats['queued'])
+    for outcome in ('written', 'dropped', 'sampled_out', 'write_errors'):
+        log_records_total.set_total(log_stats[outcome], outcome=outcome)
+    if USE_POSTGRES:
+        stats = pg_pool.stats()
+        pool_in_use_gauge.set(stats['in_use'])
+        pool_waiting_gauge.set(stats['waiting'])
+        pool_size_gauge.set(stats['size'])
+        pool_borrows_total.set_total(stats['borrows'])
+        pool_timeouts_total.set_total(stats['timeouts'] + stats['rejected'])
+        pool_wait_seconds_total.set_total(stats['wait_time_total_ms'] / 1000)
+
+def observe_approval_wait(started, result):
+    """Record how long a /get-approved request waited (monotonic start)."""
+    approval_wait_seconds.observe(time.monotonic() - started, outcome='approved' if result else 'timeout')
+
+def approved_among(conn, execution_ids):
+    """execution_ids (raw sqlite3 connection) that have an undelivered approval."""
+    approved = []
+    for chunk in chunks(execution_ids, UPDATE_CHUNK):
+        approved.extend(row[0] for row in conn.execute(f'''
+            SELECT execution_id FROM approvals WHERE execution_id IN ({placeholders(chunk)}) AND delivered_at IS NULL
+        ''', tuple(chunk)))
+    return approved
+
+def ensure_approval_listener():
+    """Start this worker's LISTEN thread (Postgres) or cross-process watcher (SQLite) on first use."""
+    global approval_listener
+    if not USE_POSTGRES and APPROVAL_POLL_SEC <= 0:
+        return
+    with _listener_lock:
+        if approval_listener is None or not approval_listener.is_alive():
+            if USE_POSTGRES:
+                approval_listener = PgApprovalListener(
+                    DATABASE_URL, approval_notifier,
+                    handlers={TASKS_CHANNEL: (execution_changed, all_executions_changed)},
+                )
+            else:
+                approval_listener = SqliteApprovalWatcher(
+                    sqlite_engine.connection, approval_notifier, approved_among, interval=APPROVAL_POLL_SEC,
+                )
+            approval_listener.start()
+
+def execution_changed(*execution_ids):
+    """Executions were written here or (via NOTIFY) in another worker."""
+    tasks_cache.invalidate(*execution_ids)
+    live_status.changed(*execution_ids)
+
+def all_executions_changed():
+    """Notifications may have been missed (listener reconnect)."""
+    tasks_cache.clear()
+    live_status.changed_all()
+
+def invalidate_tasks(conn, *execution_ids):
+    """Drop cached /get-tasks responses and refresh live status streams once conn commits."""
+    if not execution_ids:
+        return
+    conn.after_commit(execution_changed, *execution_ids)
+    if USE_POSTGRES:
+        # ...and in every other worker
+        conn.execute('SELECT pg_notify(?, id) FROM unnest(CAST(? AS text[])) AS t(id)',
+                     (TASKS_CHANNEL, list(execution_ids)))
+
+def announce_approval(conn, *execution_ids):
+    """Wake /get-approved waiters and queue callback webhooks for execution_ids."""
+    if not execution_ids:
+        return
+    webhook_deliveries.enqueue(conn, execution_ids)
+    conn.after_commit(webhook_dispatcher.wake)
+    # The execution is no longer pending – its cached /get-tasks is stale
+    invalidate_tasks(conn, *execution_ids)
+    if USE_POSTGRES:
+        # Delivered to every worker's listener when the transaction commits
+        conn.execute('SELECT pg_notify(?, id) FROM unnest(CAST(? AS text[])) AS t(id)',
+                     (APPROVAL_CHANNEL, list(execution_ids)))
+    else:
+        conn.after_commit(approval_notifier.publish, *execution_ids)
 
 # Friendly log
 if USE_POSTGRES:
-    print(f"🔗 Using Postgres: {DATABASE_URL}")
+    log.info('database_backend', '🔗 Using Postgres: {database}', backend='postgres', database=DATABASE_URL)
 else:
-    print(f"🔗 Using local SQLite: {os.path.abspath(LOCAL_DB_FILE)}")
+    log.info('database_backend', '🔗 Using local SQLite: {database}', backend='sqlite',
+             database=os.path.abspath(LOCAL_DB_FILE))
 
 def init_database():
-    """Initialise Postgres tables if they do not yet exist."""
-    with connect_db() as conn:
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS executions (
-                execution_id TEXT PRIMARY KEY,
-                monday_tasks TEXT NOT NULL,
-                meeting_title TEXT,
-                meeting_organizer TEXT,
-                total_tasks INTEGER,
-                status TEXT DEFAULT 'pending',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                expires_at TIMESTAMP,
-                meetings_data TEXT
-            )
-        ''')
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS approvals (
-                execution_id TEXT PRIMARY KEY,
-                approved_tasks TEXT NOT NULL,
-                approved_count INTEGER,
-                total_tasks INTEGER,
-                submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                method TEXT DEFAULT 'manual'
-            )
-        ''')
-        print("✅ Postgres database schema ensured")
+    """Bring the schema up to date (versioned, idempotent migrations)."""
+    run_migrations(connect_db, USE_POSTGRES)
+    log.info('schema_ready', '✅ Database schema ensured (version {version})', version=MIGRATIONS[-1][0])
+    if USE_POSTGRES:
+        with connect_db() as conn:
+            if partitions.setup(conn, PARTITIONED_STORAGE):
+                log.info('partitions_ready', '🗂️ Time-partitioned storage: Active')
 
-def cleanup_expired():
-    """Remove expired executions and old approvals"""
-    now = datetime.now()
-    yesterday = now - timedelta(hours=24)
-    with connect_db() as conn:
-        conn.execute('DELETE FROM executions WHERE expires_at < ?', (now,))
-        conn.execute('DELETE FROM approvals WHERE submitted_at < ?', (yesterday,))
+# ============================================================================
+# 🔄 BACKGROUND SWEEPER (auto-approval + cleanup)
+# ============================================================================
 
-def auto_approve_expired():
-    """Auto-approve tasks that have exceeded 15 minutes"""
-    now = datetime.now()
-    with connect_db() as conn:
-        # Find executions that are expired but not yet approved
-        expired_executions = conn.execute('''
-            SELECT execution_id, monday_tasks, total_tasks 
-            FROM executions 
-            WHERE expires_at < ? AND status = 'pending'
-        ''', (now,))
-        
-        for exec_id, tasks_json, total_tasks in expired_executions:
-            print(f"⏰ Auto-approving expired execution: {exec_id} ({total_tasks} tasks)")
-            
-            # Parse tasks and approve all
-            tasks = json.loads(tasks_json)
-            approved_tasks = []
-            for task in tasks:
-                task['approved'] = True
-                task['auto_approved'] = True
-                task['approval_reason'] = '15-minute timeout'
-                approved_tasks.append(task)
-            
-            # Store in approvals table
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO approvals (execution_id, approved_tasks, approved_count, total_tasks, method)
-            VALUES (?, ?, ?, ?, ?)
-                ON CONFLICT (execution_id) DO UPDATE SET
-                    approved_tasks = EXCLUDED.approved_tasks,
-                    approved_count = EXCLUDED.approved_count,
-                    total_tasks = EXCLUDED.total_tasks,
-                    method = EXCLUDED.method
-            ''', (exec_id, json.dumps(approved_tasks), len(approved_tasks), total_tasks, 'auto_timeout'))
-            
-            # Update execution status
-            cursor.execute('''
-                UPDATE executions SET status = 'auto_approved' WHERE execution_id = ?
-            ''', (exec_id,))
-            
-            print(f"✅ Auto-approved {len(approved_tasks)} tasks for {exec_id}")
-        
-        # commit handled by context manager (automatic via context manager)
-        return len(expired_executions)
+SWEEPER_ENABLED = os.environ.get('SWEEPER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+def observe_sweep(duration_sec, approved, purged_executions, purged_approvals):
+    sweeper_run_seconds.observe(duration_sec)
+    sweeper_rows_total.inc(approved, action='auto_approved')
+    sweeper_rows_total.inc(purged_executions, action='purged_executions')
+    sweeper_rows_total.inc(purged_approvals, action='purged_approvals')
+    auto_approvals_total.inc(approved, method='auto_timeout')
+
+sweeper = Sweeper(
+    connect_db,
+    USE_POSTGRES,
+    dsn=DATABASE_URL,
+    announce=announce_approval,
+    task_rows=task_rows,
+    task_decisions=task_decisions,
+    webhooks=webhook_deliveries,
+    partitions=partitions,
+    blob_codec=blob_codec,
+    observe=observe_sweep,
+    interval=int(os.environ.get('SWEEP_INTERVAL_SEC', 60)),
+    batch_size=int(os.environ.get('SWEEP_BATCH_SIZE', 500)),
+)
+
+_startup_lock = threading.Lock()
+_started = False
+
+def start_background_services():
+    """Ensure the schema and start the sweeper – once per process.
+
+    Runs at import so it also happens under gunicorn; every worker starts a
+    sweeper, but only the elected leader does any work.
+    """
+    global _started
+    with _startup_lock:
+        if _started:
+            return
+        _started = True
+        if USE_POSTGRES:
+            pg_pool.prewarm()
+        init_database()
+        if SWEEPER_ENABLED:
+            sweeper.start()
+            log.info('sweeper_started', '🧹 Background sweeper: Active')
+        webhook_dispatcher.start()
+        metrics_exporter.start()
 
 # ============================================================================
-# 🔄 BACKGROUND CLEANUP THREAD
+# 🗂️ STATIC ASSETS (in memory, precompressed)
 # ============================================================================
 
-def background_cleanup():
-    """Background thread for cleanup and auto-approval"""
-    while True:
-        try:
-            cleanup_expired()
-            auto_approve_expired()
-            time.sleep(60)  # Check every minute
-        except Exception as e:
-            print(f"❌ Background cleanup error: {e}")
-            time.sleep(60)
+# Read once; FLASK_DEBUG re-reads edited files so local development still works
+static_assets = StaticAssets(
+    app.root_path,
+    auto_reload=os.environ.get('FLASK_DEBUG', 'false').lower() in ('1', 'true', 'yes'),
+).load()
+
+def static_response(path):
+    result = static_assets.respond(
+        path,
+        request.headers.get('Accept-Encoding', ''),
+        request.headers.get('If-None-Match', ''),
+        request.args.get('v'),
+    )
+    if result is None:
+        abort(404)
+    status, headers, body = result
+    return Response(body, status=status, headers=headers)
+
+# ============================================================================
+# 🧩 SHARED HELPERS
+# ============================================================================
+
+def parse_expires_at(expires_at):
+    """Postgres returns datetime, SQLite returns str."""
+    if isinstance(expires_at, str):
+        return datetime.fromisoformat(expires_at.replace('Z', '+00:00'))
+    return expires_at
+
+def seconds_until(exp_dt):
+    now_dt = datetime.now(exp_dt.tzinfo) if hasattr(exp_dt, 'tzinfo') and exp_dt.tzinfo else datetime.now()
+    return (exp_dt - now_dt).total_seconds()
+
+def is_expired(exp_dt):
+    return seconds_until(exp_dt) < 0
+
+def cached_json_response(entry):
+    """Serve a CachedResponse: 304 if the client's If-None-Match matches, else 200.
+
+    Each Content-Encoding is its own representation with its own ETag.
+    """
+    encoding = json_codec.negotiate_encoding(request.headers.get('Accept-Encoding', ''), len(entry.body),
+                                             prefer=entry.encoded)
+    etag = f'{entry.etag}-{encoding}' if encoding else entry.etag
+    if etag in request.if_none_match:
+        tasks_cache.record_not_modified()
+        response = Response(status=304)
+    else:
+        body = entry.encoded.get(encoding) or json_codec.compress(entry.body, encoding)
+        response = Response(body, mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    # Let browsers keep the body but revalidate on every load
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
+
+def blob_json_response(payload, status=200):
+    """jsonify(payload), sent in its stored compression when a packed blob in it allows (blob_codec.py)."""
+    if status != 200:
+        return jsonify(payload), status
+    body, encoding = encode_json(payload, request.headers.get('Accept-Encoding', ''))
+    response = Response(body, mimetype='application/json')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+    return response
+
+@app.after_request
+def compress_json_response(response):
+    """gzip/deflate JSON bodies above JSON_COMPRESS_MIN_BYTES when the client accepts it."""
+    if (response.mimetype != 'application/json' or response.status_code != 200
+            or response.direct_passthrough or 'ETag' in response.headers
+            or 'Content-Encoding' in response.headers):
+        return response  # ETag'd responses negotiate their own encodings
+    body = response.get_data()
+    if json_codec.COMPRESS_MIN_BYTES and len(body) >= json_codec.COMPRESS_MIN_BYTES:
+        response.vary.add('Accept-Encoding')
+        encoding = json_codec.negotiate_encoding(request.headers.get('Accept-Encoding', ''), len(body))
+        if encoding:
+            response.set_data(json_codec.compress(body, encoding))
+            response.headers['Content-Encoding'] = encoding
+    return response
+
+def pending_execution(conn, execution_id):
+    """Return ((monday_tasks, total_tasks, task_layout), None) for a reviewable
+    execution, or (None, (payload, status)) explaining why it isn't.
+
+    monday_tasks is the stored list as RawJSON (None in the rows layout).
+    """
+    rows = conn.execute('''
+        SELECT monday_tasks, total_tasks, task_layout, status, expires_at, blob_codec, monday_tasks_packed
+        FROM executions WHERE execution_id = ? AND status <> ?
+    ''', (execution_id, DELIVERED))
+    if not rows:
+        return None, ({'error': 'Tasks not found'}, 404)
+    tasks_json, total_tasks, layout, status, expires_at, codec, tasks_packed = rows[0]
+    monday_tasks = stored_json(tasks_json, codec, tasks_packed)
+    if is_expired(parse_expires_at(expires_at)):
+        return None, ({'error': 'Tasks have expired'}, 410)
+    if status != 'pending':
+        return None, ({'error': 'Execution already processed'}, 410)
+    return (monday_tasks, total_tasks, layout), None
+
+def store_approval(conn, execution_id, approved_json, approved_count, total_tasks, method, layout=BLOB,
+                   content_hash=None):
+    """Upsert the approvals row read by /get-approved."""
+    approved_json, approved_packed = blob_codec.pack(approved_json)
+    conn.execute(f'''
+        INSERT INTO approvals (execution_id, approved_tasks, approved_count, total_tasks, method, task_layout,
+                               content_hash, blob_codec, approved_tasks_packed, execution_created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(
+            (SELECT created_at FROM executions WHERE execution_id = ? AND status <> ?), ?))
+        ON CONFLICT ({partitions.approval_key}) DO UPDATE SET
+            approved_tasks = EXCLUDED.approved_tasks,
+            approved_count = EXCLUDED.approved_count,
+            total_tasks = EXCLUDED.total_tasks,
+            method = EXCLUDED.method,
+            task_layout = EXCLUDED.task_layout,
+            content_hash = EXCLUDED.content_hash,
+            blob_codec = EXCLUDED.blob_codec,
+            approved_tasks_packed = EXCLUDED.approved_tasks_packed
+    ''', (execution_id, approved_json, approved_count, total_tasks, method, layout, content_hash,
+          blob_codec.row_codec, approved_packed, execution_id, DELIVERED, datetime.now()))
+
+def approval_payload(conn, execution_id, result):
+    """/get-approved (and webhook) body for an approvals row from fetch_approval()."""
+    approved_json, approved_count, total_tasks, submitted_at, method, layout, codec, approved_packed = result
+    if layout == ROWS:
+        approved_tasks = task_rows.load_approved(conn, execution_id, raw=True)
+    else:
+        approved_tasks = stored_json(approved_json, codec, approved_packed)
+    return {
+        'execution_id': execution_id,
+        'approved_monday_tasks': approved_tasks,
+        'approved_count': approved_count,
+        'total_tasks': total_tasks,
+        'timestamp': submitted_at,
+        'source': 'TaskForge_HITL_Railway',
+        'method': method
+    }
+
+def self_destruct(conn, execution_id, layout):
+    """Delete everything stored for a delivered approval.
+
+    Partitioned tables only flag the rows; retention drops their partition.
+    """
+    invalidate_tasks(conn, execution_id)
+    webhook_deliveries.delete(conn, [execution_id])
+    if partitions.active:
+        conn.execute('UPDATE approvals SET delivered_at = ? WHERE execution_id = ? AND delivered_at IS NULL',
+                     (datetime.now(), execution_id))
+        conn.execute('UPDATE executions SET status = ? WHERE execution_id = ? AND status <> ?',
+                     (DELIVERED, execution_id, DELIVERED))
+        return
+    if layout == ROWS:
+        task_rows.delete(conn, [execution_id])
+    else:
+        task_decisions.delete(conn, [execution_id])
+    conn.execute('DELETE FROM approvals WHERE execution_id = ?', (execution_id,))
+    conn.execute('DELETE FROM executions WHERE execution_id = ?', (execution_id,))
+
+def execution_state(execution_id):
+    """Status, expiry and saved decisions of an execution (what /events streams)."""
+    with connect_db() as conn:
+        rows = conn.execute('''
+            SELECT status, expires_at, total_tasks, task_layout FROM executions
+            WHERE execution_id = ? AND status <> ?
+        ''', (execution_id, DELIVERED))
+        if not rows:
+            return {'execution_id': execution_id, 'status': GONE}
+        status, expires_at, total_tasks, layout = rows[0]
+        if layout == ROWS:
+            decisions = task_rows.decisions(conn, execution_id)
+        else:
+            decisions = task_decisions.load(conn, execution_id)
+
+    exp_dt = parse_expires_at(expires_at)
+    if status == 'pending' and is_expired(exp_dt):
+        status = 'expired'  # the sweeper auto-approves it shortly
+    return {
+        'execution_id': execution_id,
+        'status': status,
+        'expires_at': exp_dt.isoformat(),
+        'expires_ts': exp_dt.timestamp(),
+        'total_tasks': total_tasks,
+        'approved_count': sum(1 for approved in decisions.values() if approved),
+        'decisions': decisions,
+    }
+
+def encode_cursor(expires_at, execution_id):
+    """Opaque keyset cursor for the row after which the next page starts."""
+    raw = json_codec.dumps([str(expires_at), execution_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """Return (expires_at, execution_id); raise ValueError for a malformed cursor."""
+    try:
+        key = json_codec.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not (isinstance(key, list) and len(key) == 2 and all(isinstance(part, str) for part in key)):
+        raise ValueError('Invalid cursor')
+    return key[0], key[1]
+
+def list_executions(conn, status, limit, organizer=None, title_prefix=None, cursor=None, descending=False):
+    """One inbox page: executions rows (no task lists) in (expires_at, execution_id) order.
+
+    Keyset pagination over idx_executions_inbox(_organizer): every page is an
+    index range seek, however deep the reviewer has paged.
+    """
+    conditions, params = ['status = ?'], ['pending' if status == 'expired' else status]
+    if cursor:
+        # Listed before the expiry bound so SQLite seeks on it rather than scanning from now
+        conditions.append(f"(expires_at, execution_id) {'<' if descending else '>'} (?, ?)")
+        params.extend(cursor)
+    if status in ('pending', 'expired'):
+        conditions.append('expires_at > ?' if status == 'pending' else 'expires_at <= ?')
+        params.append(datetime.now())
+    if organizer:
+        conditions.append('meeting_organizer = ?')
+        params.append(organizer)
+    if title_prefix:
+        # Filter only – the scan still follows expires_at
+        conditions.append('lower(substr(meeting_title, 1, ?)) = ?')
+        params.extend((len(title_prefix), title_prefix.lower()))
+    direction = 'DESC' if descending else 'ASC'
+    return conn.execute(f'''
+        SELECT execution_id, meeting_title, meeting_organizer, total_tasks,
+               created_at, expires_at, status, task_layout
+        FROM executions
+        WHERE {' AND '.join(conditions)}
+        ORDER BY expires_at {direction}, execution_id {direction}
+        LIMIT ?
+    ''', (*params, limit))
+
+class ExecutionRecord:
+    """One execution to store; ``tasks`` is a re-iterable of task JSON texts (list or TaskSpool)."""
+    __slots__ = ('execution_id', 'tasks', 'task_count', 'fields', 'callback_url', 'expires_at', 'size',
+                 'content_hash')
+
+    def __init__(self, execution_id, tasks, fields, callback_url, expires_at):
+        self.execution_id = execution_id
+        self.tasks = tasks
+        self.task_count = tasks.count if isinstance(tasks, TaskSpool) else len(tasks)
+        self.fields = fields
+        self.callback_url = callback_url
+        self.expires_at = expires_at
+        self.size = 0 if isinstance(tasks, TaskSpool) else sum(len(task) for task in tasks)
+        # sha256 of everything stored for the execution (expiry aside): equal hash ➜ nothing to write
+        if isinstance(tasks, TaskSpool):
+            digest = tasks.digest.copy()
+        else:
+            digest = hashlib.sha256()
+            for task in tasks:
+                digest.update(task.encode('utf-8') + b'\n')
+        digest.update(json_codec.dumps_bytes([
+            fields.get('meeting_title', 'TaskForge Meeting'),
+            fields.get('meeting_organizer', ''),
+            fields.get('meetings', []),
+            callback_url,
+            TASK_STORAGE,
+        ]))
+        self.content_hash = digest.hexdigest()
+
+def upsert_executions(conn, records):
+    """Store executions (multi-row upsert) and their task rows; distinct execution_ids only.
+
+    Records whose content_hash matches a live, unexpired row are not written
+    at all (a replay keeps the first expiry, which is copied onto the
+    record); their execution_ids are returned.
+    """
+    stored = {}
+    for chunk in chunks([record.execution_id for record in records], UPDATE_CHUNK):
+        rows = conn.execute(f'''
+            SELECT execution_id, content_hash, expires_at FROM executions
+            WHERE execution_id IN ({placeholders(chunk)}) AND status <> ?
+        ''', (*chunk, DELIVERED))
+        stored.update((execution_id, (content_hash, expires_at)) for execution_id, content_hash, expires_at in rows)
+    unchanged = set()
+    for record in records:
+        content_hash, expires_at = stored.get(record.execution_id, (None, None))
+        if content_hash == record.content_hash and not is_expired(parse_expires_at(expires_at)):
+            record.expires_at = parse_expires_at(expires_at)
+            unchanged.add(record.execution_id)
+    records = [record for record in records if record.execution_id not in unchanged]
+
+    values, params = [], []
+    for record in records:
+        created_at = None  # column default
+        if partitions.active:
+            # Partition key: keep the live row's, or start a new generation
+            created_at = partitions.live_created_at(conn, record.execution_id)
+            if created_at is None:
+                created_at = datetime.now()
+                # Leftovers of a delivered generation (kept until its partition is dropped)
+                task_rows.delete(conn, [record.execution_id])
+                task_decisions.delete(conn, [record.execution_id])
+        tasks_json, tasks_packed = blob_codec.pack_pieces(json_array_pieces(record.tasks) if TASK_STORAGE == BLOB else ())
+        meetings_json, meetings_packed = blob_codec.pack(json_codec.dumps(record.fields.get('meetings', [])))
+        values.append('(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))')
+        params.extend((
+            record.execution_id,
+            tasks_json,
+            record.fields.get('meeting_title', 'TaskForge Meeting'),
+            record.fields.get('meeting_organizer', ''),
+            record.task_count,
+            record.expires_at,
+            meetings_json,
+            TASK_STORAGE,
+            record.callback_url,
+            record.content_hash,
+            blob_codec.row_codec,
+            tasks_packed,
+            meetings_packed,
+            created_at
+        ))
+    if not values:
+        return unchanged
+    conn.execute(f'''
+        INSERT INTO executions (execution_id, monday_tasks, meeting_title, meeting_organizer, 
+         total_tasks, expires_at, meetings_data, task_layout, callback_url, content_hash,
+         blob_codec, monday_tasks_packed, meetings_data_packed, created_at)
+        VALUES {', '.join(values)}
+        ON CONFLICT ({partitions.execution_key}) DO UPDATE SET
+            monday_tasks = EXCLUDED.monday_tasks,
+            meeting_title = EXCLUDED.meeting_title,
+            meeting_organizer = EXCLUDED.meeting_organizer,
+            total_tasks = EXCLUDED.total_tasks,
+            expires_at = EXCLUDED.expires_at,
+            meetings_data = EXCLUDED.meetings_data,
+            task_layout = EXCLUDED.task_layout,
+            callback_url = EXCLUDED.callback_url,
+            content_hash = EXCLUDED.content_hash,
+            blob_codec = EXCLUDED.blob_codec,
+            monday_tasks_packed = EXCLUDED.monday_tasks_packed,
+            meetings_data_packed = EXCLUDED.meetings_data_packed
+    ''', tuple(params))
+    if TASK_STORAGE == ROWS:
+        for record in records:
+            task_rows.store(conn, record.execution_id, record.tasks, raw=True)
+    # New tasks: a resubmitted review has to be recorded again
+    for chunk in chunks([record.execution_id for record in records], UPDATE_CHUNK):
+        conn.execute(f'''
+            UPDATE approvals SET content_hash = NULL
+            WHERE execution_id IN ({placeholders(chunk)}) AND delivered_at IS NULL AND content_hash IS NOT NULL
+        ''', tuple(chunk))
+    invalidate_tasks(conn, *(record.execution_id for record in records))
+    return unchanged
+
+def idempotent(scope, fingerprint, handler):
+    """Run handler() once per Idempotency-Key header; replay its 2xx response for retries.
 
-# Background thread will be started later, after tables are ensured
+    ``fingerprint`` identifies the request body: reusing a key for another
+    body is a 422, a retry while the first request still runs a 409.
+    """
+    key = request.headers.get('Idempotency-Key')
+    if not key or not idempotency_cache.enabled:
+        return handler()
+    if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        return jsonify({'error': f'Idempotency-Key longer than {IDEMPOTENCY_KEY_MAX_LENGTH} characters'}), 400
+    cache_key = f'{scope}:{key}'
+    state, entry = idempotency_cache.begin(cache_key, fingerprint)
+    if state == HIT:
+        response = app.response_class(entry.body, status=entry.status, mimetype='application/json')
+        response.headers['Idempotent-Replayed'] = 'true'
+        return response
+    if state == MISMATCH:
+        return jsonify({'error': 'Idempotency-Key was already used for a different request'}), 422
+    if state == IN_FLIGHT:
+        return jsonify({'error': 'A request with this Idempotency-Key is still in progress'}), 409
+    try:
+        response = app.make_response(handler())
+    except BaseException:
+        idempotency_cache.release(cache_key)
+        raise
+    idempotency_cache.complete(cache_key, fingerprint, response.status_code, response.get_data())
+    return response
+
+def parse_decisions(data, total_tasks):
+    """Validate a /save-decisions body into {task_index: approved}.
+
+    Accepts one decision ({"task_index": 3, "approved": true}) or a batch
+    ({"decisions": [...]}); later entries for the same task win.
+    """
+    entries = data.get('decisions')
+    if entries is None:
+        entries = [data]
+    if not isinstance(entries, list) or not entries:
+        raise ValueError('No decisions provided')
+    if len(entries) > DECISION_BATCH_LIMIT:
+        raise ValueError(f'At most {DECISION_BATCH_LIMIT} decisions per request')
+
+    decisions = {}
+    for entry in entries:
+        task_index = entry.get('task_index') if isinstance(entry, dict) else None
+        approved = entry.get('approved') if isinstance(entry, dict) else None
+        if not isinstance(task_index, int) or isinstance(task_index, bool) or not 0 <= task_index < total_tasks:
+            raise ValueError(f'Invalid task_index: {task_index!r}')
+        if not isinstance(approved, bool):
+            raise ValueError(f'Invalid approved flag for task {task_index}: {approved!r}')
+        decisions[task_index] = approved
+    return decisions
 
 # ============================================================================
 # 📊 API ENDPOINTS
@@ -206,89 +966,247 @@ def background_cleanup():
 
 @app.route('/')
 def serve_index():
-    return send_from_directory('.', 'index.html')
+    return static_response('index.html')
 
 @app.route('/store-tasks', methods=['POST'])
 def store_tasks():
     """Store Monday.com tasks from N8N for HITL approval"""
+    spool = None
     try:
-        data = request.get_json()
+        if not request.is_json:
+            return jsonify({'error': 'Content-Type must be application/json'}), 415
+        # Parsed as it arrives: tasks go to a spool one by one instead of one big list
+        try:
+            data, spool = parse_task_upload(
+                request.stream, MAX_REQUEST_BYTES, MAX_TASKS_PER_EXECUTION, MAX_TASK_BYTES, INGEST_SPOOL_MEMORY_BYTES,
+            )
+        except IngestError as e:
+            return jsonify({'error': str(e)}), e.status
         execution_id = data.get('execution_id')
-        monday_tasks = data.get('monday_tasks', [])
         
         if not execution_id:
             return jsonify({'error': 'No execution_id provided'}), 400
             
-        # Allow an empty list ("no-meeting" payload) but reject a completely missing field
-        # `monday_tasks is None` covers the cases where the key is absent or explicitly set to null.
-        if monday_tasks is None:
-            return jsonify({'error': 'No monday_tasks provided'}), 400
+        # Allow an empty list ("no-meeting" payload) or a missing field, but reject an explicit null
+        if spool is None:
+            if 'monday_tasks' in data:
+                message = 'No monday_tasks provided' if data['monday_tasks'] is None else 'monday_tasks must be a list'
+                return jsonify({'error': message}), 400
+            spool = TaskSpool(0)
+        task_count = spool.count
+
+        # Optional push delivery of the approval (instead of long-polling /get-approved)
+        callback_url = data.get('callback_url')
+        if callback_url is not None:
+            try:
+                validate_callback_url(callback_url, CALLBACK_ALLOWED_HOSTS)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
         
         # Calculate expiry time (15 minutes from now)
         expires_at = datetime.now() + timedelta(minutes=15)
+        record = ExecutionRecord(execution_id, spool, data, callback_url, expires_at)
         
-        # Store in DB
-        with connect_db() as conn:
-            conn.execute('''
-                INSERT INTO executions (execution_id, monday_tasks, meeting_title, meeting_organizer, 
-             total_tasks, expires_at, meetings_data)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-                ON CONFLICT (execution_id) DO UPDATE SET
-                    monday_tasks = EXCLUDED.monday_tasks,
-                    meeting_title = EXCLUDED.meeting_title,
-                    meeting_organizer = EXCLUDED.meeting_organizer,
-                    total_tasks = EXCLUDED.total_tasks,
-                    expires_at = EXCLUDED.expires_at,
-                    meetings_data = EXCLUDED.meetings_data
-            ''', (
-                execution_id,
-                json.dumps(monday_tasks),
-                data.get('meeting_title', 'TaskForge Meeting'),
-                data.get('meeting_organizer', ''),
-                len(monday_tasks),
-                expires_at,
-                json.dumps(data.get('meetings', []))
-            ))
-        
-        print(f"📦 Stored {len(monday_tasks)} tasks for {execution_id} (expires: {expires_at})")
+        def store():
+            with connect_db() as conn:
+                unchanged = upsert_executions(conn, [record])
+            
+            if unchanged:
+                log.info('tasks_unchanged', '♻️ Tasks for {execution_id} unchanged, nothing written',
+                         execution_id=execution_id)
+            else:
+                log.info('tasks_stored', '📦 Stored {count} tasks for {execution_id} (expires: {expires_at})',
+                         count=task_count, execution_id=execution_id, expires_at=record.expires_at)
+            
+            body = {
+                'success': True, 
+                'execution_id': execution_id,
+                'stored_tasks': task_count,
+                'expires_at': record.expires_at.isoformat(),
+                'callback_url': callback_url
+            }
+            if unchanged:
+                body['unchanged'] = True
+            return jsonify(body)
         
-        return jsonify({
-            'success': True, 
-            'execution_id': execution_id,
-            'stored_tasks': len(monday_tasks),
-            'expires_at': expires_at.isoformat()
-        })
+        return idempotent('store-tasks', f'{execution_id}:{record.content_hash}', store)
         
+    except PoolTimeout as e:
+        return pool_timeout_response(e)
     except Exception as e:
-        print(f"❌ Error storing tasks: {str(e)}")
+        log.error('store_tasks_failed', '❌ Error storing tasks: {error}', error=str(e))
         return jsonify({'error': str(e)}), 500
+    finally:
+        if spool is not None:
+            spool.close()
+
+@app.route('/store-tasks/bulk', methods=['POST'])
+def store_tasks_bulk():
+    """Store many executions in one request: a JSON array or NDJSON, one result per item"""
+    ndjson = request.mimetype in ('application/x-ndjson', 'application/jsonl')
+    if not (ndjson or request.is_json):
+        return jsonify({'error': 'Content-Type must be application/json or application/x-ndjson'}), 415
+
+    results = []
+    chunk, chunk_ids, chunk_bytes = [], set(), 0
+    host_checks = {}  # callback host -> verdict, one DNS lookup per host
+    current = None    # (index, item) being validated
+
+    def flush():
+        nonlocal chunk, chunk_ids, chunk_bytes
+        if chunk:
+            results.extend(store_execution_chunk(chunk))
+        chunk, chunk_ids, chunk_bytes = [], set(), 0
+
+    try:
+        items = iter_bulk_upload(request.stream, MAX_REQUEST_BYTES, BULK_MAX_EXECUTIONS, MAX_REQUEST_BYTES, ndjson)
+        for index, item, error in items:
+            current = (index, item)  # cleared once it is reported or in the chunk
+            try:
+                if error:
+                    raise error
+                record = bulk_record(item, host_checks)
+            except (IngestError, ValueError) as e:
+                results.append(bulk_error(index, item, str(e), getattr(e, 'status', 400)))
+                current = None
+                continue
+            # One upsert can't touch a row twice: a repeated id starts a new chunk
+            if record.execution_id in chunk_ids:
+                flush()
+            chunk.append((index, record))
+            current = None
+            chunk_ids.add(record.execution_id)
+            chunk_bytes += record.size
+            if len(chunk) >= BULK_CHUNK_SIZE or chunk_bytes >= BULK_CHUNK_BYTES:
+                flush()
+        flush()
+    except IngestError as e:
+        # The rest of the body can't be read; items before this point are stored
+        flush()
+        return jsonify(bulk_summary(results, error=str(e))), e.status
+    except Exception as e:
+        log.error('store_tasks_bulk_failed', '❌ Error in bulk store: {error}', error=str(e))
+        # Neither the chunk in progress nor the item being validated was stored
+        results.extend(bulk_error(index, record.fields, f'Not stored: {e}', 500) for index, record in chunk)
+        if current is not None:
+            results.append(bulk_error(*current, f'Not stored: {e}', 500))
+        return jsonify(bulk_summary(results, error=str(e))), 500
+
+    return jsonify(bulk_summary(results))
+
+def bulk_error(index, item, error, code):
+    execution_id = item.get('execution_id') if isinstance(item, dict) else None
+    return {'index': index, 'execution_id': execution_id, 'status': 'error', 'error': error, 'code': code}
+
+def bulk_record(item, host_checks=None):
+    """Validate one bulk item like /store-tasks validates its body; return an ExecutionRecord."""
+    execution_id = item.get('execution_id')
+    if not execution_id or not isinstance(execution_id, str):
+        raise ValueError('No execution_id provided')
+    tasks = item.get('monday_tasks', [])
+    if tasks is None:
+        raise ValueError('No monday_tasks provided')
+    if not isinstance(tasks, list):
+        raise ValueError('monday_tasks must be a list')
+    if len(tasks) > MAX_TASKS_PER_EXECUTION:
+        raise IngestError(f'At most {MAX_TASKS_PER_EXECUTION} tasks per execution', 413)
+    task_texts = []
+    for position, task in enumerate(tasks):
+        if not isinstance(task, dict):
+            raise ValueError(f'monday_tasks[{position}] must be an object')
+        text = json_codec.dumps(task)
+        if len(text) > MAX_TASK_BYTES:
+            raise IngestError(f'monday_tasks[{position}] exceeds {MAX_TASK_BYTES} bytes', 413)
+        task_texts.append(text)
+    callback_url = item.get('callback_url')
+    if callback_url is not None:
+        validate_callback_url(callback_url, CALLBACK_ALLOWED_HOSTS, host_checks)
+    return ExecutionRecord(execution_id, task_texts, item, callback_url, datetime.now() + timedelta(minutes=15))
+
+def store_execution_chunk(chunk):
+    """Upsert [(index, ExecutionRecord)] in one transaction; return their results."""
+    try:
+        with connect_db() as conn:
+            unchanged = upsert_executions(conn, [record for _, record in chunk])
+    except Exception as e:
+        log.error('store_tasks_bulk_failed', '❌ Error storing {count} executions: {error}',
+                  count=len(chunk), error=str(e))
+        code = 503 if isinstance(e, PoolTimeout) else 500
+        return [{'index': index, 'execution_id': record.execution_id, 'status': 'error', 'error': str(e), 'code': code}
+                for index, record in chunk]
+    log.info('tasks_stored_bulk', '📦 Stored {count} executions ({tasks} tasks) in one transaction, {unchanged} unchanged',
+             count=len(chunk) - len(unchanged), tasks=sum(record.task_count for _, record in chunk),
+             unchanged=len(unchanged))
+    results = []
+    for index, record in chunk:
+        result = {'index': index, 'execution_id': record.execution_id, 'status': 'stored',
+                  'stored_tasks': record.task_count, 'expires_at': record.expires_at.isoformat()}
+        if record.execution_id in unchanged:
+            result['unchanged'] = True
+        results.append(result)
+    return results
+
+def bulk_summary(results, error=None):
+    results.sort(key=lambda result: result['index'])  # rejected items are reported before their chunk
+    stored = sum(1 for result in results if result['status'] == 'stored')
+    summary = {
+        'success': error is None and stored == len(results),
+        'stored': stored,
+        'failed': len(results) - stored,
+        'results': results,
+    }
+    if error:
+        summary['error'] = error
+    return summary
 
 @app.route('/get-tasks/<execution_id>', methods=['GET'])
 def get_tasks(execution_id):
-    """Get stored tasks for UI display"""
+    """Get stored tasks for UI display (?start=&limit= for one slice)"""
     try:
+        if 'start' in request.args or 'limit' in request.args:
+            start = request.args.get('start', 0, type=int)
+            limit = request.args.get('limit', TASKS_PAGE_MAX, type=int)
+            if start < 0 or not 1 <= limit <= TASKS_PAGE_MAX:
+                return jsonify({'error': f'start must be >= 0 and limit between 1 and {TASKS_PAGE_MAX}'}), 400
+            return get_task_page(execution_id, start, limit)
+
+        # Fresh cached copy ➜ no database access at all (304 if unchanged)
+        cached = tasks_cache.get(execution_id) if tasks_cache.enabled else None
+        if cached:
+            return cached_json_response(cached)
+        if tasks_cache.enabled:
+            ensure_approval_listener()  # receive other workers' invalidations
+        token = tasks_cache.token()
+
         with connect_db() as conn:
             result_rows = conn.execute('''
             SELECT monday_tasks, meeting_title, meeting_organizer, total_tasks, 
-                   created_at, expires_at, meetings_data, status
+                   created_at, expires_at, meetings_data, status, task_layout,
+                   blob_codec, monday_tasks_packed, meetings_data_packed
             FROM executions 
-            WHERE execution_id = ?
-        ''', (execution_id,))
+            WHERE execution_id = ? AND status <> ?
+        ''', (execution_id, DELIVERED))
             result = result_rows[0] if result_rows else None
+            if result and result[8] == ROWS and result[7] == 'pending':
+                tasks = task_rows.load(conn, execution_id, raw=True)
+            elif result and result[7] == 'pending':
+                decisions = task_decisions.load(conn, execution_id)
+                stored_tasks = stored_json(result[0], result[9], result[10])
+                # Stored JSON goes out verbatim unless decisions must be merged in
+                if decisions:
+                    tasks = apply_decisions(json_codec.loads(stored_tasks.text), decisions)
+                else:
+                    tasks = stored_tasks
         
         if not result:
             return jsonify({'error': 'Tasks not found'}), 404
         
-        tasks_json, meeting_title, meeting_organizer, total_tasks, created_at, expires_at, meetings_json, status = result
+        (tasks_json, meeting_title, meeting_organizer, total_tasks, created_at, expires_at, meetings_json, status,
+         layout, codec, _, meetings_packed) = result
         
-        # Check if expired (Postgres returns datetime, SQLite returns str)
-        if isinstance(expires_at, str):
-            exp_dt = datetime.fromisoformat(expires_at.replace('Z', '+00:00'))
-        else:  # already a datetime object
-            exp_dt = expires_at
-
-        now_dt = datetime.now(exp_dt.tzinfo) if hasattr(exp_dt, 'tzinfo') and exp_dt.tzinfo else datetime.now()
-        if exp_dt < now_dt:
+        # Check if expired
+        exp_dt = parse_expires_at(expires_at)
+        if is_expired(exp_dt):
             return jsonify({'error': 'Tasks have expired'}), 410
         
         if status != 'pending':
@@ -296,21 +1214,156 @@ def get_tasks(execution_id):
         
         data = {
             'execution_id': execution_id,
-            'monday_tasks': json.loads(tasks_json),
+            # Saved decisions ride along so a reloaded dashboard restores them
+            'monday_tasks': tasks,
             'meeting_title': meeting_title,
             'meeting_organizer': meeting_organizer,
             'total_tasks': total_tasks,
             'created_at': created_at,
             'expires_at': exp_dt.isoformat(),
             'status': status,
-            'meetings': json.loads(meetings_json) if meetings_json else []
+            'meetings': stored_json(meetings_json, codec, meetings_packed) or []
         }
         
-        print(f"📤 Serving {total_tasks} tasks for {execution_id}")
-        return jsonify(data)
+        log.info('tasks_served', '📤 Serving {count} tasks for {execution_id}',
+                 count=total_tasks, execution_id=execution_id)
+        body = json_codec.dumps_bytes(data)
+        # Never cache past the approval window; compress once for every later hit
+        # (around the stored bytes when they are packed, else gzip)
+        encoded = {}
+        if json_codec.COMPRESS_MIN_BYTES and len(body) >= json_codec.COMPRESS_MIN_BYTES:
+            packed_body, encoding = encode_json(data, 'deflate, zstd')
+            if encoding:
+                encoded[encoding] = packed_body
+            else:
+                encoded['gzip'] = json_codec.compress(body, 'gzip')
+        entry = tasks_cache.put(execution_id, token, body, ttl=seconds_until(exp_dt), encoded=encoded)
+        return cached_json_response(entry)
     
+    except PoolTimeout as e:
+        return pool_timeout_response(e)
+    except Exception as e:
+        log.error('get_tasks_failed', '❌ Error getting tasks: {error}', error=str(e))
+        return jsonify({'error': str(e)}), 500
+
+def get_task_page(execution_id, start, limit):
+    """Tasks [start, start + limit) with the execution's metadata and total count.
+
+    Each task carries its task_index. Rows-layout pages are primary-key range
+    scans; blob lists are sliced by the database, not parsed in Python.
+    """
+    stop = start + limit
+    with connect_db() as conn:
+        rows = conn.execute('''
+            SELECT meeting_title, meeting_organizer, total_tasks, created_at,
+                   expires_at, meetings_data, status, task_layout,
+                   blob_codec, monday_tasks_packed, meetings_data_packed
+            FROM executions WHERE execution_id = ? AND status <> ?
+        ''', (execution_id, DELIVERED))
+        if not rows:
+            return jsonify({'error': 'Tasks not found'}), 404
+        (meeting_title, meeting_organizer, total_tasks, created_at, expires_at, meetings_json, status, layout,
+         codec, tasks_packed, meetings_packed) = rows[0]
+        exp_dt = parse_expires_at(expires_at)
+        if is_expired(exp_dt):
+            return jsonify({'error': 'Tasks have expired'}), 410
+        if status != 'pending':
+            return jsonify({'error': 'Execution already processed'}), 410
+
+        if layout == ROWS:
+            tasks = task_rows.load(conn, execution_id, raw=True, start=start, stop=stop)
+        else:
+            decisions = {index: approved for index, approved in task_decisions.load(conn, execution_id).items()
+                         if start <= index < stop}
+            if tasks_packed is not None:
+                # The database can't look inside a packed list: slice it here
+                tasks = [dict(task, task_index=index) for index, task in
+                         enumerate(json_codec.loads(stored_json('', codec, tasks_packed).text)[start:stop], start)]
+            else:
+                # Sent verbatim unless saved decisions must be merged in
+                tasks = task_rows.load_blob_range(conn, execution_id, start, stop, raw=not decisions)
+            if decisions:
+                for task in tasks:
+                    if task['task_index'] in decisions:
+                        task['approved'] = decisions[task['task_index']]
+
+    return jsonify({
+        'execution_id': execution_id,
+        'monday_tasks': tasks,
+        'start': start,
+        'next_start': stop if stop < total_tasks else None,
+        'meeting_title': meeting_title,
+        'meeting_organizer': meeting_organizer,
+        'total_tasks': total_tasks,
+        'created_at': created_at,
+        'expires_at': exp_dt.isoformat(),
+        'status': status,
+        'meetings': stored_json(meetings_json, codec, meetings_packed) or []
+    })
+
+@app.route('/executions', methods=['GET'])
+def list_inbox():
+    """Reviewer inbox: a page of executions, soonest-expiring first"""
+    try:
+        status = request.args.get('status', 'pending')
+        if status not in INBOX_STATUSES:
+            return jsonify({'error': f"status must be one of {', '.join(INBOX_STATUSES)}"}), 400
+        order = request.args.get('order', 'asc')
+        if order not in ('asc', 'desc'):
+            return jsonify({'error': "order must be 'asc' or 'desc'"}), 400
+        limit = request.args.get('limit', INBOX_PAGE_SIZE, type=int)
+        if not 1 <= limit <= INBOX_MAX_PAGE_SIZE:
+            return jsonify({'error': f'limit must be between 1 and {INBOX_MAX_PAGE_SIZE}'}), 400
+        cursor = request.args.get('cursor')
+        try:
+            cursor = decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        with connect_db() as conn:
+            # One extra row tells whether another page follows
+            rows = list_executions(
+                conn, status, limit + 1,
+                organizer=request.args.get('organizer') or None,
+                title_prefix=request.args.get('title_prefix') or None,
+                cursor=cursor,
+                descending=order == 'desc',
+            )
+            page = rows[:limit]
+            counts = {}
+            if status in ('pending', 'expired'):
+                # Review progress for this page only: two grouped primary-key lookups
+                counts.update(task_rows.decision_counts(conn, [r[0] for r in page if r[7] == ROWS]))
+                counts.update(task_decisions.decision_counts(conn, [r[0] for r in page if r[7] != ROWS]))
+
+        executions = []
+        for execution_id, meeting_title, meeting_organizer, total_tasks, created_at, expires_at, row_status, _ in page:
+            exp_dt = parse_expires_at(expires_at)
+            decided, approved = counts.get(execution_id, (0, 0))
+            executions.append({
+                'execution_id': execution_id,
+                'meeting_title': meeting_title,
+                'meeting_organizer': meeting_organizer,
+                'total_tasks': total_tasks,
+                'decided_count': decided if status in ('pending', 'expired') else None,
+                'approved_count': approved if status in ('pending', 'expired') else None,
+                'created_at': created_at,
+                'expires_at': exp_dt.isoformat(),
+                'expires_in': round(max(0.0, seconds_until(exp_dt)), 1),
+                'status': row_status,
+            })
+
+        return jsonify({
+            'executions': executions,
+            'next_cursor': encode_cursor(page[-1][5], page[-1][0]) if len(rows) > limit else None,
+            'status': status,
+            'limit': limit,
+        })
+
+    except PoolTimeout as e:
+        return pool_timeout_response(e)
     except Exception as e:
-        print(f"❌ Error getting tasks: {str(e)}")
+        log.error('list_inbox_failed', '❌ Error listing executions: {error}', error=str(e))
         return jsonify({'error': str(e)}), 500
 
 @app.route('/submit-approval', methods=['POST'])
@@ -323,46 +1376,257 @@ def submit_approval():
         
         if not execution_id:
             return jsonify({'error': 'No execution_id provided'}), 400
-            
-        # Filter approved tasks
-        approved_tasks = [task for task in monday_tasks_with_approval if task.get('approved') == True]
         
-        # Store approval in SQLite
-        with connect_db() as conn:
-            conn.execute('''
-                INSERT INTO approvals (execution_id, approved_tasks, approved_count, total_tasks, method)
-            VALUES (?, ?, ?, ?, ?)
-                ON CONFLICT (execution_id) DO UPDATE SET
-                    approved_tasks = EXCLUDED.approved_tasks,
-                    approved_count = EXCLUDED.approved_count,
-                    total_tasks = EXCLUDED.total_tasks,
-                    method = EXCLUDED.method
-            ''', (
-                execution_id,
-                json.dumps(approved_tasks),
-                len(approved_tasks),
-                len(monday_tasks_with_approval),
-                'manual'
-            ))
+        fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+        return idempotent('submit-approval', fingerprint,
+                          lambda: record_submission(execution_id, monday_tasks_with_approval))
         
+    except PoolTimeout as e:
+        return pool_timeout_response(e)
+    except Exception as e:
+        log.error('submit_approval_failed', '❌ Error submitting approval: {error}', error=str(e))
+        return jsonify({'error': str(e)}), 500
+
+def record_submission(execution_id, monday_tasks_with_approval):
+    """Store a submitted review unless the same decisions are already stored."""
+    # Filter approved tasks
+    approved_tasks = [task for task in monday_tasks_with_approval if task.get('approved') == True]
+    content_hash = hashlib.sha256(json_codec.dumps_bytes(monday_tasks_with_approval)).hexdigest()
+    body = {
+        'success': True,
+        'approved_count': len(approved_tasks),
+        'total_tasks': len(monday_tasks_with_approval)
+    }
+    
+    # Store approval
+    with connect_db() as conn:
+        # Re-storing the tasks clears the hash (upsert_executions), so this means
+        # the same decisions on the same tasks
+        stored = conn.execute('SELECT content_hash FROM approvals WHERE execution_id = ? AND delivered_at IS NULL',
+                              (execution_id,))
+        if stored and stored[0][0] == content_hash:
+            log.info('approval_unchanged', '♻️ Approval for {execution_id} unchanged, nothing written',
+                     execution_id=execution_id)
+            return jsonify({**body, 'unchanged': True})
+        
+        layout_rows = conn.execute('SELECT task_layout FROM executions WHERE execution_id = ? AND status <> ?',
+                                   (execution_id, DELIVERED))
+        layout = layout_rows[0][0] if layout_rows else BLOB
+        if layout == ROWS:
+            # Decisions become column updates; the blob stays empty
+            task_rows.decide(conn, execution_id, approved_indexes(monday_tasks_with_approval))
+        else:
+            # The submitted list supersedes anything autosaved
+            task_decisions.delete(conn, [execution_id])
+
+        store_approval(
+            conn,
+            execution_id,
+            json_codec.dumps(approved_tasks) if layout == BLOB else '',
+            len(approved_tasks),
+            len(monday_tasks_with_approval),
+            'manual',
+            layout,
+            content_hash
+        )
+    
         # Update execution status
+        conn.execute('''
+            UPDATE executions SET status = 'approved' WHERE execution_id = ? AND status <> ?
+        ''', (execution_id, DELIVERED))
+        announce_approval(conn, execution_id)
+    
+    log.info('approval_submitted', '✅ Manual approval: {approved}/{total} tasks for {execution_id}',
+             approved=len(approved_tasks), total=len(monday_tasks_with_approval), execution_id=execution_id)
+    
+    return jsonify(body)
+
+@app.route('/save-decisions', methods=['POST'])
+def save_decisions():
+    """Autosave approve/reject decisions for one task or a small batch"""
+    try:
+        data = request.get_json()
+        execution_id = data.get('execution_id')
+
+        if not execution_id:
+            return jsonify({'error': 'No execution_id provided'}), 400
+
         with connect_db() as conn:
+            execution, error = pending_execution(conn, execution_id)
+            if error:
+                return jsonify(error[0]), error[1]
+            _, total_tasks, layout = execution
+
+            try:
+                decisions = parse_decisions(data, total_tasks)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+
+            if layout == ROWS:
+                task_rows.record(conn, execution_id, decisions)
+            else:
+                task_decisions.save(conn, execution_id, decisions)
+            invalidate_tasks(conn, execution_id)
+
+        return jsonify({'success': True, 'saved': len(decisions)})
+
+    except PoolTimeout as e:
+        return pool_timeout_response(e)
+    except Exception as e:
+        log.error('save_decisions_failed', '❌ Error saving decisions: {error}', error=str(e))
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/commit-approval', methods=['POST'])
+def commit_approval():
+    """Finish a review from its autosaved decisions (undecided tasks are rejected)"""
+    try:
+        data = request.get_json()
+        execution_id = data.get('execution_id')
+
+        if not execution_id:
+            return jsonify({'error': 'No execution_id provided'}), 400
+
+        with connect_db() as conn:
+            execution, error = pending_execution(conn, execution_id)
+            if error:
+                return jsonify(error[0]), error[1]
+            tasks_json, total_tasks, layout = execution
+
+            if layout == ROWS:
+                approved_json = ''
+                approved_count = conn.execute('''
+                    SELECT COUNT(*) FROM execution_tasks WHERE execution_id = ? AND approved
+                ''', (execution_id,))[0][0]
+            else:
+                decisions = task_decisions.load(conn, execution_id)
+                approved_tasks = [dict(task, approved=True)
+                                  for index, task in enumerate(json_codec.loads(tasks_json.text))
+                                  if decisions.get(index)]
+                approved_json = json_codec.dumps(approved_tasks)
+                approved_count = len(approved_tasks)
+                task_decisions.delete(conn, [execution_id])
+
+            store_approval(conn, execution_id, approved_json, approved_count, total_tasks, 'manual', layout)
             conn.execute('''
-                UPDATE executions SET status = 'approved' WHERE execution_id = ?
-            ''', (execution_id,))
-        
-        print(f"✅ Manual approval: {len(approved_tasks)}/{len(monday_tasks_with_approval)} tasks for {execution_id}")
-        
+                UPDATE executions SET status = 'approved' WHERE execution_id = ? AND status <> ?
+            ''', (execution_id, DELIVERED))
+            announce_approval(conn, execution_id)
+
+        log.info('approval_committed', '✅ Manual approval (autosaved): {approved}/{total} tasks for {execution_id}',
+                 approved=approved_count, total=total_tasks, execution_id=execution_id)
+
         return jsonify({
             'success': True,
-            'approved_count': len(approved_tasks),
-            'total_tasks': len(monday_tasks_with_approval)
+            'approved_count': approved_count,
+            'total_tasks': total_tasks
         })
-        
+
+    except PoolTimeout as e:
+        return pool_timeout_response(e)
     except Exception as e:
-        print(f"❌ Error submitting approval: {str(e)}")
+        log.error('commit_approval_failed', '❌ Error committing approval: {error}', error=str(e))
         return jsonify({'error': str(e)}), 500
 
+def fetch_approval(execution_id):
+    """Return the approvals row for execution_id, or None."""
+    with connect_db() as conn:
+        rows = conn.execute('''
+            SELECT approved_tasks, approved_count, total_tasks, submitted_at, method, task_layout,
+                   blob_codec, approved_tasks_packed
+            FROM approvals 
+            WHERE execution_id = ? AND delivered_at IS NULL
+        ''', (execution_id,))
+    return rows[0] if rows else None
+
+def deliver_approval(execution_id, result):
+    """Return (payload, status) for /get-approved once waiting is over.
+
+    ``result`` is the approvals row from fetch_approval(), or None when the
+    wait timed out – in that case every pending task is auto-approved.
+    Either way both rows are self-destructed.
+    """
+    if result:
+        # Found approval - return and clean up (self-destruct)
+        with connect_db() as conn:
+            response_data = approval_payload(conn, execution_id, result)
+            self_destruct(conn, execution_id, result[5])
+        
+        log.info('approval_delivered', '✅ Self-destructed data for {execution_id} - returned {approved} approved tasks',
+                 execution_id=execution_id, approved=response_data['approved_count'])
+        return response_data, 200
+    
+    # Check if execution still exists (pending)
+    with connect_db() as conn:
+        exec_rows = conn.execute('SELECT monday_tasks, total_tasks, status, task_layout, blob_codec, monday_tasks_packed FROM executions WHERE execution_id = ? AND status <> ?', (execution_id, DELIVERED))
+        exec_res = exec_rows[0] if exec_rows else None
+
+    if exec_res and exec_res[3] == ROWS:
+        # -------------------------------------------------------------
+        # 🚦 HITL timed-out (rows layout) ➜ one UPDATE, then self-destruct
+        # -------------------------------------------------------------
+        total_tasks = exec_res[1]
+        with connect_db() as conn:
+            task_rows.auto_approve(conn, [execution_id], 'auto_wait_timeout')
+            invalidate_tasks(conn, execution_id)
+            tasks_list = task_rows.load_approved(conn, execution_id)
+            self_destruct(conn, execution_id, ROWS)
+
+    elif exec_res:
+        # -------------------------------------------------------------
+        # 🚦 HITL timed-out ➜ auto-approve all undecided tasks
+        # -------------------------------------------------------------
+        tasks_json, total_tasks, current_status, _, codec, tasks_packed = exec_res
+
+        # Saved decisions stand; every other task is approved (if not already)
+        with connect_db() as conn:
+            decisions = task_decisions.load(conn, execution_id)
+        tasks_list = []
+        for index, t in enumerate(json_codec.loads(stored_json(tasks_json, codec, tasks_packed).text)):
+            decision = decisions.get(index)
+            if decision is False:
+                continue
+            t['approved'] = True
+            # flag only if not manually approved earlier
+            if decision is None and 'auto_approved' not in t:
+                t['auto_approved'] = True
+                t['approval_reason'] = 'auto_wait_timeout'
+            tasks_list.append(t)
+
+        approved_tasks_json = json_codec.dumps(tasks_list)
+
+        # Persist auto-approval
+        with connect_db() as conn:
+            store_approval(conn, execution_id, approved_tasks_json, len(tasks_list), total_tasks, 'auto_wait_timeout')
+
+            # Mark execution as processed
+            conn.execute('UPDATE executions SET status = ? WHERE execution_id = ? AND status <> ?',
+                         ('auto_approved', execution_id, DELIVERED))
+            invalidate_tasks(conn, execution_id)
+
+        # Return the freshly approved list (and self-destruct)
+        with connect_db() as conn:
+            self_destruct(conn, execution_id, BLOB)
+
+    if exec_res:
+        auto_approvals_total.inc(method='auto_wait_timeout')
+        log.info('auto_approved_wait_timeout',
+                 '✅ Auto-approved (wait timeout) and self-destructed data for {execution_id} – returned {approved} tasks',
+                 execution_id=execution_id, approved=len(tasks_list))
+
+        return {
+            'execution_id': execution_id,
+            'approved_monday_tasks': tasks_list,
+            'approved_count': len(tasks_list),
+            'total_tasks': total_tasks,
+            'timestamp': datetime.now().isoformat(),
+            'source': 'TaskForge_HITL_Railway',
+            'method': 'auto_wait_timeout'
+        }, 200
+
+    # No execution found at all
+    log.info('approval_not_found', '❌ No data found for execution: {execution_id}', execution_id=execution_id)
+    return {'error': 'Execution ID not found or already processed'}, 404
+
 @app.route('/get-approved', methods=['GET', 'POST'])
 @app.route('/approved', methods=['GET', 'POST'])
 def get_approved():
@@ -377,168 +1641,227 @@ def get_approved():
         if not execution_id:
             return jsonify({'error': 'No execution_id provided'}), 400
         
-        with connect_db() as conn:
-            result_rows = conn.execute('''
-            SELECT approved_tasks, approved_count, total_tasks, submitted_at, method
-            FROM approvals 
-            WHERE execution_id = ?
-        ''', (execution_id,))
-            result = result_rows[0] if result_rows else None
+        # -------------------------------------------------------------------
+        # 🕒 If not yet approved, block-wait (max 5 min) for a notification.
+        #    No connection is held while waiting.
+        # -------------------------------------------------------------------
+        ensure_approval_listener()
+        wait_started = time.monotonic()
+        with approval_notifier.watch(execution_id) as approved:
+            result = fetch_approval(execution_id)
+            deadline = time.monotonic() + APPROVAL_WAIT_SEC
 
-            # -------------------------------------------------------------------
-            # 🕒 If not yet approved, block-wait (max 5 min) instead of returning
-            # -------------------------------------------------------------------
-            if not result:
-                MAX_WAIT = int(os.getenv('APPROVAL_WAIT_SEC', 300))  # 300 s default
-                POLL_SEC = 2
-                deadline = time.time() + MAX_WAIT
-
-                while time.time() < deadline and not result:
-                    time.sleep(POLL_SEC)
-                    check_rows = conn.execute('''
-                        SELECT approved_tasks, approved_count, total_tasks, submitted_at, method
-                        FROM approvals 
-                        WHERE execution_id = ?
-                    ''', (execution_id,))
-                    result = check_rows[0] if check_rows else None
-
-            # After wait loop, result may now be available
+            # Re-check after every wake-up, and once more on timeout
+            while not result:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                with trace_span('wait'):
+                    if approved.wait(remaining):
+                        approved.clear()
+                result = fetch_approval(execution_id)
+
+        observe_approval_wait(wait_started, result)
         
-        if result:
-            # Found approval - return and clean up
-            approved_json, approved_count, total_tasks, submitted_at, method = result
+        response_data, status_code = deliver_approval(execution_id, result)
+        return blob_json_response(response_data, status_code)
             
-            # Clean up both tables (self-destruct)
-            with connect_db() as conn:
-                conn.execute('DELETE FROM approvals WHERE execution_id = ?', (execution_id,))
-                conn.execute('DELETE FROM executions WHERE execution_id = ?', (execution_id,))
-            
-            response_data = {
-                'execution_id': execution_id,
-                'approved_monday_tasks': json.loads(approved_json),
-                'approved_count': approved_count,
-                'total_tasks': total_tasks,
-                'timestamp': submitted_at,
-                'source': 'TaskForge_HITL_Railway',
-                'method': method
-            }
-            
-            print(f"✅ Self-destructed data for {execution_id} - returned {approved_count} approved tasks")
-            return jsonify(response_data)
-        
-        # Check if execution still exists (pending)
-        with connect_db() as conn:
-            exec_rows = conn.execute('SELECT monday_tasks, total_tasks, status FROM executions WHERE execution_id = ?', (execution_id,))
-            exec_res = exec_rows[0] if exec_rows else None
-
-        if exec_res:
-            # -------------------------------------------------------------
-            # 🚦 HITL timed-out ➜ auto-approve all remaining tasks
-            # -------------------------------------------------------------
-            tasks_json, total_tasks, current_status = exec_res
-
-            # Parse tasks and mark every one as approved (if not already)
-            tasks_list = json.loads(tasks_json)
-            for t in tasks_list:
-                t['approved'] = True
-                # flag only if not manually approved earlier
-                if 'auto_approved' not in t:
-                    t['auto_approved'] = True
-                    t['approval_reason'] = 'auto_wait_timeout'
-
-            approved_tasks_json = json.dumps(tasks_list)
-
-            # Persist auto-approval
-            with connect_db() as conn:
-                conn.execute('''
-                    INSERT INTO approvals (execution_id, approved_tasks, approved_count, total_tasks, method)
-                VALUES (?, ?, ?, ?, ?)
-                    ON CONFLICT (execution_id) DO UPDATE SET
-                        approved_tasks = EXCLUDED.approved_tasks,
-                        approved_count = EXCLUDED.approved_count,
-                        total_tasks = EXCLUDED.total_tasks,
-                        method = EXCLUDED.method
-                ''', (
-                    execution_id,
-                    approved_tasks_json,
-                    len(tasks_list),
-                    total_tasks,
-                    'auto_wait_timeout'
-                ))
-
-                # Mark execution as processed
-                conn.execute('UPDATE executions SET status = ? WHERE execution_id = ?', ('auto_approved', execution_id))
-
-            # Return the freshly approved list (and self-destruct)
-            with connect_db() as conn:
-                conn.execute('DELETE FROM approvals WHERE execution_id = ?', (execution_id,))
-                conn.execute('DELETE FROM executions WHERE execution_id = ?', (execution_id,))
-
-            print(f"✅ Auto-approved (wait timeout) and self-destructed data for {execution_id} – returned {len(tasks_list)} tasks")
+    except PoolTimeout as e:
+        return pool_timeout_response(e)
+    except Exception as e:
+        log.error('get_approved_failed', '❌ Error getting approved tasks: {error}', error=str(e))
+        return jsonify({'error': str(e)}), 500
 
-            return jsonify({
-                'execution_id': execution_id,
-                'approved_monday_tasks': tasks_list,
-                'approved_count': len(tasks_list),
-                'total_tasks': total_tasks,
-                'timestamp': datetime.now().isoformat(),
-                'source': 'TaskForge_HITL_Railway',
-                'method': 'auto_wait_timeout'
-            })
+@app.route('/events/<execution_id>', methods=['GET'])
+def execution_events(execution_id):
+    """Live status as Server-Sent Events.
 
-        # No execution found at all
-        print(f"❌ No data found for execution: {execution_id}")
-        return jsonify({'error': 'Execution ID not found or already processed'}), 404
-            
+    A sync worker must not be held by an open stream, so this answers with
+    one snapshot marked push=false: the dashboard closes the stream and only
+    reconnects when its tab becomes visible again (older dashboards still
+    reconnect after LIVE_STATUS_RETRY_MS). The ASGI mode (asgi.py) keeps
+    the stream open and pushes changes.
+    """
+    try:
+        state = execution_state(execution_id)
+    except PoolTimeout as e:
+        return pool_timeout_response(e)
     except Exception as e:
-        print(f"❌ Error getting approved tasks: {str(e)}")
+        log.error('execution_events_failed', '❌ Error loading live status: {error}', error=str(e))
         return jsonify({'error': str(e)}), 500
+    if state['status'] == GONE:
+        return jsonify({'error': 'Tasks not found'}), 404
+    return Response(render_snapshot(state, LIVE_STATUS_RETRY_MS, push=False), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
 
-@app.route('/health', methods=['GET'])
-def health_check():
-    """Health check endpoint"""
+@app.route('/debug/traces', methods=['GET'])
+def debug_traces():
+    """Recent slow and profiled request traces (Authorization: Bearer <DEBUG_TOKEN>)"""
+    if not request_profiler.token:
+        abort(404)
+    scheme, _, secret = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not request_profiler.authorized(secret.strip()):
+        return jsonify({'error': 'Unauthorized'}), 401, {'WWW-Authenticate': 'Bearer'}
+    limit = request.args.get('limit', None, type=int)
+    return jsonify({'traces': request_profiler.recent(limit), 'profiler': request_profiler.stats()})
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus scrape endpoint (all worker processes combined)"""
+    return Response(render(metrics_exporter.collect()), mimetype='text/plain; version=0.0.4')
+
+# ------------ Health probes (constant time – no table scans) -------------
+
+# Row counts come from the snapshot the sweeper leader publishes after each
+# pass; probes only borrow a connection and read that one row.
+READY_POOL_TIMEOUT_SEC = float(os.environ.get('READY_POOL_TIMEOUT_SEC', 0.5))
+READY_MAX_SWEEP_LAG_SEC = int(os.environ.get('READY_MAX_SWEEP_LAG_SEC', sweeper.interval * 5))
+READY_MAX_BACKLOG = int(os.environ.get('READY_MAX_BACKLOG', 1000))
+PROCESS_STARTED_AT = datetime.now()
+
+def probe_health():
+    """Pool round trip + sweeper snapshot; returns a report with its problems."""
+    problems = []
+    status = None
     try:
-        # Test database connection
-        with connect_db() as conn:
-            pending_count = conn.execute('SELECT COUNT(*) FROM executions')[0][0]
-            approved_count = conn.execute('SELECT COUNT(*) FROM approvals')[0][0]
-        
-        return jsonify({
-            'status': 'healthy',
-            'database': 'connected',
-            'pending_executions': pending_count,
-            'completed_approvals': approved_count,
-            'timestamp': datetime.now().isoformat()
-        })
+        with connect_db(timeout=READY_POOL_TIMEOUT_SEC) as conn:
+            status = Sweeper.read_status(conn)
+        database = 'connected'
+    except PoolTimeout as e:
+        database = 'pool_exhausted'
+        problems.append(str(e))
     except Exception as e:
+        database = 'unavailable'
+        problems.append(f'database: {e}')
+
+    # Before the first published sweep, count the lag from startup
+    last_sweep = parse_expires_at(status['last_run_at']) if status else PROCESS_STARTED_AT
+    sweeper_lag = max(0.0, -seconds_until(last_sweep))
+    if SWEEPER_ENABLED and database == 'connected':
+        if sweeper_lag > READY_MAX_SWEEP_LAG_SEC:
+            problems.append(f'sweeper last ran {sweeper_lag:.0f}s ago (limit {READY_MAX_SWEEP_LAG_SEC}s)')
+        if status and status['expired_backlog'] > READY_MAX_BACKLOG:
+            problems.append(f"{status['expired_backlog']} expired executions awaiting auto-approval "
+                            f"(limit {READY_MAX_BACKLOG})")
+
+    return {
+        'database': database,
+        'problems': problems,
+        'counts': status,
+        'sweeper_lag_sec': round(sweeper_lag, 1),
+        'approval_waiters': approval_notifier.waiting(),
+    }
+
+@app.route('/health/live', methods=['GET'])
+def liveness_probe():
+    """Liveness: the process is serving requests (no database access)"""
+    return jsonify({'status': 'alive', 'pid': os.getpid(), 'timestamp': datetime.now().isoformat()})
+
+@app.route('/health/ready', methods=['GET'])
+def readiness_probe():
+    """Readiness: a pooled connection is available and the sweeper keeps up"""
+    report = probe_health()
+    ready = not report['problems']
+    return jsonify({
+        'status': 'ready' if ready else 'not_ready',
+        'database': report['database'],
+        'problems': report['problems'],
+        'sweeper_lag_sec': report['sweeper_lag_sec'],
+        'approval_waiters': report['approval_waiters'],
+        'timestamp': datetime.now().isoformat()
+    }), 200 if ready else 503
+
+@app.route('/health', methods=['GET'])
+def health_check():
+    """Health check endpoint (counts as of the last sweep)"""
+    report = probe_health()
+    if report['database'] != 'connected':
         return jsonify({
             'status': 'unhealthy',
-            'error': str(e),
+            'database': report['database'],
+            'error': '; '.join(report['problems']),
             'timestamp': datetime.now().isoformat()
         }), 500
 
+    counts = report['counts'] or {}
+    return jsonify({
+        'status': 'healthy',
+        'database': 'connected',
+        'ready': not report['problems'],
+        'problems': report['problems'],
+        'pending_executions': counts.get('pending_executions'),
+        'expired_backlog': counts.get('expired_backlog'),
+        'completed_approvals': counts.get('completed_approvals'),
+        'counts_as_of': counts.get('last_run_at'),
+        'sweeper_lag_sec': report['sweeper_lag_sec'],
+        'approval_waiters': report['approval_waiters'],
+        'sweeper': sweeper.stats(),
+        'webhooks': webhook_dispatcher.stats(),
+        'live_status': live_status.stats(),
+        'partitions': partitions.stats(),
+        'idempotency': idempotency_cache.stats(),
+        'blob_codec': blob_codec.stats(),
+        'profiler': request_profiler.stats(),
+        'pool': db_pool_stats(),
+        'tasks_cache': tasks_cache.stats(),
+        'static_assets': static_assets.stats(),
+        'json_codec': json_codec.codec_name(),
+        'logging': log.stats(),
+        'timestamp': datetime.now().isoformat()
+    })
+
 @app.route('/<path:filename>')
 def serve_static(filename):
-    return send_from_directory('.', filename)
+    return static_response(filename)
+
+# ============================================================================
+# 📬 CALLBACK WEBHOOKS (push delivery of approvals)
+# ============================================================================
+
+def webhook_payload(execution_id):
+    """JSON body for the callback, or None once the approval is gone."""
+    result = fetch_approval(execution_id)
+    if not result:
+        return None
+    with connect_db() as conn:
+        return json_codec.dumps_bytes(approval_payload(conn, execution_id, result))
+
+def finish_webhook_delivery(execution_id):
+    """The receiver has the approval ➜ self-destruct as /get-approved would."""
+    with connect_db() as conn:
+        rows = conn.execute('SELECT task_layout FROM approvals WHERE execution_id = ? AND delivered_at IS NULL',
+                            (execution_id,))
+        self_destruct(conn, execution_id, rows[0][0] if rows else BLOB)
+
+def observe_webhook(outcome, duration_sec):
+    webhook_attempt_seconds.observe(duration_sec, outcome=outcome)
+
+webhook_dispatcher = WebhookDispatcher(
+    connect_db,
+    webhook_deliveries,
+    load_payload=webhook_payload,
+    on_delivered=finish_webhook_delivery,
+    observe=observe_webhook,
+    workers=int(os.environ.get('WEBHOOK_WORKERS', 4)),
+    timeout=float(os.environ.get('WEBHOOK_TIMEOUT_SEC', 10)),
+    max_attempts=int(os.environ.get('WEBHOOK_MAX_ATTEMPTS', 10)),
+    backoff_base=float(os.environ.get('WEBHOOK_BACKOFF_BASE_SEC', 2)),
+    backoff_max=float(os.environ.get('WEBHOOK_BACKOFF_MAX_SEC', 600)),
+    poll_interval=float(os.environ.get('WEBHOOK_POLL_SEC', 2)),
+    allowed_hosts=CALLBACK_ALLOWED_HOSTS,
+)
 
 # ============================================================================
 # 🚀 APPLICATION STARTUP
 # ============================================================================
 
+start_background_services()
+
 if __name__ == '__main__':
-    # Initialize database on startup
-    init_database()
-    
-    # Initial cleanup & start background thread AFTER tables exist
-    cleanup_expired()
-    cleanup_thread = threading.Thread(target=background_cleanup, daemon=True)
-    cleanup_thread.start()
-    
     port = int(os.environ.get('PORT', 8080))
-    print(f"🚀 TaskForge HITL Server starting on port {port}")
-    print(f"📊 Database: {DATABASE_URL}")
-    print(f"⏰ Auto-approval timeout: 15 minutes")
-    print(f"🧹 Background cleanup: Active")
+    log.info('server_starting', '🚀 TaskForge HITL Server starting on port {port}', port=port)
+    log.info('server_database', '📊 Database: {database}', database=DATABASE_URL)
+    log.info('server_auto_approval', '⏰ Auto-approval timeout: 15 minutes')
     
     debug_mode = os.environ.get('FLASK_DEBUG', 'false').lower() in ('1', 'true', 'yes')
     app.run(host='0.0.0.0', port=port, debug=debug_mode) 
\ No newline at end of file
@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+"""
+Small SQL helpers shared by every module that builds queries.
+
+Queries are written once with ``?`` placeholders (sqlite3's paramstyle);
+DBConn runs them on Postgres through pyformat(). Queries must therefore not
+contain a literal ``?`` or ``%``.
+"""
+
+
+def placeholders(values):
+    """``?, ?, ...`` – one per value, for an IN (...) list or a VALUES row."""
+    return ', '.join('?' for _ in values)
+
+
+def chunks(values, size):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def pyformat(query):
+    """The query with ``?`` placeholders turned into psycopg2's ``%s``."""
+    return query.replace('?', '%s')
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+SQLite engine for single-node installs.
+
+* one persistent connection per thread (re-opened after fork)
+* WAL journaling so the sweeper's writes don't block request readers
+* tuned pragmas (synchronous, busy_timeout, cache_size, mmap_size)
+* sqlite3's per-connection prepared-statement cache, sized explicitly
+"""
+import os
+import sqlite3
+import threading
+
+
+class SqliteEngine:
+    """Hands out the calling thread's persistent connection."""
+
+    def __init__(self, path, synchronous='NORMAL', busy_timeout_ms=5000,
+                 cache_size_kib=20000, mmap_size=256 * 1024 * 1024, cached_statements=256):
+        self.path = path
+        self.synchronous = synchronous
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cache_size_kib = cache_size_kib
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+
+    def connection(self):
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            # Never reuse a connection inherited across fork (gunicorn --preload)
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout_ms / 1000,
+            cached_statements=self.cached_statements,
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA synchronous={self.synchronous}')
+        conn.execute(f'PRAGMA busy_timeout={self.busy_timeout_ms}')
+        # Negative cache_size is in KiB rather than pages
+        conn.execute(f'PRAGMA cache_size=-{self.cache_size_kib}')
+        conn.execute(f'PRAGMA mmap_size={self.mmap_size}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+
+    def close_thread_connection(self):
+        """Close the calling thread's connection (next use reopens it)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            conn.close()
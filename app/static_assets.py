@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+In-memory static assets for the dashboard.
+
+The dashboard files listed in DASHBOARD_FILES are read once at startup,
+together with gzip (and brotli, when the ``brotli`` package is installed)
+variants, so serving them is a dict lookup. Nothing else in the directory
+(sources, requirements.txt, data files) is ever served:
+
+* the variant is chosen from Accept-Encoding (br > gzip > identity)
+* every variant has a strong content-hash ETag, so reloads revalidate to 304
+* URLs pinned to the current content hash (``/app.js?v=<hash>``) are
+  cacheable for a year, everything else must revalidate
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+
+from werkzeug.http import parse_accept_header, parse_etags
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # gzip only
+
+# Served files, relative to the asset root – add new dashboard assets here
+DASHBOARD_FILES = ('index.html',)
+COMPRESSIBLE_EXTENSIONS = {'.html', '.css', '.js', '.mjs', '.map', '.json', '.webmanifest', '.txt', '.svg'}
+MIN_COMPRESS_BYTES = 512
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+
+class Asset:
+    __slots__ = ('path', 'mimetype', 'digest', 'variants', 'mtime')
+
+    def __init__(self, path, mimetype, digest, variants, mtime):
+        self.path = path
+        self.mimetype = mimetype
+        self.digest = digest
+        self.variants = variants  # encoding -> (body, unquoted etag)
+        self.mtime = mtime
+
+
+def build_asset(rel_path, data, mtime=None):
+    extension = os.path.splitext(rel_path)[1].lower()
+    mimetype = mimetypes.guess_type(rel_path)[0] or 'application/octet-stream'
+    if mimetype.startswith('text/') or mimetype in ('application/javascript', 'application/json'):
+        mimetype += '; charset=utf-8'
+    digest = hashlib.blake2b(data, digest_size=8).hexdigest()
+
+    variants = {'identity': (data, digest)}
+    if extension in COMPRESSIBLE_EXTENSIONS and len(data) >= MIN_COMPRESS_BYTES:
+        candidates = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            candidates['br'] = brotli.compress(data, quality=11)
+        for encoding, body in candidates.items():
+            if len(body) < len(data):
+                variants[encoding] = (body, f'{digest}-{encoding}')
+    return Asset(rel_path, mimetype, digest, variants, mtime)
+
+
+class StaticAssets:
+    """URL path (e.g. ``index.html``) -> Asset for each of ``files`` under ``root``."""
+
+    ENCODING_PREFERENCE = ('br', 'gzip')
+
+    def __init__(self, root, files=DASHBOARD_FILES, auto_reload=False):
+        self.root = root
+        self.files = files
+        self.auto_reload = auto_reload
+        self.assets = {}
+
+    def load(self):
+        assets = {}
+        for rel_path in self.files:
+            full_path = os.path.join(self.root, *rel_path.split('/'))
+            with open(full_path, 'rb') as f:
+                assets[rel_path] = build_asset(rel_path, f.read(), os.path.getmtime(full_path))
+        self.assets = assets
+        return self
+
+    def get(self, path):
+        """Asset for a URL path, or None (no filesystem access unless auto_reload)."""
+        asset = self.assets.get(path)
+        if asset is not None and self.auto_reload:
+            # Development only: pick up edits without a restart
+            full_path = os.path.join(self.root, path)
+            try:
+                mtime = os.path.getmtime(full_path)
+            except OSError:
+                return None
+            if mtime != asset.mtime:
+                with open(full_path, 'rb') as f:
+                    asset = self.assets[path] = build_asset(path, f.read(), mtime)
+        return asset
+
+    def respond(self, path, accept_encoding='', if_none_match='', version=None):
+        """Return (status, headers, body) for a GET of path, or None if unknown.
+
+        Header values are passed raw so the Flask route and the ASGI fast
+        path build identical responses.
+        """
+        asset = self.get(path)
+        if asset is None:
+            return None
+
+        accepts = parse_accept_header(accept_encoding)
+        encoding, (body, etag) = 'identity', asset.variants['identity']
+        for candidate in self.ENCODING_PREFERENCE:
+            if candidate in asset.variants and accepts[candidate] > 0:
+                encoding, (body, etag) = candidate, asset.variants[candidate]
+                break
+
+        headers = [
+            ('ETag', f'"{etag}"'),
+            # Long-lived caching only for URLs pinned to the current content hash
+            ('Cache-Control', IMMUTABLE if version == asset.digest else REVALIDATE),
+            ('Vary', 'Accept-Encoding'),
+        ]
+        if parse_etags(if_none_match).contains(etag):
+            return 304, headers, b''
+        headers.append(('Content-Type', asset.mimetype))
+        if encoding != 'identity':
+            headers.append(('Content-Encoding', encoding))
+        return 200, headers, body
+
+    def stats(self):
+        return {
+            'assets': len(self.assets),
+            'bytes': sum(len(body) for asset in self.assets.values() for body, _ in asset.variants.values()),
+            'brotli': brotli is not None,
+        }
@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+Background sweeper: auto-approve expired executions and purge old rows.
+
+Every worker process runs a Sweeper thread, but only the elected leader
+sweeps:
+
+* Postgres – session-level advisory lock held on a dedicated connection
+             (released automatically if the leader dies)
+* SQLite   – lease row in ``scheduler_leases`` renewed on every run
+
+All work is set-based SQL in bounded batches, one short transaction each.
+With time-partitioned storage (partitions.py) old rows are retired a whole
+partition at a time; only the DEFAULT partition is purged row by row.
+After each pass the leader publishes row counts to ``sweeper_status`` so
+/health can report them (and the sweeper's lag) without counting tables.
+"""
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+try:
+    from .event_log import log
+    from . import json_codec
+    from .blob_codec import stored_json
+    from .sql_helpers import placeholders
+except ImportError:  # executed from inside app/
+    from event_log import log
+    import json_codec
+    from blob_codec import stored_json
+    from sql_helpers import placeholders
+
+AUTO_APPROVE_REASON = '15-minute timeout'
+AUTO_APPROVE_PATCH = '{"approved": true, "auto_approved": true, "approval_reason": "15-minute timeout"}'
+
+
+class PgAdvisoryLock:
+    """Leader election via pg_try_advisory_lock on a dedicated connection."""
+
+    def __init__(self, dsn, key):
+        self.dsn = dsn
+        self.key = key
+        self.conn = None
+        self.held = False
+
+    def acquire(self):
+        """Return True while this process holds the lock."""
+        import psycopg2
+
+        try:
+            if self.conn is None or self.conn.closed:
+                self.conn = psycopg2.connect(self.dsn)
+                self.conn.autocommit = True
+                self.held = False
+            with self.conn.cursor() as cur:
+                if self.held:
+                    # Session still alive ➜ lock still ours
+                    cur.execute('SELECT 1')
+                else:
+                    cur.execute('SELECT pg_try_advisory_lock(%s)', (self.key,))
+                    self.held = cur.fetchone()[0]
+        except Exception as e:
+            log.error('sweeper_lock_error', '❌ Sweeper lock error: {error}', error=str(e))
+            self.release()
+            return False
+
+        if not self.held:
+            # Don't keep an idle connection around while someone else leads
+            self.release()
+        return self.held
+
+    def release(self):
+        self.held = False
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = None
+
+
+class SqliteLeaseLock:
+    """Leader election via a lease row that expires unless renewed."""
+
+    def __init__(self, connect_db, name, ttl):
+        self.connect_db = connect_db
+        self.name = name
+        self.ttl = ttl
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+    def acquire(self):
+        now = datetime.now()
+        with self.connect_db() as conn:
+            conn.execute('''
+                INSERT INTO scheduler_leases (name, owner, expires_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT (name) DO UPDATE SET
+                    owner = EXCLUDED.owner,
+                    expires_at = EXCLUDED.expires_at
+                WHERE scheduler_leases.owner = EXCLUDED.owner
+                   OR scheduler_leases.expires_at < ?
+            ''', (self.name, self.owner, now + self.ttl, now))
+            rows = conn.execute('SELECT owner FROM scheduler_leases WHERE name = ?', (self.name,))
+        return bool(rows) and rows[0][0] == self.owner
+
+    def release(self):
+        with self.connect_db() as conn:
+            conn.execute('DELETE FROM scheduler_leases WHERE name = ? AND owner = ?',
+                         (self.name, self.owner))
+
+
+class Sweeper(threading.Thread):
+    """Leader-elected loop running auto_approve_expired() and purge()."""
+
+    LOCK_NAME = 'hitl_sweeper'
+    PG_LOCK_KEY = 0x48495454  # "HITT"
+
+    def __init__(self, connect_db, use_postgres, dsn=None, announce=None, task_rows=None,
+                 task_decisions=None, webhooks=None, partitions=None, blob_codec=None, observe=None, interval=60,
+                 batch_size=500, approval_retention=timedelta(hours=24)):
+        super().__init__(name='hitl-sweeper', daemon=True)
+        self.connect_db = connect_db
+        self.use_postgres = use_postgres
+        self.announce = announce
+        self.task_rows = task_rows
+        self.task_decisions = task_decisions
+        self.webhooks = webhooks
+        self.partitions = partitions
+        self.blob_codec = blob_codec
+        self.observe = observe  # observe(duration_sec, approved, purged_executions, purged_approvals)
+        self.interval = interval
+        self.batch_size = batch_size
+        self.approval_retention = approval_retention
+        self.owner = f'{socket.gethostname()}:{os.getpid()}'
+        if use_postgres:
+            self.lock = PgAdvisoryLock(dsn, self.PG_LOCK_KEY)
+        else:
+            self.lock = SqliteLeaseLock(connect_db, self.LOCK_NAME, timedelta(seconds=interval * 3))
+        self._stop_event = threading.Event()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'leader': False,
+            'runs': 0,
+            'last_run_at': None,
+            'last_duration_ms': None,
+            'last_auto_approved': 0,
+            'last_purged_executions': 0,
+            'last_purged_approvals': 0,
+            'backlog': None,
+        }
+
+    # ------------------------------------------------------------------
+    # Thread loop
+    # ------------------------------------------------------------------
+
+    def run(self):
+        while True:
+            try:
+                is_leader = self.lock.acquire()
+                with self._stats_lock:
+                    self._stats['leader'] = is_leader
+                if is_leader:
+                    self.sweep()
+            except Exception as e:
+                log.error('sweep_failed', '❌ Background sweep error: {error}', error=str(e))
+            if self._stop_event.wait(self.interval):
+                break
+        self.lock.release()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def sweep(self):
+        """One full pass: auto-approve, purge, measure the remaining backlog."""
+        started = time.perf_counter()
+        now = datetime.now()
+        approved = self.auto_approve_expired(now)
+        purged_executions, purged_approvals = self.purge(now)
+        duration_ms = (time.perf_counter() - started) * 1000
+        backlog = self.publish_status(now, duration_ms)
+
+        with self._stats_lock:
+            self._stats.update({
+                'runs': self._stats['runs'] + 1,
+                'last_run_at': now.isoformat(),
+                'last_duration_ms': round(duration_ms, 1),
+                'last_auto_approved': approved,
+                'last_purged_executions': purged_executions,
+                'last_purged_approvals': purged_approvals,
+                'backlog': backlog,
+            })
+        if self.observe:
+            self.observe(duration_ms / 1000, approved, purged_executions, purged_approvals)
+
+        if approved or purged_executions or purged_approvals or backlog:
+            log.info('sweep_completed',
+                     '🧹 Sweep: auto-approved {approved}, purged {purged_executions} executions / '
+                     '{purged_approvals} approvals in {duration_ms:.0f} ms (backlog {backlog})',
+                     approved=approved, purged_executions=purged_executions,
+                     purged_approvals=purged_approvals, duration_ms=round(duration_ms, 1), backlog=backlog)
+        return approved
+
+    # ------------------------------------------------------------------
+    # Set-based work
+    # ------------------------------------------------------------------
+
+    def approved_tasks_sql(self):
+        """SQL expression: executions.monday_tasks after auto-approval.
+
+        Undecided tasks are auto-approved, tasks with a saved decision
+        (task_decisions) keep it – rejected ones are left out. Executions in
+        the rows layout keep their tasks in execution_tasks and store an
+        empty approved_tasks; packed lists are filled in by
+        _auto_approve_packed().
+        """
+        if self.use_postgres:
+            blob = '''COALESCE((
+                SELECT json_agg(CASE WHEN d.approved IS NULL THEN t.task || CAST(? AS jsonb)
+                                     ELSE t.task || jsonb_build_object('approved', TRUE) END
+                                ORDER BY t.ord)
+                FROM jsonb_array_elements(CAST(e.monday_tasks AS jsonb)) WITH ORDINALITY AS t(task, ord)
+                LEFT JOIN task_decisions d
+                       ON d.execution_id = e.execution_id AND d.task_index = t.ord - 1
+                WHERE d.approved IS NULL OR d.approved
+            ), '[]')::text'''
+        else:
+            blob = '''(
+                SELECT json_group_array(CASE WHEN d.approved IS NULL THEN json_patch(t.value, ?)
+                                             ELSE json_set(t.value, '$.approved', json('true')) END)
+                FROM json_each(e.monday_tasks) AS t
+                LEFT JOIN task_decisions d
+                       ON d.execution_id = e.execution_id AND d.task_index = t.key
+                WHERE d.approved IS NULL OR d.approved
+            )'''
+        return f"CASE WHEN e.task_layout = 'rows' OR e.monday_tasks_packed IS NOT NULL THEN '' ELSE {blob} END"
+
+    @staticmethod
+    def approved_count_sql():
+        """SQL expression: tasks approved once auto-approval has run."""
+        return '''CASE WHEN e.task_layout = 'rows'
+            THEN (SELECT COUNT(*) FROM execution_tasks t WHERE t.execution_id = e.execution_id AND t.approved)
+            ELSE e.total_tasks - (SELECT COUNT(*) FROM task_decisions d
+                                  WHERE d.execution_id = e.execution_id AND NOT d.approved) END'''
+
+    def approval_key(self):
+        return self.partitions.approval_key if self.partitions else 'execution_id'
+
+    def auto_approve_expired(self, now=None):
+        """Auto-approve pending executions past expires_at, batch by batch."""
+        now = now or datetime.now()
+        total = 0
+        while True:
+            with self.connect_db() as conn:
+                rows = conn.execute('''
+                    SELECT execution_id FROM executions
+                    WHERE status = 'pending' AND expires_at < ?
+                    ORDER BY expires_at
+                    LIMIT ?
+                ''', (now, self.batch_size))
+                execution_ids = [row[0] for row in rows]
+                if not execution_ids:
+                    break
+                marks = placeholders(execution_ids)
+
+                # Rows-layout tasks first, so the approvals count sees them
+                if self.task_rows:
+                    self.task_rows.auto_approve(conn, execution_ids, AUTO_APPROVE_REASON)
+                conn.execute(f'''
+                    INSERT INTO approvals (execution_id, approved_tasks, approved_count, total_tasks,
+                                           method, task_layout, execution_created_at)
+                    SELECT e.execution_id, {self.approved_tasks_sql()}, {self.approved_count_sql()}, e.total_tasks,
+                           'auto_timeout', e.task_layout, e.created_at
+                    FROM executions e
+                    WHERE e.execution_id IN ({marks}) AND e.status = 'pending'
+                    ON CONFLICT ({self.approval_key()}) DO UPDATE SET
+                        approved_tasks = EXCLUDED.approved_tasks,
+                        approved_count = EXCLUDED.approved_count,
+                        total_tasks = EXCLUDED.total_tasks,
+                        method = EXCLUDED.method,
+                        task_layout = EXCLUDED.task_layout,
+                        content_hash = NULL,
+                        blob_codec = NULL,
+                        approved_tasks_packed = NULL
+                ''', (AUTO_APPROVE_PATCH, *execution_ids))
+                self._auto_approve_packed(conn, execution_ids)
+                conn.execute(f'''
+                    UPDATE executions SET status = 'auto_approved'
+                    WHERE execution_id IN ({marks}) AND status = 'pending'
+                ''', tuple(execution_ids))
+                if self.announce:
+                    self.announce(conn, *execution_ids)
+
+            total += len(execution_ids)
+            if len(execution_ids) < self.batch_size:
+                break
+        return total
+
+    def _auto_approve_packed(self, conn, execution_ids):
+        """approved_tasks for compressed task lists, which SQL can't look into (blob_codec.py)."""
+        rows = conn.execute(f'''
+            SELECT execution_id, blob_codec, monday_tasks_packed FROM executions
+            WHERE execution_id IN ({placeholders(execution_ids)}) AND status = 'pending'
+              AND task_layout <> 'rows' AND monday_tasks_packed IS NOT NULL
+        ''', tuple(execution_ids))
+        patch = json_codec.loads(AUTO_APPROVE_PATCH)
+        for execution_id, codec, packed in rows:
+            decisions = self.task_decisions.load(conn, execution_id) if self.task_decisions else {}
+            approved = []
+            for index, task in enumerate(json_codec.loads(stored_json('', codec, packed).text)):
+                decision = decisions.get(index)
+                if decision is None:
+                    approved.append({**task, **patch})
+                elif decision:
+                    approved.append(dict(task, approved=True))
+            approved_json, approved_packed = json_codec.dumps(approved), None
+            if self.blob_codec:
+                approved_json, approved_packed = self.blob_codec.pack(approved_json)
+            conn.execute('''
+                UPDATE approvals SET approved_tasks = ?, blob_codec = ?, approved_tasks_packed = ?
+                WHERE execution_id = ? AND delivered_at IS NULL
+            ''', (approved_json, self.blob_codec.row_codec if self.blob_codec else None, approved_packed,
+                  execution_id))
+
+    def purge(self, now=None):
+        """Delete finished expired executions and approvals past retention.
+
+        Rows with a webhook delivery still pending are kept until it ends.
+        Partitioned tables retire whole partitions and purge only their
+        DEFAULT partition here.
+        """
+        now = now or datetime.now()
+        retired = (0, 0)
+        executions, approvals = 'executions', 'approvals'
+        execution_key = approval_key = 'execution_id'
+        if self.partitions and self.partitions.active:
+            stores = [store for store in (self.task_rows, self.task_decisions, self.webhooks) if store]
+            retired = self.partitions.maintain(self.connect_db, stores, self.batch_size, now)
+            executions, approvals = 'executions_default', 'approvals_default'
+            execution_key, approval_key = self.partitions.execution_key, self.partitions.approval_key
+        purged_executions = self._delete_in_batches(executions, 'executions', execution_key, '''
+            expires_at < ? AND status <> 'pending'
+        ''', (now,))
+        purged_approvals = self._delete_in_batches(approvals, 'approvals', approval_key, '''
+            submitted_at < ?
+        ''', (now - self.approval_retention,))
+        return purged_executions + retired[0], purged_approvals + retired[1]
+
+    def _delete_in_batches(self, table, parent, key, where, params):
+        """Delete rows of ``table`` matching ``where`` by their primary key ``key``.
+
+        Partitioned, execution_id alone may match other generations of the
+        same execution, so rows are deleted by the full key, and per-task
+        rows only go once ``parent`` has no row left for the execution.
+        """
+        total = 0
+        width = key.count(',') + 1
+        while True:
+            with self.connect_db() as conn:
+                keys = [tuple(row) for row in conn.execute(f'''
+                    SELECT {key} FROM {table}
+                    WHERE {where}
+                      AND NOT EXISTS (SELECT 1 FROM webhook_deliveries w
+                                      WHERE w.execution_id = {table}.execution_id AND w.status = 'pending')
+                    LIMIT ?
+                ''', (*params, self.batch_size))]
+                if keys:
+                    row_values = ', '.join(f'({placeholders(range(width))})' for _ in keys)
+                    conn.execute(f'''
+                        DELETE FROM {table} WHERE ({key}) IN ({row_values})
+                    ''', tuple(value for row in keys for value in row))
+                    execution_ids = sorted({row[0] for row in keys})
+                    remaining = {row[0] for row in conn.execute(f'''
+                        SELECT DISTINCT execution_id FROM {parent} WHERE execution_id IN ({placeholders(execution_ids)})
+                    ''', tuple(execution_ids))}
+                    gone = [execution_id for execution_id in execution_ids if execution_id not in remaining]
+                    if gone:
+                        for store in (self.task_rows, self.task_decisions, self.webhooks):
+                            if store:
+                                store.delete_orphans(conn, gone)
+            total += len(keys)
+            if len(keys) < self.batch_size:
+                return total
+
+    # ------------------------------------------------------------------
+    # Status snapshot (read by /health)
+    # ------------------------------------------------------------------
+
+    def publish_status(self, now=None, duration_ms=None):
+        """Count pending / expired / approved rows into sweeper_status.
+
+        Returns the expired backlog (expired executions still pending).
+        """
+        now = now or datetime.now()
+        with self.connect_db() as conn:
+            pending, backlog, approvals = conn.execute('''
+                SELECT (SELECT COUNT(*) FROM executions WHERE status = 'pending'),
+                       (SELECT COUNT(*) FROM executions WHERE status = 'pending' AND expires_at < ?),
+                       (SELECT COUNT(*) FROM approvals WHERE delivered_at IS NULL)
+            ''', (now,))[0]
+            conn.execute('''
+                INSERT INTO sweeper_status (name, owner, last_run_at, duration_ms, pending_executions,
+                                            expired_backlog, completed_approvals)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (name) DO UPDATE SET
+                    owner = EXCLUDED.owner,
+                    last_run_at = EXCLUDED.last_run_at,
+                    duration_ms = EXCLUDED.duration_ms,
+                    pending_executions = EXCLUDED.pending_executions,
+                    expired_backlog = EXCLUDED.expired_backlog,
+                    completed_approvals = EXCLUDED.completed_approvals
+            ''', (self.LOCK_NAME, self.owner, now,
+                  None if duration_ms is None else round(duration_ms, 1), pending, backlog, approvals))
+        return backlog
+
+    @classmethod
+    def read_status(cls, conn):
+        """Latest published snapshot as a dict (None before the first sweep)."""
+        rows = conn.execute('''
+            SELECT owner, last_run_at, duration_ms, pending_executions, expired_backlog, completed_approvals
+            FROM sweeper_status WHERE name = ?
+        ''', (cls.LOCK_NAME,))
+        if not rows:
+            return None
+        keys = ('owner', 'last_run_at', 'duration_ms', 'pending_executions', 'expired_backlog',
+                'completed_approvals')
+        return dict(zip(keys, rows[0]))
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Per-task storage layout (TASK_STORAGE=rows).
+
+* blob – executions.monday_tasks / approvals.approved_tasks hold the whole
+         JSON list (original layout, default)
+* rows – one execution_tasks row per task keyed by (execution_id, task_index)
+         with the approval decision in columns, so approving, counting and
+         auto-approving are SQL updates instead of rewriting the blob
+
+The layout is recorded per execution/approval (task_layout column), so
+switching TASK_STORAGE never strands rows written under the other layout.
+Lists are assembled in SQL (json_group_array / json_agg) and parsed once.
+
+Decisions autosaved before the final commit (/save-decisions) live in the
+approved column for the rows layout and in task_decisions for the blob
+layout. Either way they win over auto-approval when the window expires.
+"""
+from itertools import islice
+
+try:
+    from . import json_codec
+    from .sql_helpers import chunks, placeholders
+except ImportError:  # executed from inside app/
+    import json_codec
+    from sql_helpers import chunks, placeholders
+
+BLOB = 'blob'
+ROWS = 'rows'
+
+INSERT_CHUNK = 200   # tasks per multi-row INSERT
+UPDATE_CHUNK = 500   # task indexes per IN (...) list
+MAX_INDEX = 2 ** 31 - 1
+
+
+class TaskRows:
+    """SQL for the ``rows`` layout (plus range reads of blob lists), on either backend."""
+
+    def __init__(self, use_postgres):
+        self.use_postgres = use_postgres
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def store(self, conn, execution_id, tasks, raw=False):
+        """Replace the task rows of execution_id.
+
+        ``tasks`` may be any iterable (consumed a chunk at a time); raw=True
+        means its items are already serialized JSON.
+        """
+        conn.execute('DELETE FROM execution_tasks WHERE execution_id = ?', (execution_id,))
+        indexed = enumerate(tasks)
+        while chunk := list(islice(indexed, INSERT_CHUNK)):
+            values = ', '.join('(?, ?, ?)' for _ in chunk)
+            params = []
+            for task_index, task in chunk:
+                params.extend((execution_id, task_index, task if raw else json_codec.dumps(task)))
+            conn.execute(f'''
+                INSERT INTO execution_tasks (execution_id, task_index, task) VALUES {values}
+            ''', tuple(params))
+
+    def decide(self, conn, execution_id, approved_indexes):
+        """Record a manual decision: approved_indexes approved, all others rejected."""
+        conn.execute('''
+            UPDATE execution_tasks
+            SET approved = FALSE, auto_approved = FALSE, approval_reason = NULL
+            WHERE execution_id = ?
+        ''', (execution_id,))
+        for chunk in chunks(sorted(set(approved_indexes)), UPDATE_CHUNK):
+            conn.execute(f'''
+                UPDATE execution_tasks SET approved = TRUE
+                WHERE execution_id = ? AND task_index IN ({placeholders(chunk)})
+            ''', (execution_id, *chunk))
+
+    def record(self, conn, execution_id, decisions):
+        """Apply autosaved decisions ({task_index: approved}); other tasks keep theirs."""
+        for approved in (True, False):
+            indexes = sorted(index for index, value in decisions.items() if value is approved)
+            for chunk in chunks(indexes, UPDATE_CHUNK):
+                conn.execute(f'''
+                    UPDATE execution_tasks
+                    SET approved = ?, auto_approved = FALSE, approval_reason = NULL
+                    WHERE execution_id = ? AND task_index IN ({placeholders(chunk)})
+                ''', (approved, execution_id, *chunk))
+
+    def auto_approve(self, conn, execution_ids, reason):
+        """Approve every undecided task; saved decisions and earlier auto-approvals stand."""
+        for chunk in chunks(list(execution_ids), UPDATE_CHUNK):
+            conn.execute(f'''
+                UPDATE execution_tasks
+                SET approved = TRUE, auto_approved = TRUE, approval_reason = ?
+                WHERE execution_id IN ({placeholders(chunk)}) AND approved IS NULL
+            ''', (reason, *chunk))
+
+    def delete(self, conn, execution_ids):
+        for chunk in chunks(list(execution_ids), UPDATE_CHUNK):
+            conn.execute(f'''
+                DELETE FROM execution_tasks WHERE execution_id IN ({placeholders(chunk)})
+            ''', tuple(chunk))
+
+    def delete_orphans(self, conn, execution_ids):
+        """Drop task rows no longer referenced by an execution or an approval."""
+        for chunk in chunks(list(execution_ids), UPDATE_CHUNK):
+            conn.execute(f'''
+                DELETE FROM execution_tasks
+                WHERE execution_id IN ({placeholders(chunk)})
+                  AND NOT EXISTS (SELECT 1 FROM executions e WHERE e.execution_id = execution_tasks.execution_id)
+                  AND NOT EXISTS (SELECT 1 FROM approvals a WHERE a.execution_id = execution_tasks.execution_id)
+            ''', tuple(chunk))
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def load(self, conn, execution_id, raw=False, start=0, stop=None):
+        """Tasks [start, stop) in order, tagged with task_index and any saved decision.
+
+        raw=True returns the SQL-built JSON unparsed (json_codec.RawJSON).
+        A range is a primary-key range scan, so a page costs the same at any depth.
+        """
+        if self.use_postgres:
+            sql = '''
+                SELECT COALESCE(json_agg(
+                    CAST(task AS jsonb)
+                    || jsonb_strip_nulls(jsonb_build_object('task_index', task_index, 'approved', approved))
+                    ORDER BY task_index), '[]')::text
+                FROM execution_tasks WHERE execution_id = ? AND task_index >= ? AND task_index < ?
+            '''
+        else:
+            sql = '''
+                SELECT json_group_array(CASE WHEN approved IS NULL
+                    THEN json_set(task, '$.task_index', task_index)
+                    ELSE json_set(task, '$.task_index', task_index,
+                                  '$.approved', json(CASE WHEN approved THEN 'true' ELSE 'false' END)) END)
+                FROM (SELECT task, task_index, approved FROM execution_tasks
+                      WHERE execution_id = ? AND task_index >= ? AND task_index < ? ORDER BY task_index)
+            '''
+        return self._fetch_json(conn, sql, (execution_id, start, MAX_INDEX if stop is None else stop), raw)
+
+    def load_approved(self, conn, execution_id, raw=False):
+        """Approved tasks in order, flagged like the blob layout flags them."""
+        if self.use_postgres:
+            sql = '''
+                SELECT COALESCE(json_agg(
+                    CAST(task AS jsonb) || CASE WHEN auto_approved
+                        THEN jsonb_build_object('approved', TRUE, 'auto_approved', TRUE,
+                                                'approval_reason', approval_reason)
+                        ELSE jsonb_build_object('approved', TRUE) END
+                    ORDER BY task_index), '[]')::text
+                FROM execution_tasks WHERE execution_id = ? AND approved
+            '''
+        else:
+            sql = '''
+                SELECT json_group_array(CASE WHEN auto_approved
+                    THEN json_set(task, '$.approved', json('true'), '$.auto_approved', json('true'),
+                                  '$.approval_reason', approval_reason)
+                    ELSE json_set(task, '$.approved', json('true')) END)
+                FROM (SELECT task, auto_approved, approval_reason FROM execution_tasks
+                      WHERE execution_id = ? AND approved ORDER BY task_index)
+            '''
+        return self._fetch_json(conn, sql, (execution_id,), raw)
+
+    def decisions(self, conn, execution_id):
+        """Return {task_index: approved} for the tasks decided so far."""
+        rows = conn.execute('''
+            SELECT task_index, approved FROM execution_tasks
+            WHERE execution_id = ? AND approved IS NOT NULL
+        ''', (execution_id,))
+        return {task_index: bool(approved) for task_index, approved in rows}
+
+    def decision_counts(self, conn, execution_ids):
+        """{execution_id: (decided, approved)} for executions with any decision."""
+        return _decision_counts(conn, 'execution_tasks', execution_ids, 'AND approved IS NOT NULL')
+
+    def load_blob_range(self, conn, execution_id, start, stop, raw=False):
+        """Tasks [start, stop) of a blob-layout execution, tagged with task_index.
+
+        The list is unpacked by the database (json_each / jsonb_array_elements),
+        so no Python objects are built for tasks outside the range.
+        """
+        if self.use_postgres:
+            sql = '''
+                SELECT COALESCE(json_agg(task || jsonb_build_object('task_index', ord - 1)
+                                         ORDER BY ord), '[]')::text
+                FROM executions,
+                     jsonb_array_elements(CAST(monday_tasks AS jsonb)) WITH ORDINALITY AS t(task, ord)
+                WHERE execution_id = ? AND status <> 'delivered' AND ord > ? AND ord <= ?
+            '''
+        else:
+            sql = '''
+                SELECT json_group_array(json_set(value, '$.task_index', key))
+                FROM (SELECT key, value FROM executions, json_each(executions.monday_tasks)
+                      WHERE execution_id = ? AND status <> 'delivered' AND key >= ? AND key < ? ORDER BY key)
+            '''
+        return self._fetch_json(conn, sql, (execution_id, start, stop), raw)
+
+    @staticmethod
+    def _fetch_json(conn, sql, params, raw):
+        text = conn.execute(sql, params)[0][0]
+        return json_codec.RawJSON(text) if raw else json_codec.loads(text)
+
+
+class TaskDecisions:
+    """Autosaved decisions for executions in the ``blob`` layout (task_decisions)."""
+
+    def save(self, conn, execution_id, decisions):
+        """Upsert {task_index: approved}; other tasks keep their decision."""
+        for chunk in chunks(sorted(decisions.items()), INSERT_CHUNK):
+            values = ', '.join('(?, ?, ?)' for _ in chunk)
+            params = []
+            for task_index, approved in chunk:
+                params.extend((execution_id, task_index, approved))
+            conn.execute(f'''
+                INSERT INTO task_decisions (execution_id, task_index, approved) VALUES {values}
+                ON CONFLICT (execution_id, task_index) DO UPDATE SET
+                    approved = EXCLUDED.approved,
+                    decided_at = CURRENT_TIMESTAMP
+            ''', tuple(params))
+
+    def load(self, conn, execution_id):
+        """Return {task_index: approved}."""
+        rows = conn.execute('''
+            SELECT task_index, approved FROM task_decisions WHERE execution_id = ?
+        ''', (execution_id,))
+        return {task_index: bool(approved) for task_index, approved in rows}
+
+    def decision_counts(self, conn, execution_ids):
+        """{execution_id: (decided, approved)} for executions with any decision."""
+        return _decision_counts(conn, 'task_decisions', execution_ids)
+
+    def delete(self, conn, execution_ids):
+        for chunk in chunks(list(execution_ids), UPDATE_CHUNK):
+            conn.execute(f'''
+                DELETE FROM task_decisions WHERE execution_id IN ({placeholders(chunk)})
+            ''', tuple(chunk))
+
+    def delete_orphans(self, conn, execution_ids):
+        """Drop decisions whose execution is gone."""
+        for chunk in chunks(list(execution_ids), UPDATE_CHUNK):
+            conn.execute(f'''
+                DELETE FROM task_decisions
+                WHERE execution_id IN ({placeholders(chunk)})
+                  AND NOT EXISTS (SELECT 1 FROM executions e WHERE e.execution_id = task_decisions.execution_id)
+            ''', tuple(chunk))
+
+
+def _decision_counts(conn, table, execution_ids, condition=''):
+    counts = {}
+    for chunk in chunks(list(execution_ids), UPDATE_CHUNK):
+        rows = conn.execute(f'''
+            SELECT execution_id, COUNT(*), SUM(CASE WHEN approved THEN 1 ELSE 0 END)
+            FROM {table}
+            WHERE execution_id IN ({placeholders(chunk)}) {condition}
+            GROUP BY execution_id
+        ''', tuple(chunk))
+        counts.update((execution_id, (decided, approved or 0)) for execution_id, decided, approved in rows)
+    return counts
+
+
+def apply_decisions(tasks, decisions):
+    """Tag blob-layout tasks with their saved decision (in place)."""
+    for task_index, approved in decisions.items():
+        if 0 <= task_index < len(tasks):
+            tasks[task_index]['approved'] = approved
+    return tasks
+
+
+def approved_indexes(tasks_with_approval):
+    """Indexes of approved tasks in a submitted list.
+
+    Tasks served in the rows layout carry their task_index; older clients
+    that strip it are matched by position.
+    """
+    if all(isinstance(task.get('task_index'), int) for task in tasks_with_approval):
+        return [task['task_index'] for task in tasks_with_approval if task.get('approved') == True]
+    return [index for index, task in enumerate(tasks_with_approval) if task.get('approved') == True]
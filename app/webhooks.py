@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Push delivery of approvals to a callback URL given at /store-tasks.
+
+When an execution with a callback_url is approved (manually, by autosave
+commit, or by the sweeper's auto-approval) a webhook_deliveries row is
+written in the same transaction, so pending deliveries survive restarts.
+Every worker runs a WebhookDispatcher that claims due rows (a lease, so a
+crashed worker's claims expire) and POSTs the /get-approved payload from a
+bounded thread pool:
+
+* 2xx            – delivered; the execution self-destructs like after a
+                   /get-approved read
+* 5xx, 408, 429,
+  network errors – retried with exponential backoff (with jitter) until
+                   max_attempts
+* other 4xx      – not retried
+
+Callback hosts must resolve to public addresses only (no loopback,
+private, link-local, multicast or unspecified ones), checked when the URL
+is stored and again before every attempt. Each attempt then connects to
+the address it checked (Host header and TLS server name stay the
+callback's host), so a DNS answer that changes in between – rebinding –
+can't point deliveries at internal services. Redirects are not followed.
+Hosts listed in CALLBACK_ALLOWED_HOSTS (e.g. an N8N on the private
+network) skip the check and are connected to by name.
+
+A delivery that fails for good leaves the approval in place, so
+/get-approved still works as a fallback. Delivery is at-least-once
+(a slow receiver can see a retry); receivers should dedupe on
+X-HITL-Execution-Id.
+"""
+import ipaddress
+import random
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import unquote, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from .event_log import log
+    from .sql_helpers import placeholders
+except ImportError:  # executed from inside app/
+    from event_log import log
+    from sql_helpers import placeholders
+
+CLAIM_BATCH = 100
+MAX_PINNED_ADAPTERS = 64  # per delivery thread (one per https callback host)
+
+
+class CallbackBlocked(ValueError):
+    """The callback host resolves to an address deliveries must not reach."""
+
+
+def check_callback_host(url, allowed_hosts=()):
+    """Raise CallbackBlocked unless every address of url's host is public.
+
+    Returns the first checked address to connect to (None for an allowed
+    host). socket.gaierror (host doesn't resolve) is left to the caller.
+    """
+    parts = urlsplit(url)
+    host = (parts.hostname or '').lower()
+    if host in allowed_hosts:
+        return None
+    try:
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+    except ValueError:
+        raise CallbackBlocked('callback_url has an invalid port')
+    addresses = [ipaddress.ip_address(sockaddr[0].split('%', 1)[0])
+                 for *_, sockaddr in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)]
+    for address in addresses:
+        if not address.is_global or address.is_multicast:
+            raise CallbackBlocked(f'callback_url host {host} resolves to a non-public address ({address})')
+    return addresses[0]
+
+
+def pinned_request(url, address, body, headers):
+    """PreparedRequest POSTing to ``address`` with url's Host header, path and credentials."""
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    literal = f'[{address}]' if address.version == 6 else str(address)
+    target = urlunsplit((parts.scheme, f'{literal}:{port}', parts.path or '/', parts.query, ''))
+    auth = (unquote(parts.username), unquote(parts.password or '')) if parts.username else None
+    headers = dict(headers, Host=parts.netloc.rpartition('@')[2])
+    return requests.Request('POST', target, data=body, headers=headers, auth=auth).prepare()
+
+
+class PinnedHostAdapter(HTTPAdapter):
+    """HTTPS to a pinned IP address, with SNI and certificate checks for ``hostname``."""
+
+    def __init__(self, hostname, **kwargs):
+        self.hostname = hostname
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        pool_kwargs.update(server_hostname=self.hostname, assert_hostname=self.hostname)
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+
+
+def validate_callback_url(url, allowed_hosts=(), host_checks=None):
+    """Return url if it is an absolute http(s) URL to a public host, else raise ValueError.
+
+    ``host_checks`` (a dict) caches each host's verdict, so a request with
+    many callback URLs resolves every host once.
+    """
+    if not isinstance(url, str) or len(url) > 2048:
+        raise ValueError('callback_url must be a string of at most 2048 characters')
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ValueError('callback_url must be an absolute http(s) URL')
+    try:
+        key = (parts.scheme, parts.hostname.lower(), parts.port)
+    except ValueError:
+        raise ValueError('callback_url has an invalid port')
+    if host_checks is not None and key in host_checks:
+        error = host_checks[key]
+    else:
+        error = None
+        try:
+            check_callback_host(url, allowed_hosts)
+        except socket.gaierror:
+            error = f'callback_url host {parts.hostname} does not resolve'
+        except CallbackBlocked as e:
+            error = str(e)
+        if host_checks is not None:
+            host_checks[key] = error
+    if error:
+        raise ValueError(error)
+    return url
+
+
+def backoff_delay(attempts, base, cap):
+    """Seconds before retry number ``attempts`` (1-based): capped, half jittered."""
+    delay = min(cap, base * 2 ** (attempts - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class WebhookDeliveries:
+    """SQL for the webhook_deliveries table."""
+
+    def enqueue(self, conn, execution_ids, now=None):
+        """Queue a delivery for every execution in execution_ids that has a callback_url."""
+        execution_ids = list(execution_ids)
+        if not execution_ids:
+            return
+        conn.execute(f'''
+            INSERT INTO webhook_deliveries (execution_id, callback_url, status, attempts, next_attempt_at)
+            SELECT execution_id, callback_url, 'pending', 0, ?
+            FROM executions
+            WHERE execution_id IN ({placeholders(execution_ids)}) AND status <> 'delivered'
+              AND callback_url IS NOT NULL AND callback_url <> ''
+            ON CONFLICT (execution_id) DO UPDATE SET
+                callback_url = EXCLUDED.callback_url,
+                status = 'pending',
+                attempts = 0,
+                next_attempt_at = EXCLUDED.next_attempt_at,
+                last_error = NULL,
+                claim_token = NULL,
+                claimed_until = NULL
+        ''', (now or datetime.now(), *execution_ids))
+
+    def claim(self, conn, limit, lease, now=None):
+        """Lease up to ``limit`` due deliveries; returns [(execution_id, callback_url, attempts, token)]."""
+        now = now or datetime.now()
+        token = uuid.uuid4().hex
+        # The outer conditions are re-checked on the locked row, so two
+        # workers racing for the same rows can't both win
+        conn.execute('''
+            UPDATE webhook_deliveries SET claim_token = ?, claimed_until = ?
+            WHERE execution_id IN (
+                SELECT execution_id FROM webhook_deliveries
+                WHERE status = 'pending' AND next_attempt_at <= ?
+                  AND (claimed_until IS NULL OR claimed_until < ?)
+                ORDER BY next_attempt_at
+                LIMIT ?
+            )
+              AND status = 'pending' AND (claimed_until IS NULL OR claimed_until < ?)
+        ''', (token, now + lease, now, now, limit, now))
+        rows = conn.execute('''
+            SELECT execution_id, callback_url, attempts FROM webhook_deliveries WHERE claim_token = ?
+        ''', (token,))
+        return [(execution_id, url, attempts, token) for execution_id, url, attempts in rows]
+
+    def reschedule(self, conn, execution_id, token, attempts, next_attempt_at, error):
+        conn.execute('''
+            UPDATE webhook_deliveries
+            SET attempts = ?, next_attempt_at = ?, last_error = ?, claim_token = NULL, claimed_until = NULL
+            WHERE execution_id = ? AND claim_token = ?
+        ''', (attempts, next_attempt_at, error, execution_id, token))
+
+    def fail(self, conn, execution_id, token, attempts, error):
+        conn.execute('''
+            UPDATE webhook_deliveries
+            SET status = 'failed', attempts = ?, last_error = ?, claim_token = NULL, claimed_until = NULL
+            WHERE execution_id = ? AND claim_token = ?
+        ''', (attempts, error, execution_id, token))
+
+    def delete(self, conn, execution_ids):
+        execution_ids = list(execution_ids)
+        if execution_ids:
+            conn.execute(f'''
+                DELETE FROM webhook_deliveries WHERE execution_id IN ({placeholders(execution_ids)})
+            ''', tuple(execution_ids))
+
+    def delete_orphans(self, conn, execution_ids):
+        """Drop finished deliveries whose approval is gone."""
+        execution_ids = list(execution_ids)
+        if execution_ids:
+            conn.execute(f'''
+                DELETE FROM webhook_deliveries
+                WHERE execution_id IN ({placeholders(execution_ids)}) AND status <> 'pending'
+                  AND NOT EXISTS (SELECT 1 FROM approvals a WHERE a.execution_id = webhook_deliveries.execution_id)
+            ''', tuple(execution_ids))
+
+
+class WebhookDispatcher(threading.Thread):
+    """Claim due deliveries and POST them from a bounded pool."""
+
+    def __init__(self, connect_db, store, load_payload, on_delivered, observe=None, workers=4,
+                 timeout=10.0, max_attempts=10, backoff_base=2.0, backoff_max=600.0, poll_interval=2.0,
+                 allowed_hosts=()):
+        super().__init__(name='hitl-webhooks', daemon=True)
+        self.connect_db = connect_db
+        self.store = store
+        self.load_payload = load_payload    # execution_id -> JSON bytes, or None if the approval is gone
+        self.on_delivered = on_delivered    # execution_id -> None (self-destruct)
+        self.observe = observe              # observe(outcome, duration_sec)
+        self.workers = workers
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.poll_interval = poll_interval
+        self.allowed_hosts = allowed_hosts  # skip the public-address check (see check_callback_host)
+        # A claim outlives one attempt comfortably; after that another worker may retry it
+        self.lease = timedelta(seconds=timeout * 2 + 30)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hitl-webhook')
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._stats = {'delivered': 0, 'retried': 0, 'failed': 0, 'dropped': 0}
+
+    # ------------------------------------------------------------------
+    # Thread loop
+    # ------------------------------------------------------------------
+
+    def run(self):
+        while not self._stop_event.is_set():
+            claimed = free = 0
+            try:
+                with self._lock:
+                    free = min(self.workers - self._in_flight, CLAIM_BATCH)
+                if free > 0:
+                    with self.connect_db() as conn:
+                        deliveries = self.store.claim(conn, free, self.lease)
+                    claimed = len(deliveries)
+                    for delivery in deliveries:
+                        with self._lock:
+                            self._in_flight += 1
+                        self._pool.submit(self._attempt, *delivery)
+            except Exception as e:
+                log.error('webhook_claim_failed', '❌ Webhook dispatcher error: {error}', error=str(e))
+            if claimed and claimed == free:
+                continue  # more may be due; claim again once a slot frees up
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def wake(self):
+        """Check for due deliveries now (e.g. right after an approval commits)."""
+        self._wake.set()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake.set()
+
+    # ------------------------------------------------------------------
+    # One attempt (pool thread)
+    # ------------------------------------------------------------------
+
+    def _session(self):
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+            self._local.adapters = {}
+        return self._local.session
+
+    def _adapter(self, scheme, hostname):
+        """This thread's adapter for a pinned connection (keeps connections alive per host)."""
+        self._session()
+        adapters = self._local.adapters
+        key = hostname if scheme == 'https' else ''
+        adapter = adapters.get(key)
+        if adapter is None:
+            if len(adapters) >= MAX_PINNED_ADAPTERS:
+                for stale in adapters.values():
+                    stale.close()
+                adapters.clear()
+            adapter = adapters[key] = PinnedHostAdapter(hostname) if key else HTTPAdapter()
+        return adapter
+
+    def _post(self, url, body, headers):
+        """POST body to url, connecting to the address check_callback_host just approved."""
+        address = check_callback_host(url, self.allowed_hosts)
+        if address is None:
+            return self._session().post(url, data=body, timeout=self.timeout, allow_redirects=False, headers=headers)
+        parts = urlsplit(url)
+        request = pinned_request(url, address, body, headers)
+        return self._adapter(parts.scheme, parts.hostname).send(request, timeout=self.timeout)
+
+    def _attempt(self, execution_id, url, attempts, token):
+        started = time.perf_counter()
+        attempts += 1
+        try:
+            body = self.load_payload(execution_id)
+            if body is None:
+                # Already delivered through /get-approved (or purged)
+                with self.connect_db() as conn:
+                    self.store.delete(conn, [execution_id])
+                self._finish('dropped', started)
+                return
+
+            error, retry = None, True
+            try:
+                response = self._post(url, body, {
+                    'Content-Type': 'application/json',
+                    'X-HITL-Execution-Id': execution_id,
+                    'X-HITL-Delivery-Attempt': str(attempts),
+                })
+                if 200 <= response.status_code < 300:
+                    self.on_delivered(execution_id)
+                    log.info('webhook_delivered', '📬 Delivered approval for {execution_id} to {url} '
+                             '(attempt {attempts})', execution_id=execution_id, url=url, attempts=attempts)
+                    self._finish('delivered', started)
+                    return
+                error = f'HTTP {response.status_code}'
+                retry = response.status_code >= 500 or response.status_code in (408, 429)
+            except CallbackBlocked as e:
+                error, retry = str(e), False
+            except (requests.RequestException, socket.gaierror) as e:
+                error = f'{type(e).__name__}: {e}'
+
+            with self.connect_db() as conn:
+                if retry and attempts < self.max_attempts:
+                    next_attempt_at = datetime.now() + timedelta(
+                        seconds=backoff_delay(attempts, self.backoff_base, self.backoff_max))
+                    self.store.reschedule(conn, execution_id, token, attempts, next_attempt_at, error)
+                    outcome = 'retried'
+                else:
+                    self.store.fail(conn, execution_id, token, attempts, error)
+                    outcome = 'failed'
+            if outcome == 'retried':
+                log.warning('webhook_retried', '⚠️ Webhook for {execution_id} failed ({error}), attempt {attempts} '
+                            '– will retry', execution_id=execution_id, url=url, attempts=attempts, error=error)
+            else:
+                log.error('webhook_failed', '❌ Webhook for {execution_id} failed ({error}), attempt {attempts} '
+                          '– giving up', execution_id=execution_id, url=url, attempts=attempts, error=error)
+            self._finish(outcome, started)
+        except Exception as e:
+            # Claim lapses after the lease and the delivery is retried
+            log.error('webhook_attempt_error', '❌ Webhook attempt for {execution_id} crashed: {error}',
+                      execution_id=execution_id, error=str(e))
+            self._finish('error', started, count=False)
+
+    def _finish(self, outcome, started, count=True):
+        with self._lock:
+            self._in_flight -= 1
+            if count:
+                self._stats[outcome] += 1
+        if self.observe:
+            self.observe(outcome, time.perf_counter() - started)
+        self._wake.set()  # a slot is free
+
+    # ------------------------------------------------------------------
+    # Introspection
+    # ------------------------------------------------------------------
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = self._in_flight
+        stats['workers'] = self.workers
+        return stats
@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+"""
+Load test / benchmark for the HITL flow (companion to test_flow.py).
+
+Drives concurrent N8N-style executions against a running server, or one it
+starts itself:
+
+    store-tasks ─┬─ long-poll get-approved ............................ ✔
+                 └─ (human) wait ─ get-tasks ─ submit-approval ──┘
+                    … or nobody answers and the wait times out (auto-approval)
+
+Meetings are synthetic and reproducible (--seed). Results – throughput and
+p50/p95/p99 latency per endpoint, pool exhaustion (503s and pool timeouts),
+errors – are printed and written as JSON, so runs on different commits can
+be compared with --compare.
+
+    python bench_flow.py --spawn sqlite --executions 200 --concurrency 50
+    python bench_flow.py --spawn postgres --database-url postgresql://localhost/hitl_bench
+    python bench_flow.py --server http://127.0.0.1:8080 --compare bench-results/base.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import requests
+
+ROOT = Path(__file__).resolve().parent
+PERCENTILES = (50, 95, 99)
+
+# ============================================================================
+# 🧪 SYNTHETIC MEETINGS
+# ============================================================================
+
+PRIORITIES = ('High', 'Medium', 'Low')
+VERBS = ('Follow up on', 'Draft', 'Review', 'Schedule', 'Prepare', 'Send', 'Update', 'Confirm')
+TOPICS = ('Q3 budget', 'hiring plan', 'vendor contract', 'launch checklist', 'customer feedback',
+          'security review', 'roadmap', 'onboarding docs', 'board deck', 'API migration')
+
+
+def make_payload(rng, execution_id, num_tasks, meetings_per_execution=3):
+    """Store-tasks body shaped like the N8N workflow's."""
+    meetings = []
+    for m in range(max(1, min(meetings_per_execution, num_tasks))):
+        meetings.append({
+            'meeting_id': f'{execution_id}-m{m}',
+            'meeting_title': f'{rng.choice(TOPICS).title()} sync #{rng.randint(1, 99)}',
+            'meeting_organizer': f'organizer{rng.randint(1, 20)}@example.com',
+            'meeting_date': f'2024-07-{rng.randint(1, 28):02d}',
+        })
+    tasks = []
+    for i in range(num_tasks):
+        meeting = meetings[i % len(meetings)]
+        tasks.append({
+            'task_item': f'{rng.choice(VERBS)} {rng.choice(TOPICS)} ({i})',
+            'brief_description': ' '.join(rng.choice(TOPICS) for _ in range(rng.randint(5, 25))),
+            'priority': rng.choice(PRIORITIES),
+            'date_expected': f'2024-08-{rng.randint(1, 28):02d}',
+            **meeting,
+        })
+    return {
+        'execution_id': execution_id,
+        'monday_tasks': tasks,
+        'meetings': meetings,
+        'meeting_title': meetings[0]['meeting_title'],
+        'meeting_organizer': meetings[0]['meeting_organizer'],
+        'total_tasks': num_tasks,
+    }
+
+# ============================================================================
+# 📏 MEASUREMENTS
+# ============================================================================
+
+class Recorder:
+    """Thread-safe latency samples and status counts per endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)                       # endpoint -> [seconds]
+        self.statuses = defaultdict(lambda: defaultdict(int))  # endpoint -> status -> count
+        self.errors = []
+        self.outcomes = defaultdict(int)
+
+    def record(self, endpoint, seconds, status):
+        with self._lock:
+            self.samples[endpoint].append(seconds)
+            self.statuses[endpoint][str(status)] += 1
+
+    def error(self, message):
+        with self._lock:
+            self.errors.append(message)
+
+    def outcome(self, name):
+        with self._lock:
+            self.outcomes[name] += 1
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-pct * len(sorted_values) // 100))  # ceil
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(samples, statuses=None):
+    values = sorted(samples)
+    summary = {'count': len(values)}
+    if values:
+        summary.update({f'p{p}_ms': round(percentile(values, p) * 1000, 2) for p in PERCENTILES})
+        summary['mean_ms'] = round(sum(values) / len(values) * 1000, 2)
+        summary['max_ms'] = round(values[-1] * 1000, 2)
+    if statuses is not None:
+        summary['status'] = dict(sorted(statuses.items()))
+        summary['errors'] = sum(n for s, n in statuses.items() if not s.startswith('2') and s != '304')
+    return summary
+
+# ============================================================================
+# 🤖 ONE EXECUTION (N8N + human)
+# ============================================================================
+
+_local = threading.local()
+
+
+def session():
+    if not hasattr(_local, 'session'):
+        _local.session = requests.Session()
+    return _local.session
+
+
+def call(recorder, endpoint, method, url, retry_503=0, **kwargs):
+    """Timed request; 503 (pool exhausted) is retried up to retry_503 times."""
+    for attempt in range(retry_503 + 1):
+        started = time.perf_counter()
+        try:
+            response = session().request(method, url, **kwargs)
+        except requests.RequestException as e:
+            recorder.record(endpoint, time.perf_counter() - started, 'exception')
+            recorder.error(f'{endpoint}: {type(e).__name__}: {e}')
+            return None
+        recorder.record(endpoint, time.perf_counter() - started, response.status_code)
+        if response.status_code != 503 or attempt == retry_503:
+            return response
+        time.sleep(0.2 * (attempt + 1))
+    return response
+
+
+def run_execution(index, args, recorder):
+    rng = random.Random(f'{args.seed}:{index}')
+    execution_id = f'bench-{args.run_id}-{index}'
+    num_tasks = rng.randint(args.min_tasks, args.max_tasks)
+    human_answers = rng.random() >= args.timeout_ratio
+    delay = rng.uniform(args.min_delay, args.max_delay)
+    payload = make_payload(rng, execution_id, num_tasks)
+    base = args.server
+
+    started = time.perf_counter()
+    response = call(recorder, 'store-tasks', 'POST', f'{base}/store-tasks', json=payload, timeout=60)
+    if response is None or response.status_code != 200:
+        recorder.error(f'{execution_id}: store-tasks returned {getattr(response, "status_code", None)}')
+        recorder.outcome('failed')
+        return None
+
+    # N8N: long-poll until the approval (or the wait-timeout auto-approval) arrives
+    approval = {}
+
+    def poll():
+        deadline = time.monotonic() + args.poll_deadline
+        while time.monotonic() < deadline:
+            r = call(recorder, 'get-approved', 'GET', f'{base}/get-approved',
+                     params={'execution_id': execution_id}, timeout=args.poll_deadline)
+            if r is None:
+                return
+            if r.status_code == 200:
+                approval['body'] = r.json()
+                return
+            if r.status_code != 503:
+                recorder.error(f'{execution_id}: get-approved returned {r.status_code}')
+                return
+            time.sleep(0.5)
+
+    poller = threading.Thread(target=poll, name=f'poll-{index}')
+    poller.start()
+
+    expected = num_tasks  # auto-approval approves everything
+    if human_answers:
+        time.sleep(delay)
+        r = call(recorder, 'get-tasks', 'GET', f'{base}/get-tasks/{execution_id}', retry_503=3, timeout=60)
+        if r is not None and r.status_code == 200:
+            tasks = r.json()['monday_tasks']
+            for task in tasks:
+                task['approved'] = rng.random() < args.approve_share
+            expected = sum(task['approved'] for task in tasks)
+            if args.autosave:
+                decisions = [{'task_index': i, 'approved': t['approved']} for i, t in enumerate(tasks)]
+                for start in range(0, len(decisions), 200):
+                    call(recorder, 'save-decisions', 'POST', f'{base}/save-decisions', retry_503=3, timeout=60,
+                         json={'execution_id': execution_id, 'decisions': decisions[start:start + 200]})
+                r = call(recorder, 'commit-approval', 'POST', f'{base}/commit-approval', retry_503=3,
+                         json={'execution_id': execution_id}, timeout=60)
+            else:
+                r = call(recorder, 'submit-approval', 'POST', f'{base}/submit-approval', retry_503=3,
+                         json={'execution_id': execution_id, 'monday_tasks_with_approval': tasks}, timeout=60)
+            if r is None or r.status_code != 200:
+                # Usually the wait timed out first (delay > APPROVAL_WAIT_SEC)
+                recorder.error(f'{execution_id}: approval returned {getattr(r, "status_code", None)}')
+                expected = num_tasks
+        else:
+            recorder.error(f'{execution_id}: get-tasks returned {getattr(r, "status_code", None)}')
+
+    poller.join()
+    body = approval.get('body')
+    if body is None:
+        recorder.outcome('failed')
+        return None
+    end_to_end = time.perf_counter() - started
+    method = body.get('method', 'unknown')
+    recorder.outcome(method)
+    if body.get('approved_count') != expected:
+        recorder.error(f"{execution_id}: approved_count {body.get('approved_count')} != expected {expected} ({method})")
+    return end_to_end
+
+# ============================================================================
+# 🚀 SERVER UNDER TEST (optional --spawn)
+# ============================================================================
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def spawn_server(args):
+    """Start the app (gunicorn, uvicorn or the dev server) on a free port."""
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), APPROVAL_WAIT_SEC=str(args.approval_wait_sec), FLASK_DEBUG='false')
+    if args.spawn == 'postgres':
+        if not args.database_url:
+            sys.exit('--spawn postgres needs --database-url (or DATABASE_URL)')
+        env['DATABASE_URL'] = args.database_url
+    else:
+        env.pop('DATABASE_URL', None)
+        env['DB_FILE'] = str(Path(args.workdir) / 'bench.db')
+
+    bind = f'127.0.0.1:{port}'
+    if args.server_cmd == 'gunicorn':
+        cmd = [sys.executable, '-m', 'gunicorn', '-w', str(args.workers), '-b', bind,
+               '--timeout', str(args.approval_wait_sec + 60), 'app.server:app']
+    elif args.server_cmd == 'uvicorn':
+        cmd = [sys.executable, '-m', 'uvicorn', 'app.asgi:app', '--host', '127.0.0.1', '--port', str(port),
+               '--workers', str(args.workers), '--no-access-log']
+    else:
+        cmd = [sys.executable, 'app/server.py']
+
+    log_path = Path(args.workdir) / 'server.log'
+    log_file = open(log_path, 'w')
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=log_file, stderr=subprocess.STDOUT,
+                            start_new_session=True)
+    url = f'http://{bind}'
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            sys.exit(f'Server exited during startup, see {log_path}')
+        try:
+            if requests.get(f'{url}/health/live', timeout=1).status_code == 200:
+                print(f'🚀 Spawned {args.server_cmd} ({args.spawn}) on {url} – log: {log_path}')
+                return proc, url
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    stop_server(proc)
+    sys.exit(f'Server did not become live within 30s, see {log_path}')
+
+
+def stop_server(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait(10)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(proc.pid, signal.SIGKILL)
+
+# ============================================================================
+# 📊 RUN, REPORT, COMPARE
+# ============================================================================
+
+def pool_counters(base):
+    """Pool timeout/rejection totals from /health (None on SQLite or if unavailable)."""
+    try:
+        pool = requests.get(f'{base}/health', timeout=10).json().get('pool')
+    except (requests.RequestException, ValueError):
+        return None
+    return {key: pool.get(key, 0) for key in ('timeouts', 'rejected', 'borrows')} if pool else None
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def run_benchmark(args):
+    recorder = Recorder()
+    pool_before = pool_counters(args.server)
+    end_to_end = []
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for result in executor.map(lambda i: run_execution(i, args, recorder), range(args.executions)):
+            if result is not None:
+                end_to_end.append(result)
+    duration = time.perf_counter() - started
+    pool_after = pool_counters(args.server)
+
+    commit, dirty = git_revision()
+    total_requests = sum(len(v) for v in recorder.samples.values())
+    pool = {'exhaustion_responses': sum(s.get('503', 0) for s in recorder.statuses.values())}
+    if pool_before and pool_after:
+        pool.update({f'{key}_delta': pool_after[key] - pool_before[key] for key in pool_before})
+
+    return {
+        'meta': {
+            'commit': commit,
+            'dirty': dirty,
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'server': args.server,
+            'backend': args.spawn or 'external',
+            'server_cmd': args.server_cmd if args.spawn else None,
+            'params': {key: getattr(args, key) for key in (
+                'executions', 'concurrency', 'min_tasks', 'max_tasks', 'timeout_ratio', 'approve_share',
+                'min_delay', 'max_delay', 'autosave', 'seed', 'workers', 'approval_wait_sec')},
+        },
+        'duration_sec': round(duration, 3),
+        'throughput': {
+            'executions_per_sec': round(len(end_to_end) / duration, 3) if duration else None,
+            'requests_per_sec': round(total_requests / duration, 3) if duration else None,
+        },
+        'outcomes': dict(recorder.outcomes),
+        'endpoints': {name: summarize(recorder.samples[name], recorder.statuses[name])
+                      for name in sorted(recorder.samples)},
+        'end_to_end': summarize(end_to_end),
+        'pool': pool,
+        'errors': {'count': len(recorder.errors), 'first': recorder.errors[:20]},
+    }
+
+
+def print_report(results):
+    print(f"\n📊 {results['meta']['backend']} – {results['duration_sec']}s, "
+          f"{results['throughput']['executions_per_sec']} executions/s, "
+          f"{results['throughput']['requests_per_sec']} requests/s")
+    print(f"{'endpoint':<18}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    rows = list(results['endpoints'].items()) + [('end-to-end', results['end_to_end'])]
+    for name, s in rows:
+        print(f"{name:<18}{s['count']:>7}{s.get('errors', ''):>8}{s.get('p50_ms', '-'):>10}"
+              f"{s.get('p95_ms', '-'):>10}{s.get('p99_ms', '-'):>10}{s.get('max_ms', '-'):>10}")
+    print(f"outcomes: {results['outcomes']}  pool: {results['pool']}  errors: {results['errors']['count']}")
+    for message in results['errors']['first'][:5]:
+        print(f'  ❌ {message}')
+
+
+def compare(results, baseline_path, threshold):
+    """Print p95 / throughput changes against a previous run; True if within threshold (%)."""
+    baseline = json.loads(Path(baseline_path).read_text())
+    print(f"\n🔍 vs {baseline_path} ({(baseline['meta'].get('commit') or '?')[:10]})")
+    ok = True
+    for name, current in list(results['endpoints'].items()) + [('end-to-end', results['end_to_end'])]:
+        before = baseline['endpoints'].get(name) if name != 'end-to-end' else baseline.get('end_to_end')
+        if not before or not before.get('p95_ms') or current.get('p95_ms') is None:
+            continue
+        change = (current['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100
+        flag = ''
+        # The long-poll's latency is dominated by the simulated human / wait timeout
+        if change > threshold and name not in ('get-approved', 'end-to-end'):
+            ok, flag = False, '  ⚠️ regression'
+        print(f"  {name:<18} p95 {before['p95_ms']:>9} → {current['p95_ms']:>9} ms ({change:+.1f}%){flag}")
+    before_rps = baseline['throughput'].get('requests_per_sec')
+    current_rps = results['throughput'].get('requests_per_sec')
+    if before_rps and current_rps:
+        change = (current_rps - before_rps) / before_rps * 100
+        flag = ''
+        if -change > threshold:
+            ok, flag = False, '  ⚠️ regression'
+        print(f"  {'requests/s':<18} {before_rps:>13} → {current_rps:>9}    ({change:+.1f}%){flag}")
+    return ok
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    target = parser.add_argument_group('server under test')
+    target.add_argument('--server', default='http://127.0.0.1:8080', help='base URL of a running server')
+    target.add_argument('--spawn', choices=('sqlite', 'postgres'), help='start a server for this run instead')
+    target.add_argument('--database-url', default=os.environ.get('DATABASE_URL'), help='Postgres DSN for --spawn postgres')
+    target.add_argument('--server-cmd', choices=('gunicorn', 'uvicorn', 'dev'), default='gunicorn')
+    target.add_argument('--workers', type=int, default=4)
+    target.add_argument('--approval-wait-sec', type=int, default=10,
+                        help="the server's APPROVAL_WAIT_SEC (set on a spawned server): when unanswered "
+                             'executions time out')
+
+    load = parser.add_argument_group('load')
+    load.add_argument('--executions', type=int, default=100)
+    load.add_argument('--concurrency', type=int, default=20, help='executions in flight at once')
+    load.add_argument('--min-tasks', type=int, default=1)
+    load.add_argument('--max-tasks', type=int, default=50, help='tasks per meeting, up to 1000')
+    load.add_argument('--timeout-ratio', type=float, default=0.2, help='share of executions nobody answers')
+    load.add_argument('--approve-share', type=float, default=0.8, help='share of tasks a human approves')
+    load.add_argument('--min-delay', type=float, default=0.5, help='human think time (seconds)')
+    load.add_argument('--max-delay', type=float, default=3.0)
+    load.add_argument('--autosave', action='store_true', help='approve via /save-decisions + /commit-approval')
+    load.add_argument('--seed', default='hitl')
+
+    output = parser.add_argument_group('results')
+    output.add_argument('--output', help='results JSON (default bench-results/<time>-<commit>.json)')
+    output.add_argument('--compare', help='previous results JSON to compare against')
+    output.add_argument('--fail-threshold', type=float, default=20.0,
+                        help='exit 1 if a p95 or requests/s regresses by more than this %% vs --compare')
+    args = parser.parse_args(argv)
+
+    if not 1 <= args.min_tasks <= args.max_tasks <= 1000:
+        parser.error('need 1 <= --min-tasks <= --max-tasks <= 1000')
+    if not 0 <= args.timeout_ratio <= 1 or not 0 <= args.approve_share <= 1:
+        parser.error('--timeout-ratio and --approve-share are fractions between 0 and 1')
+    args.run_id = uuid.uuid4().hex[:8]
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    proc = None
+    args.workdir = tempfile.mkdtemp(prefix='hitl-bench-')
+    try:
+        if args.spawn:
+            proc, args.server = spawn_server(args)
+        # Long-polls return after APPROVAL_WAIT_SEC on the server; allow for queueing on top
+        args.poll_deadline = args.approval_wait_sec + args.max_delay + 120
+        print(f'▶ {args.executions} executions, {args.concurrency} concurrent, '
+              f'{args.min_tasks}-{args.max_tasks} tasks each → {args.server}')
+        results = run_benchmark(args)
+    finally:
+        if proc is not None:
+            stop_server(proc)
+        shutil.rmtree(args.workdir, ignore_errors=True)
+
+    print_report(results)
+    output = Path(args.output) if args.output else (
+        ROOT / 'bench-results' / f"{datetime.now():%Y%m%d-%H%M%S}-{(results['meta']['commit'] or 'nogit')[:10]}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f'💾 Results written to {output}')
+
+    if args.compare and not compare(results, args.compare, args.fail_threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()